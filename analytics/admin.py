@@ -3,11 +3,13 @@ Django admin configuration for analytics models.
 """
 
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.utils.html import format_html
 from django.urls import reverse
-from django.utils.safestring import mark_safe
 
-from .models import BillingDataUpload, MappedField, BillingRecord, AnalyticsQuery
+from .admin_utils import AutocompleteFilter, EstimatedCountPaginator, LazyDateHierarchyQuerySet
+from .models import BillingDataUpload, MappedField, BillingRecord, AnalyticsQuery, BulkUpdateJob
+from .tasks import enqueue_record_update
 
 from unfold.admin import ModelAdmin
 
@@ -22,6 +24,7 @@ class BillingDataUploadAdmin(ModelAdmin):
     ]
     list_filter = ["status", "upload_date", "processing_completed_at"]
     search_fields = ["original_filename", "user__username", "user__email"]
+    list_select_related = ["user"]
     readonly_fields = [
         "id", "upload_date", "processing_started_at", "processing_completed_at", 
         "file_size", "processing_duration", "progress_percentage", "view_mappings_link", "view_records_link"
@@ -90,6 +93,7 @@ class MappedFieldAdmin(ModelAdmin):
     list_display = ["upload", "original_column", "mapped_field", "is_required", "created_at"]
     list_filter = ["mapped_field", "is_required", "created_at"]
     search_fields = ["upload__original_filename", "original_column", "custom_field_name"]
+    list_select_related = ["upload__user"]
     raw_id_fields = ["upload"]
     
     fieldsets = (
@@ -107,21 +111,29 @@ class MappedFieldAdmin(ModelAdmin):
 
 @admin.register(BillingRecord)
 class BillingRecordAdmin(ModelAdmin):
-    """Admin interface for BillingRecord model."""
+    """Admin interface for BillingRecord model.
+    
+    Tuned for very large tables: related rows are joined, counts are
+    estimated, uploads are picked by autocomplete and the date hierarchy
+    doesn't scan the table (see ``analytics.admin_utils``).
+    """
     
     list_display = [
         "invoice_number", "customer_name", "amount", "payment_status", 
         "date", "upload", "created_at"
     ]
     list_filter = [
-        "payment_status", "date", "created_at", "upload"
+        "payment_status", "date", "created_at", ("upload", AutocompleteFilter)
     ]
     search_fields = [
         "invoice_number", "customer_name", 
         "description", "upload__original_filename"
     ]
-    raw_id_fields = ["upload"]
+    list_select_related = ["upload__user"]
+    autocomplete_fields = ["upload"]
     date_hierarchy = "date"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ("Invoice Information", {
@@ -150,34 +162,74 @@ class BillingRecordAdmin(ModelAdmin):
     
     actions = ["mark_as_paid", "mark_as_overdue", "mark_as_pending"]
     
-    def mark_as_paid(self, request, queryset):
-        """Mark selected records as paid."""
-        updated = queryset.update(payment_status="PAID")
+    @property
+    def media(self):
+        # Scripts for the upload autocomplete filter on the changelist
+        upload_field = BillingRecord._meta.get_field("upload")
+        return super().media + AutocompleteSelect(upload_field, self.admin_site).media
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return LazyDateHierarchyQuerySet(model=queryset.model, query=queryset.query, using=queryset.db)
+    
+    def _queue_status_update(self, request, queryset, status: str) -> None:
+        """Queue a chunked payment status update and return to the changelist."""
+        label = BillingRecord.PaymentStatus(status).label.lower()
+        job = enqueue_record_update(
+            queryset,
+            {"payment_status": status},
+            description=f"Mark records as {label}",
+            requested_by=request.user,
+        )
+        url = reverse("admin:analytics_bulkupdatejob_change", args=[job.pk])
         self.message_user(
-            request, 
-            f"Successfully marked {updated} records as paid."
+            request,
+            format_html('Marking the selected records as {} in the background. <a href="{}">Track progress</a>', label, url),
         )
+    
+    def mark_as_paid(self, request, queryset):
+        """Mark selected records as paid."""
+        self._queue_status_update(request, queryset, BillingRecord.PaymentStatus.PAID)
     mark_as_paid.short_description = "Mark selected records as paid"
     
     def mark_as_overdue(self, request, queryset):
         """Mark selected records as overdue."""
-        updated = queryset.update(payment_status="OVERDUE")
-        self.message_user(
-            request, 
-            f"Successfully marked {updated} records as overdue."
-        )
+        self._queue_status_update(request, queryset, BillingRecord.PaymentStatus.OVERDUE)
     mark_as_overdue.short_description = "Mark selected records as overdue"
     
     def mark_as_pending(self, request, queryset):
         """Mark selected records as pending."""
-        updated = queryset.update(payment_status="PENDING")
-        self.message_user(
-            request, 
-            f"Successfully marked {updated} records as pending."
-        )
+        self._queue_status_update(request, queryset, BillingRecord.PaymentStatus.PENDING)
     mark_as_pending.short_description = "Mark selected records as pending"
 
 
+@admin.register(BulkUpdateJob)
+class BulkUpdateJobAdmin(ModelAdmin):
+    """Read-only progress of bulk record updates started from the admin."""
+    
+    list_display = [
+        "description", "status", "updated_records", "total_records", "progress",
+        "requested_by", "created_at", "completed_at"
+    ]
+    list_filter = ["status", "created_at"]
+    list_select_related = ["requested_by"]
+    readonly_fields = [
+        "description", "values", "requested_by", "status", "total_records", "updated_records",
+        "progress", "error_message", "created_at", "started_at", "completed_at"
+    ]
+    
+    def progress(self, obj: BulkUpdateJob) -> str:
+        """Return the share of records updated."""
+        return f"{obj.progress_percentage:.0f}%"
+    progress.short_description = "Progress"
+    
+    def has_add_permission(self, request) -> bool:
+        return False
+    
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
+
+
 @admin.register(AnalyticsQuery)
 class AnalyticsQueryAdmin(ModelAdmin):
     """Admin interface for AnalyticsQuery model."""
@@ -185,6 +237,7 @@ class AnalyticsQueryAdmin(ModelAdmin):
     list_display = ["user", "query_preview", "query_type", "created_at", "response_preview"]
     list_filter = ["query_type", "created_at", "user"]
     search_fields = ["query_text", "response_text", "user__username", "user__email"]
+    list_select_related = ["user"]
     raw_id_fields = ["user", "upload"]
     date_hierarchy = "created_at"
     
@@ -0,0 +1,90 @@
+"""
+Chunked bulk updates of billing records.
+
+A single ``queryset.update()`` over millions of rows holds row locks on all
+of them until it commits. Here records are updated in primary-key order, a
+chunk per transaction, with progress kept on a ``BulkUpdateJob``. Once done,
+``records_changed`` is sent for the affected users so caches derived from
+their records can be invalidated.
+"""
+
+import logging
+from typing import Any, Callable, Dict, Optional, Set
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .conf import analytics_setting
+from .models import BillingRecord, BulkUpdateJob
+from .signals import records_changed
+
+logger = logging.getLogger(__name__)
+
+
+def update_records(
+    queryset: QuerySet,
+    values: Dict[str, Any],
+    chunk_size: Optional[int] = None,
+    on_chunk: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Write ``values`` to the queryset's records in keyset-ordered chunks.
+
+    ``on_chunk`` is called with the running total after each chunk. Sends
+    ``records_changed`` once at the end. Returns the number of records
+    updated.
+    """
+    chunk_size = chunk_size or analytics_setting("BULK_UPDATE_CHUNK_SIZE")
+    queryset = queryset.order_by("pk")
+
+    updated = 0
+    last_pk = None
+    user_ids: Set[int] = set()
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(page.values_list("pk", "user_id")[:chunk_size])
+        if not rows:
+            break
+
+        ids = [pk for pk, _ in rows]
+        with transaction.atomic():
+            BillingRecord.objects.filter(pk__in=ids).update(**values, updated_at=timezone.now())
+
+        user_ids.update(user_id for _, user_id in rows)
+        updated += len(ids)
+        last_pk = ids[-1]
+        if on_chunk is not None:
+            on_chunk(updated)
+
+    if user_ids:
+        records_changed.send(sender=BillingRecord, user_ids=user_ids)
+    return updated
+
+
+def run_update_job(job: BulkUpdateJob, queryset: QuerySet) -> int:
+    """Apply the job's values to the queryset, recording progress on the job."""
+    job.status = BulkUpdateJob.Status.RUNNING
+    job.started_at = timezone.now()
+    job.total_records = queryset.count()
+    job.save(update_fields=["status", "started_at", "total_records"])
+
+    def report(updated: int) -> None:
+        job.updated_records = updated
+        BulkUpdateJob.objects.filter(pk=job.pk).update(updated_records=updated)
+
+    try:
+        updated = update_records(queryset, job.values, on_chunk=report)
+    except Exception as e:
+        logger.exception(f"Bulk update job {job.pk} failed")
+        job.status = BulkUpdateJob.Status.ERROR
+        job.error_message = str(e)
+        job.completed_at = timezone.now()
+        job.save(update_fields=["status", "error_message", "completed_at"])
+        return job.updated_records
+
+    job.status = BulkUpdateJob.Status.COMPLETED
+    job.updated_records = updated
+    job.completed_at = timezone.now()
+    job.save(update_fields=["status", "updated_records", "completed_at"])
+    logger.info(f"Bulk update job {job.pk} updated {updated} billing records")
+    return updated
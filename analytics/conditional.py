@@ -0,0 +1,72 @@
+"""
+Conditional GET for the analytics JSON APIs.
+
+Chart and summary endpoints are polled by the front end, but their answer
+only changes with the user's data. Their ETag is derived from the user's
+data version (see ``analytics.fragments``), the endpoint, its query
+parameters and the date (trends are relative to today), so it is known
+before any query runs: a request whose ``If-None-Match`` still matches
+gets ``304 Not Modified`` without touching the records.
+
+Responses are ``Cache-Control: private, no-cache``: browsers keep them but
+revalidate every time, so a change shows up on the next poll.
+
+The tag is computed before the view decides where to read (apply this
+decorator outside ``reads_from_replica``, or the mixin before
+``ReplicaReadsMixin``). ``records_changed`` pins a user to the primary
+before it starts a new data version, so a body tagged with a version the
+replica may not have yet is read from the primary, while bodies for an
+older version keep coming from the replica (``analytics.replicas``).
+"""
+
+import hashlib
+from functools import wraps
+from typing import Optional
+
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .fragments import data_version, fragment_cache
+
+
+def data_etag(request, *args, **kwargs) -> Optional[str]:
+    """ETag of a per-user analytics response; ``None`` when there's no data version."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated or fragment_cache() is None:
+        return None
+    parts = [
+        request.path,
+        str(user.pk),
+        data_version(user.pk),
+        timezone.now().date().isoformat(),
+        *(f"{key}={value}" for key, values in sorted(request.GET.lists()) for value in values),
+    ]
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def conditional_on_data(view_func):
+    """Answer unchanged requests with 304 and let browsers cache the rest."""
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        etag = data_etag(request, *args, **kwargs)
+        if etag is None:
+            response = view_func(request, *args, **kwargs)
+        else:
+            response = condition(etag_func=lambda *a, **k: etag)(view_func)(request, *args, **kwargs)
+        if response.status_code == 304 or 200 <= response.status_code < 300:
+            patch_cache_control(response, private=True, no_cache=True)
+        elif response.has_header("ETag"):
+            # Errors must not be revalidated into a 304
+            del response["ETag"]
+        return response
+
+    return wrapper
+
+
+class ConditionalDataMixin:
+    """Class-based view version of ``conditional_on_data``."""
+
+    def dispatch(self, request, *args, **kwargs):
+        return conditional_on_data(super().dispatch)(request, *args, **kwargs)
@@ -0,0 +1,67 @@
+"""
+Analytics app settings.
+
+Values are read from the ``ANALYTICS_CONFIG`` dict in Django settings and
+fall back to the defaults below.
+"""
+
+from typing import Any
+
+from django.conf import settings
+
+DEFAULTS = {
+    "MAX_FILE_SIZE": 50 * 1024 * 1024,  # 50MB
+    # Larger files are sent in UPLOAD_PART_SIZE parts through upload sessions
+    "MAX_RESUMABLE_FILE_SIZE": 1024 * 1024 * 1024,  # 1GB
+    "UPLOAD_PART_SIZE": 8 * 1024 * 1024,
+    # Where session parts are kept until completed; None uses a temp directory
+    "UPLOAD_SESSION_DIR": None,
+    "ALLOWED_EXTENSIONS": ["csv", "xlsx", "xls"],
+    "SAMPLE_ROWS": 5,
+    # Rows kept in the parsed-file cache for previews
+    "PARSED_SAMPLE_ROWS": 100,
+    "CHUNK_SIZE": 1000,
+    # Worker processes used to normalize rows; 1 keeps ingestion in-process
+    "INGESTION_WORKERS": 1,
+    # Smaller uploads are normalized in-process even when workers > 1
+    "INGESTION_PARALLEL_MIN_ROWS": 50000,
+    # Chunks that may be normalized ahead of the DB writer, per worker
+    "INGESTION_MAX_PENDING_CHUNKS": 2,
+    # "auto" (COPY on PostgreSQL, bulk_create elsewhere), "copy" or "bulk_create"
+    "INGESTION_LOADER": "auto",
+    # Fields identifying a record across re-uploads in upsert mode, e.g.
+    # ["invoice_number", "product_name"]; empty means the whole row
+    "DEDUP_KEY_FIELDS": [],
+    # Local cache of files read from remote storage; None uses a temp directory
+    "FILE_CACHE_DIR": None,
+    "FILE_CACHE_MAX_BYTES": 2 * 1024 * 1024 * 1024,
+    # Bytes per read (and ranged request) when streaming stored files
+    "FILE_READ_CHUNK_SIZE": 8 * 1024 * 1024,
+    # Threads running queued jobs in the web process; 0 runs them inline
+    "BACKGROUND_WORKERS": 2,
+    # Records removed per statement when deleting uploads or records
+    "DELETE_CHUNK_SIZE": 5000,
+    # Records changed per transaction by bulk admin actions
+    "BULK_UPDATE_CHUNK_SIZE": 5000,
+    # PostgreSQL partitioning of billing records by hash of user_id, e.g.
+    # {"strategy": "hash", "partitions": 16}; None keeps one table
+    "RECORD_PARTITIONING": None,
+    # Cache alias for analytics data (e.g. replica pins); must be shared by all workers
+    "CACHE_ALIAS": "default",
+    # Cache alias for rendered analytics widgets (see analytics.fragments); None disables fragment caching
+    "FRAGMENT_CACHE_ALIAS": "default",
+    # Database alias that read-only analytics views query (see analytics.replicas); None uses the primary
+    "READ_REPLICA": None,
+    # Seconds a user reads from the primary after their own writes
+    "REPLICA_STICKY_SECONDS": 5,
+    # Admin changelists show planner estimates instead of COUNT(*) above this many rows
+    "ADMIN_EXACT_COUNT_LIMIT": 10000,
+    # Minimum similarity for a fuzzy column mapping suggestion (0-1)
+    "MAPPING_MATCH_THRESHOLD": 0.6,
+}
+
+
+def analytics_setting(name: str) -> Any:
+    """Return an analytics setting, falling back to its default."""
+    config = getattr(settings, "ANALYTICS_CONFIG", {})
+    return config.get(name, DEFAULTS[name])
@@ -0,0 +1,206 @@
+"""
+Deduplication for uploads ingested in upsert mode.
+
+Every ``BillingRecord`` gets a ``content_hash`` of its billing fields. In
+upsert mode it also gets a ``dedup_key`` identifying the row across the
+user's uploads, so re-uploading overlapping exports only writes the delta:
+
+- new keys are inserted with the pipeline's loader (COPY on PostgreSQL);
+- keys whose content changed are updated in place by primary key and move
+  to the new upload (``bulk_update``; ``ON CONFLICT`` can't be used because
+  a partitioned table, see ``analytics.partitioning``, can only enforce
+  ``dedup_key`` uniqueness together with its partition key). Instead each
+  chunk takes a per-user advisory lock (``lock``) before reading the
+  stored keys, so concurrent uploads of one user can't both insert a key;
+- keys with identical content only move to the new upload (its ``upload``
+  and ``row_number``), so a record always belongs to the latest upload
+  that contains it and deleting an older upload keeps it.
+
+The key is built from ``ANALYTICS_CONFIG['DEDUP_KEY_FIELDS']`` (e.g.
+``["invoice_number", "product_name"]``); a later row of the same file with
+an already seen key is skipped and reported as a row error. When no key
+fields are configured the whole row is the key, numbered by occurrence so
+that identical line items within one file are kept as separate records.
+"""
+
+import hashlib
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.db import connection, models
+from django.db.models import Count, QuerySet
+from django.utils import timezone
+
+from .conf import analytics_setting
+from .models import BillingRecord
+from .normalization import RowErrors
+
+# Billing data covered by the content hash (not provenance or timestamps)
+HASH_FIELDS = [
+    field for field in BillingRecord._meta.concrete_fields
+    if not field.primary_key
+    and field.name not in {"upload", "user", "row_number", "created_at", "updated_at", "dedup_key", "content_hash"}
+]
+
+UPDATE_FIELDS = [field.name for field in HASH_FIELDS] + ["content_hash", "upload", "row_number", "updated_at"]
+
+MOVE_FIELDS = ["upload", "row_number"]
+
+
+def _canonical(field: models.Field, value):
+    """Stable text form of a field value, equal for equal stored values."""
+    if value is None or value == "":
+        return ""
+    if isinstance(field, models.DecimalField):
+        return str(Decimal(str(value)).quantize(Decimal(1).scaleb(-field.decimal_places)))
+    if isinstance(field, models.DateField) and isinstance(value, datetime):
+        return value.date().isoformat()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(field, models.JSONField):
+        return json.dumps(value, sort_keys=True, default=str)
+    return str(value)
+
+
+def content_hash(record: BillingRecord) -> str:
+    """SHA-256 of a record's billing fields."""
+    payload = "\x1f".join(_canonical(field, getattr(record, field.attname)) for field in HASH_FIELDS)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class WriteStats:
+    """Rows written by one chunk (or a whole run)."""
+
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated + self.unchanged
+
+    def __iadd__(self, other: "WriteStats") -> "WriteStats":
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        return self
+
+
+class RecordDeduplicator:
+    """Assigns dedup keys to one upload's records and upserts them.
+
+    Occurrence numbers for whole-row keys are counted from the start of the
+    run; a resumed run first counts the records committed before its
+    checkpoint (``resume``).
+    """
+
+    def __init__(self, user_id, key_fields: Optional[Sequence[str]] = None):
+        self.user_id = str(user_id)
+        if key_fields is None:
+            key_fields = analytics_setting("DEDUP_KEY_FIELDS")
+        fields = {field.name: field for field in HASH_FIELDS}
+        self.key_fields = [fields[name] for name in key_fields]
+        self._occurrences: Dict[str, int] = defaultdict(int)
+
+    def resume(self, committed: QuerySet) -> None:
+        """Continue the occurrence numbering of an interrupted run.
+
+        ``committed`` are the upload's records up to the checkpoint; every
+        row the run keyed is one of them, as rows matching a stored record
+        move to this upload.
+        """
+        if self.key_fields:
+            return
+        self._occurrences.clear()
+        counts = committed.order_by().values_list("content_hash").annotate(count=Count("pk"))
+        for stored_hash, count in counts:
+            self._occurrences[stored_hash] = count
+
+    def lock(self) -> None:
+        """Serialize upserts of this user's records until the transaction ends.
+
+        A no-op off PostgreSQL, where SQLite already serializes writers.
+        """
+        if connection.vendor != "postgresql":
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"analytics.dedup:{self.user_id}"])
+
+    def key(self, record: BillingRecord) -> str:
+        if self.key_fields:
+            parts = [_canonical(field, getattr(record, field.attname)) for field in self.key_fields]
+        else:
+            self._occurrences[record.content_hash] += 1
+            parts = [record.content_hash, str(self._occurrences[record.content_hash])]
+        return hashlib.sha256("\x1f".join([self.user_id, *parts]).encode()).hexdigest()
+
+    def split(
+        self, records: List[BillingRecord]
+    ) -> Tuple[List[BillingRecord], List[BillingRecord], List[BillingRecord], int, RowErrors]:
+        """Classify records as (new, changed, moved, unchanged count, duplicates).
+
+        ``moved`` are the unchanged records stored under another upload
+        (or row). ``duplicates`` are row errors for rows whose key an
+        earlier row of the same upload already had; they aren't written.
+        Changed and moved records get the primary key of the stored record
+        they match. Call it after ``lock``, in the transaction that writes
+        the records.
+        """
+        first: Dict[str, BillingRecord] = {}
+        duplicates: RowErrors = []
+        for record in records:
+            record.dedup_key = self.key(record)
+            if record.dedup_key in first:
+                duplicates.append(self._duplicate(record, first[record.dedup_key].row_number))
+            else:
+                first[record.dedup_key] = record
+
+        existing = {
+            key: (pk, stored_hash, upload_id, row_number)
+            for key, pk, stored_hash, upload_id, row_number in BillingRecord.objects.filter(
+                user_id=self.user_id, dedup_key__in=list(first)
+            ).values_list("dedup_key", "pk", "content_hash", "upload_id", "row_number")
+        }
+
+        new, changed, moved, unchanged = [], [], [], 0
+        for key, record in first.items():
+            if key not in existing:
+                new.append(record)
+                continue
+            pk, stored_hash, upload_id, row_number = existing[key]
+            if upload_id == record.upload_id and row_number < record.row_number:
+                # Stored from an earlier chunk of this upload
+                duplicates.append(self._duplicate(record, row_number))
+                continue
+            record.pk = pk
+            if stored_hash != record.content_hash:
+                changed.append(record)
+                continue
+            unchanged += 1
+            # Unless an interrupted run of this upload already moved it
+            if (upload_id, row_number) != (record.upload_id, record.row_number):
+                moved.append(record)
+        return new, changed, moved, unchanged, duplicates
+
+    def _duplicate(self, record: BillingRecord, first_row_number: int) -> Tuple[int, str]:
+        fields = ", ".join(field.name for field in self.key_fields)
+        return record.row_number, f"Same {fields} as row {first_row_number}; row skipped"
+
+    @staticmethod
+    def update(records: List[BillingRecord], batch_size: int) -> int:
+        """Overwrite the stored records that ``split`` matched by key."""
+        now = timezone.now()
+        for record in records:
+            record.updated_at = now
+        BillingRecord.objects.bulk_update(records, UPDATE_FIELDS, batch_size=batch_size)
+        return len(records)
+
+    @staticmethod
+    def move(records: List[BillingRecord], batch_size: int) -> None:
+        """Hand the unchanged stored records that ``split`` matched to the new upload."""
+        BillingRecord.objects.bulk_update(records, MOVE_FIELDS, batch_size=batch_size)
@@ -0,0 +1,111 @@
+"""
+Chunked deletion of uploads and billing records.
+
+Deleting through the ORM makes Django's collector load every related
+``BillingRecord`` and send ``post_delete`` for each one, whose handler
+recounts and saves the upload: memory grows with the upload and the work
+is quadratic. Here records are deleted in primary-key order, a chunk at a
+time, with raw deletes (``BillingRecord`` has no dependent rows), and
+upload row counts are updated once at the end.
+"""
+
+import logging
+from typing import Callable, Optional
+
+from django.db import transaction
+from django.db.models import QuerySet
+
+from .conf import analytics_setting
+from .events import publish_upload_event
+from .models import BillingDataUpload, BillingRecord, MappedField, ParsedUploadFile
+from .signals import records_changed
+
+logger = logging.getLogger(__name__)
+
+
+def delete_records(
+    queryset: QuerySet,
+    chunk_size: Optional[int] = None,
+    on_chunk: Optional[Callable[[int], None]] = None,
+    update_uploads: bool = True,
+) -> int:
+    """Delete the queryset's records in keyset-ordered chunks.
+
+    ``on_chunk`` is called with the running total after each chunk. With
+    ``update_uploads`` the ``processed_rows`` of every affected upload is
+    recounted once afterwards. Sends ``records_changed`` for the affected
+    users. Returns the number of records deleted.
+    """
+    chunk_size = chunk_size or analytics_setting("DELETE_CHUNK_SIZE")
+    queryset = queryset.order_by("pk")
+
+    upload_ids = set()
+    if update_uploads:
+        upload_ids = set(queryset.values_list("upload_id", flat=True).distinct())
+
+    deleted = 0
+    last_pk = None
+    user_ids = set()
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(page.values_list("pk", "user_id")[:chunk_size])
+        if not rows:
+            break
+
+        ids = [pk for pk, _ in rows]
+        user_ids.update(user_id for _, user_id in rows)
+
+        chunk = BillingRecord.objects.filter(pk__in=ids)
+        with transaction.atomic():
+            chunk._raw_delete(chunk.db)
+
+        deleted += len(ids)
+        last_pk = ids[-1]
+        if on_chunk is not None:
+            on_chunk(deleted)
+
+    for upload_id in upload_ids:
+        BillingDataUpload.objects.filter(pk=upload_id).update(
+            processed_rows=BillingRecord.objects.filter(upload_id=upload_id).count()
+        )
+    if user_ids:
+        records_changed.send(sender=BillingRecord, user_ids=user_ids)
+    return deleted
+
+
+def delete_upload(upload: BillingDataUpload) -> int:
+    """Delete an upload with its records, mappings and parsed-file cache.
+
+    While records are deleted the upload's status is ``DELETING`` and
+    ``processed_rows`` counts down, published as progress events. Safe to
+    re-run if interrupted. Returns the number of records deleted.
+    """
+    records = BillingRecord.objects.filter(upload=upload)
+    total = records.count()
+
+    upload.status = "DELETING"
+    upload.total_rows = total
+    upload.processed_rows = total
+    upload.save(update_fields=["status", "total_rows", "processed_rows"])
+    publish_upload_event(upload)
+
+    def report(deleted: int) -> None:
+        upload.processed_rows = max(0, total - deleted)
+        BillingDataUpload.objects.filter(pk=upload.pk).update(processed_rows=upload.processed_rows)
+        publish_upload_event(upload)
+
+    deleted = delete_records(records, on_chunk=report, update_uploads=False)
+
+    # The remaining rows are few; ORM deletes keep the parsed-file eviction signal
+    MappedField.objects.filter(upload=upload).delete()
+    ParsedUploadFile.objects.filter(upload=upload).delete()
+    upload_id = upload.pk
+    upload.delete()
+
+    upload.pk = upload_id
+    upload.status = "DELETED"
+    upload.processed_rows = 0
+    publish_upload_event(upload, "deleted")
+
+    logger.info(f"Deleted upload {upload_id} and {deleted} billing records")
+    return deleted
@@ -0,0 +1,63 @@
+"""
+Duplicate-file detection for uploads.
+
+Uploads are checksummed (SHA-256) while the file is streamed in and stored
+under a content-addressed name (see ``upload_to_user_directory``). When a
+user uploads a byte-identical copy of one of their files, the upload views
+send them to the existing upload, whose parsed copy and records are
+already there, instead of parsing and ingesting it again. If they ask to
+keep the copy anyway, the new upload still shares the stored object.
+"""
+
+from typing import Optional
+
+from django.db.models import Case, IntegerField, Value, When
+
+from .models import BillingDataUpload
+
+
+def find_duplicate_upload(user, checksum: str, exclude=None) -> Optional[BillingDataUpload]:
+    """The user's upload with this content, preferring a completed one."""
+    if not checksum:
+        return None
+
+    uploads = (
+        BillingDataUpload.objects.filter(user=user, checksum=checksum)
+        .exclude(status__iexact=BillingDataUpload.UploadStatus.DELETING)
+        .annotate(completed=Case(
+            When(status__iexact=BillingDataUpload.UploadStatus.COMPLETED, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        .order_by("-completed", "-upload_date")
+    )
+    if exclude is not None:
+        uploads = uploads.exclude(pk=exclude)
+    return uploads.first()
+
+
+def duplicate_message(upload: BillingDataUpload) -> str:
+    """Tells the user their file was not processed again."""
+    return (
+        f"You already uploaded this file on {upload.upload_date:%Y-%m-%d %H:%M} as "
+        f"\"{upload.original_filename}\", so it was not processed again. To process "
+        f"it anyway, upload it with \"Process again\" checked."
+    )
+
+
+def reuse_stored_copy(upload: BillingDataUpload, filename: str) -> bool:
+    """Point the upload at an already stored object with the same content.
+
+    Needs ``upload.checksum``. Returns whether a stored copy was found, in
+    which case the file must not be saved again.
+    """
+    if not upload.checksum:
+        return False
+
+    field = upload._meta.get_field("file")
+    name = field.generate_filename(upload, filename)
+    if not field.storage.exists(name):
+        return False
+
+    upload.file = name
+    return True
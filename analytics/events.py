@@ -0,0 +1,317 @@
+"""
+Upload progress event channel.
+
+Ingestion publishes progress and completion events here and the server-sent
+event (SSE) views subscribe to them instead of polling the upload row.
+Events are fanned out in-process; on PostgreSQL they are also sent through
+``NOTIFY`` so subscribers attached to other worker processes receive them.
+
+The streams are async generators, so the site must be served under ASGI
+(``project.asgi`` on uvicorn workers, see the Procfile): under WSGI Django
+collects an async stream into a list before sending any of it, and an open
+stream would hold a sync worker.
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection, connections
+from django.db.utils import load_backend
+
+from .models import BillingDataUpload
+
+logger = logging.getLogger(__name__)
+
+PG_CHANNEL = "analytics_upload_events"
+HEARTBEAT_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 100
+TERMINAL_STATUSES = {"completed", "error", "cancelled", "deleted"}
+
+# Identifies events published by this process so the NOTIFY listener does
+# not deliver them twice.
+PROCESS_TOKEN = uuid.uuid4().hex
+
+
+def upload_channel(upload_id: Any) -> str:
+    """Channel carrying progress events for a single upload."""
+    return f"upload:{upload_id}"
+
+
+def user_channel(user_id: Any) -> str:
+    """Channel carrying completion notifications for a user."""
+    return f"user:{user_id}"
+
+
+def is_terminal_status(status: str) -> bool:
+    """Whether an upload status means processing has finished."""
+    return (status or "").lower() in TERMINAL_STATUSES
+
+
+class EventBroker:
+    """In-process pub/sub that fans events out to asyncio subscribers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        """Register a queue for the channel on the running event loop."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append((loop, queue))
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        """Remove a queue registered with ``subscribe``."""
+        with self._lock:
+            remaining = [
+                (loop, q) for loop, q in self._subscribers.get(channel, [])
+                if q is not queue
+            ]
+            if remaining:
+                self._subscribers[channel] = remaining
+            else:
+                self._subscribers.pop(channel, None)
+
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        """Deliver an event to every subscriber of the channel (thread-safe)."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, []))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # Subscriber's event loop has already been closed
+                self.unsubscribe(channel, queue)
+
+
+def _offer(queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+    """Put an event on a subscriber queue, dropping the oldest when full."""
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(event)
+
+
+broker = EventBroker()
+
+
+def build_upload_event(upload: BillingDataUpload, event: str = "progress") -> Dict[str, Any]:
+    """Build the event payload describing an upload's current state."""
+    progress = 0.0
+    if upload.total_rows:
+        progress = round((upload.processed_rows or 0) / upload.total_rows * 100, 2)
+
+    return {
+        "event": event,
+        "upload_id": str(upload.pk),
+        "user_id": upload.user_id,
+        "status": upload.status,
+        "processed_rows": upload.processed_rows or 0,
+        "total_rows": upload.total_rows or 0,
+        "progress": progress,
+        "error_message": upload.error_message or "",
+    }
+
+
+def publish_upload_event(upload: BillingDataUpload, event: str = "progress") -> Dict[str, Any]:
+    """Publish the upload's state to its subscribers.
+
+    Terminal events (completed/error) are also sent to the owner's
+    notification channel.
+    """
+    payload = build_upload_event(upload, event)
+    _dispatch(payload)
+    _notify_database(payload)
+    return payload
+
+
+def _dispatch(payload: Dict[str, Any]) -> None:
+    """Fan a payload out to the in-process channels it belongs to."""
+    broker.publish(upload_channel(payload["upload_id"]), payload)
+    if payload["event"] != "progress":
+        broker.publish(user_channel(payload["user_id"]), payload)
+
+
+def _notify_database(payload: Dict[str, Any]) -> None:
+    """Send the payload through PostgreSQL NOTIFY for other processes."""
+    if connection.vendor != "postgresql":
+        return
+
+    message = json.dumps(dict(payload, origin=PROCESS_TOKEN), default=str)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [PG_CHANNEL, message])
+    except Exception as e:
+        logger.warning(f"Could not publish upload event via NOTIFY: {str(e)}")
+
+
+class PostgresListener(threading.Thread):
+    """Background thread relaying NOTIFY events into the in-process broker.
+
+    A single LISTEN connection is shared by every SSE subscriber in the
+    process.
+    """
+
+    daemon = True
+
+    def __init__(self):
+        super().__init__(name="analytics-upload-events")
+
+    def run(self) -> None:
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning(f"Upload event listener disconnected: {str(e)}")
+                time.sleep(5)
+
+    def _listen(self) -> None:
+        # A dedicated connection: LISTEN holds it for good, so it must not be a pooled one
+        settings_dict = {**connections["default"].settings_dict}
+        settings_dict["OPTIONS"] = {key: value for key, value in settings_dict["OPTIONS"].items() if key != "pool"}
+        wrapper = load_backend(settings_dict["ENGINE"]).DatabaseWrapper(settings_dict, "default")
+        wrapper.ensure_connection()
+        wrapper.set_autocommit(True)
+        raw_connection = wrapper.connection
+
+        try:
+            with raw_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {PG_CHANNEL}")
+
+            while True:
+                for notification in self._wait(raw_connection):
+                    self._relay(notification.payload)
+        finally:
+            wrapper.close()
+
+    def _wait(self, raw_connection) -> List[Any]:
+        """Notifications received within a heartbeat interval."""
+        if not hasattr(raw_connection, "poll"):
+            # psycopg 3
+            return list(raw_connection.notifies(timeout=HEARTBEAT_SECONDS))
+
+        # psycopg2
+        readable, _, _ = select.select([raw_connection], [], [], HEARTBEAT_SECONDS)
+        if not readable:
+            return []
+        raw_connection.poll()
+        notifications = list(raw_connection.notifies)
+        raw_connection.notifies.clear()
+        return notifications
+
+    def _relay(self, message: str) -> None:
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            return
+
+        if payload.pop("origin", None) == PROCESS_TOKEN:
+            return
+        _dispatch(payload)
+
+
+_listener: Optional[PostgresListener] = None
+_listener_lock = threading.Lock()
+
+
+def ensure_listener() -> None:
+    """Start the NOTIFY listener thread once per process on PostgreSQL."""
+    global _listener
+
+    if connection.vendor != "postgresql":
+        return
+
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = PostgresListener()
+            _listener.start()
+
+
+def format_sse(payload: Dict[str, Any]) -> str:
+    """Serialize a payload as a server-sent event frame."""
+    return f"event: {payload['event']}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+async def _read_upload_event(upload_id: Any) -> Optional[Dict[str, Any]]:
+    """Read the upload's current state straight from the database."""
+    upload = await BillingDataUpload.objects.filter(pk=upload_id).only(
+        "id", "user_id", "status", "processed_rows", "total_rows", "error_message"
+    ).afirst()
+    # Streams stay open for minutes; don't hold a (pooled) connection in between
+    await sync_to_async(close_old_connections)()
+    if upload is None:
+        return None
+
+    event = "progress"
+    if is_terminal_status(upload.status):
+        event = upload.status.lower()
+    return build_upload_event(upload, event)
+
+
+async def stream_upload_events(upload: BillingDataUpload) -> AsyncIterator[str]:
+    """Yield SSE frames for an upload until it reaches a terminal status.
+
+    The current state is sent first. When no event arrives within the
+    heartbeat interval the row is re-read once, which covers publishers in
+    another process when NOTIFY is unavailable (e.g. SQLite).
+    """
+    ensure_listener()
+    channel = upload_channel(upload.pk)
+    queue = broker.subscribe(channel)
+
+    try:
+        last_event = await _read_upload_event(upload.pk)
+        if last_event is None:
+            return
+        yield format_sse(last_event)
+        if last_event["event"] != "progress":
+            return
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                event = await _read_upload_event(upload.pk)
+                if event is None:
+                    return
+                if event == last_event:
+                    yield ": keep-alive\n\n"
+                    continue
+
+            last_event = event
+            yield format_sse(event)
+            if event["event"] != "progress":
+                return
+    finally:
+        broker.unsubscribe(channel, queue)
+
+
+async def stream_user_notifications(user_id: Any) -> AsyncIterator[str]:
+    """Yield SSE frames for the user's upload completion notifications."""
+    ensure_listener()
+    channel = user_channel(user_id)
+    queue = broker.subscribe(channel)
+
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        broker.unsubscribe(channel, queue)
@@ -0,0 +1,215 @@
+"""
+Storage-agnostic access to stored upload files.
+
+The parsers (``analytics.sources``, ``pyarrow``) need a seekable local file,
+but in production uploads live in remote storage (Google Cloud Storage),
+which has no ``path()``. Files are therefore read through a bounded local
+disk cache:
+
+- with local storage (``FileSystemStorage``) the stored file is used in
+  place;
+- otherwise the object is streamed into the cache in
+  ``FILE_READ_CHUNK_SIZE`` pieces (ranged reads on GCS), so it is never
+  held in memory whole, and later reads reuse the cached copy;
+- freshly uploaded files are written to the cache from the request, so
+  parsing them right after the upload doesn't download them again.
+
+Cached upload files are keyed by upload id and SHA-256 checksum. The
+least recently used files are evicted once the cache grows beyond
+``FILE_CACHE_MAX_BYTES``.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+
+from django.core.files.storage import Storage
+
+from .conf import analytics_setting
+
+logger = logging.getLogger(__name__)
+
+_eviction_lock = threading.Lock()
+
+
+def local_storage_path(storage: Storage, name: str) -> Optional[str]:
+    """The file's path when the storage is on the local filesystem."""
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def cache_dir() -> str:
+    directory = analytics_setting("FILE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "analytics-file-cache")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _open_remote(storage: Storage, name: str) -> BinaryIO:
+    """Open a stored object for sequential reading."""
+    bucket = getattr(storage, "bucket", None)
+    if bucket is not None and hasattr(bucket, "blob"):
+        # google-cloud-storage's BlobReader fetches byte ranges on demand,
+        # while the django-storages file object downloads the whole blob
+        normalize = getattr(storage, "_normalize_name", lambda value: value)
+        blob = bucket.blob(normalize(name))
+        return blob.open("rb", chunk_size=analytics_setting("FILE_READ_CHUNK_SIZE"))
+    return storage.open(name, "rb")
+
+
+def iter_stored_chunks(storage: Storage, name: str) -> Iterator[bytes]:
+    """Yield a stored file's bytes in ``FILE_READ_CHUNK_SIZE`` pieces."""
+    chunk_size = analytics_setting("FILE_READ_CHUNK_SIZE")
+    with _open_remote(storage, name) as handle:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _write_cache_file(key: str, chunks: Iterable[bytes]) -> Tuple[str, str]:
+    """Stream chunks into the cache under ``key``. Returns (temp path, checksum)."""
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir(), prefix=f".{key}-")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            for chunk in chunks:
+                digest.update(chunk)
+                handle.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest()
+
+
+def _finish_cache_file(tmp_path: str, key: str) -> str:
+    path = os.path.join(cache_dir(), key)
+    os.replace(tmp_path, path)
+    evict(keep=path)
+    return path
+
+
+def _cached(key: str) -> Optional[str]:
+    path = os.path.join(cache_dir(), key)
+    try:
+        # Reads count as use for eviction
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def evict(keep: Optional[str] = None) -> None:
+    """Remove least recently used cache files beyond ``FILE_CACHE_MAX_BYTES``."""
+    max_bytes = analytics_setting("FILE_CACHE_MAX_BYTES")
+    directory = cache_dir()
+
+    with _eviction_lock:
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                # Open readers keep their handle; the name just goes away
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+def _upload_key(upload, checksum: str) -> str:
+    return f"{upload.pk}-{checksum}"
+
+
+def cache_uploaded_file(upload, uploaded_file) -> str:
+    """Record the checksum of a just-uploaded file and cache it for parsing.
+
+    Streams the request's file (not the stored copy). Sets
+    ``upload.checksum`` without saving (a checksum already set, e.g. while
+    assembling an upload session, is kept). Returns the checksum.
+    """
+    if local_storage_path(upload.file.storage, upload.file.name) is not None:
+        if upload.checksum:
+            return upload.checksum
+        digest = hashlib.sha256()
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+        upload.checksum = digest.hexdigest()
+        return upload.checksum
+
+    tmp_path, upload.checksum = _write_cache_file(str(upload.pk), uploaded_file.chunks())
+    _finish_cache_file(tmp_path, _upload_key(upload, upload.checksum))
+    return upload.checksum
+
+
+def upload_local_path(upload) -> str:
+    """A local path to the upload's file, downloading it into the cache once.
+
+    Uploads stored before checksums were recorded get theirs (saved) on
+    their first download.
+    """
+    path = local_storage_path(upload.file.storage, upload.file.name)
+    if path is not None:
+        return path
+
+    if upload.checksum:
+        cached = _cached(_upload_key(upload, upload.checksum))
+        if cached is not None:
+            return cached
+
+    logger.info(f"Downloading upload {upload.pk} into the local file cache")
+    tmp_path, checksum = _write_cache_file(str(upload.pk), iter_stored_chunks(upload.file.storage, upload.file.name))
+    if upload.checksum and checksum != upload.checksum:
+        logger.warning(f"Stored file of upload {upload.pk} doesn't match its checksum")
+    if checksum != upload.checksum:
+        upload.checksum = checksum
+        type(upload).objects.filter(pk=upload.pk).update(checksum=checksum)
+    return _finish_cache_file(tmp_path, _upload_key(upload, checksum))
+
+
+def _field_file_key(field_file, size: int) -> str:
+    # Stored names aren't reused for different content, so name and size identify it
+    return hashlib.sha1(f"{field_file.name}:{size}".encode()).hexdigest()
+
+
+def cache_field_file(field_file, source_path: str) -> None:
+    """Cache the local file just saved to a remote ``field_file``."""
+    if local_storage_path(field_file.storage, field_file.name) is not None:
+        return
+
+    def chunks() -> Iterator[bytes]:
+        with open(source_path, "rb") as handle:
+            while chunk := handle.read(analytics_setting("FILE_READ_CHUNK_SIZE")):
+                yield chunk
+
+    key = _field_file_key(field_file, os.path.getsize(source_path))
+    tmp_path, _ = _write_cache_file(key, chunks())
+    _finish_cache_file(tmp_path, key)
+
+
+def field_file_local_path(field_file) -> str:
+    """A local path to any stored file (e.g. a parsed Parquet copy)."""
+    path = local_storage_path(field_file.storage, field_file.name)
+    if path is not None:
+        return path
+
+    key = _field_file_key(field_file, field_file.size)
+    cached = _cached(key)
+    if cached is not None:
+        return cached
+
+    tmp_path, _ = _write_cache_file(key, iter_stored_chunks(field_file.storage, field_file.name))
+    return _finish_cache_file(tmp_path, key)
@@ -0,0 +1,74 @@
+"""
+Cached analytics page fragments.
+
+Analytics widgets (statistic cards, chart data, recent records) are cached
+as rendered HTML in the ``FRAGMENT_CACHE_ALIAS`` cache, per user and per
+version of that user's data::
+
+    {% load analytics_fragments %}
+    {% datafragment "analytics-cards" today %}...{% enddatafragment %}
+
+Whatever changes a user's records sends ``records_changed`` (upload
+processing and deletion, record edits, bulk updates and deletes), whose
+receiver calls ``invalidate_user_data``: the user gets a new data version,
+so fragments built from the old data are no longer looked up and simply
+expire. Extra arguments to the tag (e.g. today's date, for widgets over
+"this month") are part of the key as well.
+
+Views hand widget data to the template through ``lazy_context``, so a page
+whose fragments are all cached runs none of their queries.
+
+Fragments are only stored when rendered from the primary: a read replica
+may still lag behind the version in the key. With ``READ_REPLICA`` set,
+they are filled by renders on the primary, i.e. while the user is pinned
+to it after their own changes, which is when a new version starts.
+"""
+
+import uuid
+from typing import Any, Callable, Dict, Iterable, Sequence
+
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.functional import SimpleLazyObject
+
+from .conf import analytics_setting
+
+
+def _version_key(user_id) -> str:
+    return f"analytics:data-version:{user_id}"
+
+
+def fragment_cache():
+    """The fragment cache, or ``None`` when fragment caching is off."""
+    alias = analytics_setting("FRAGMENT_CACHE_ALIAS")
+    return caches[alias] if alias else None
+
+
+def data_version(user_id) -> str:
+    """The current version of the user's analytics data."""
+    cache = fragment_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # First use, or the entry was culled: older fragments are unreachable either way
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_user_data(user_ids: Iterable) -> None:
+    """Stop serving the users' cached fragments; they are rebuilt on next view."""
+    cache = fragment_cache()
+    if cache is None:
+        return
+    cache.set_many({_version_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+
+
+def fragment_key(name: str, user_id, version: str, vary_on: Sequence = ()) -> str:
+    return make_template_fragment_key(name, [user_id, version, *vary_on])
+
+
+def lazy_context(compute: Callable[[], Dict[str, Any]], names: Iterable[str]) -> Dict[str, Any]:
+    """Context entries that are computed together, the first time one is used."""
+    data = SimpleLazyObject(compute)
+    return {name: SimpleLazyObject(lambda name=name: data[name]) for name in names}
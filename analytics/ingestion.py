@@ -0,0 +1,317 @@
+"""
+Billing data ingestion pipeline.
+
+Streams an upload's rows in row ranges from its parsed-file cache (see
+``analytics.parsed_files``), normalizes each range (optionally across a pool
+of worker processes) and loads the resulting ``BillingRecord`` rows chunk by
+chunk, in file order (see ``analytics.loaders``).
+
+Each chunk is committed together with the upload's ``last_checkpoint_row``,
+so an interrupted run can resume after the last committed chunk instead of
+starting over.
+
+Uploads in upsert mode update records already stored from earlier uploads
+instead of duplicating them (see ``analytics.dedup``).
+"""
+
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .conf import analytics_setting
+from .dedup import RecordDeduplicator, WriteStats, content_hash
+from .deletion import delete_records
+from .events import publish_upload_event
+from .loaders import get_record_loader
+from .models import BillingDataUpload, BillingRecord, MappedField
+from .normalization import (
+    REQUIRED_FIELDS, NormalizedRows, RowErrors, format_row_errors, normalize_chunk
+)
+from .parsed_files import open_cached_source
+from .progress import ProgressReporter
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionPipeline:
+    """Normalizes and writes the rows of one upload.
+
+    Normalization runs in-process when ``workers`` is 1. Otherwise row
+    ranges are handed to a ``ProcessPoolExecutor`` and the results are
+    written in submission order, with at most
+    ``workers * INGESTION_MAX_PENDING_CHUNKS`` chunks in flight so memory and
+    DB pressure stay bounded. Row numbers and error order are the same in
+    both modes.
+    """
+
+    def __init__(
+        self,
+        upload: BillingDataUpload,
+        mappings: Dict[str, str],
+        reporter: Optional[ProgressReporter] = None,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        self.upload = upload
+        self.mappings = mappings
+        self.reporter = reporter
+        self.date_format = upload.date_format
+        self.workers = max(1, int(workers or analytics_setting("INGESTION_WORKERS")))
+        self.chunk_size = max(1, int(chunk_size or analytics_setting("CHUNK_SIZE")))
+        self.loader = get_record_loader()
+        self.deduplicator = None
+        if upload.ingestion_mode == BillingDataUpload.IngestionMode.UPSERT:
+            self.deduplicator = RecordDeduplicator(upload.user_id)
+
+    def run(
+        self,
+        frames: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        start_row: int = 0,
+        total_rows: Optional[int] = None,
+    ) -> Tuple[WriteStats, RowErrors]:
+        """Ingest a DataFrame or a stream of DataFrame chunks.
+
+        Returns the write counts and row errors. Rows numbered ``start_row``
+        or lower (a previous checkpoint) are skipped.
+        """
+        if isinstance(frames, pd.DataFrame):
+            total_rows = len(frames)
+            frames = [frames]
+
+        stats = WriteStats()
+        errors: RowErrors = []
+
+        if self.deduplicator is not None and start_row:
+            self.deduplicator.resume(
+                BillingRecord.objects.filter(upload=self.upload, row_number__lte=start_row)
+            )
+
+        chunks = self._normalized_chunks(frames, start_row, total_rows or 0)
+        for last_row_number, (normalized, chunk_errors) in chunks:
+            with transaction.atomic():
+                chunk_stats, write_errors = self._write_chunk(normalized)
+                self._checkpoint(last_row_number, chunk_stats)
+            stats += chunk_stats
+            errors.extend(sorted(chunk_errors + write_errors))
+
+            if self.reporter is not None and chunk_stats.total:
+                self.reporter.advance(chunk_stats.total)
+
+        return stats, errors
+
+    def _checkpoint(self, last_row_number: int, stats: WriteStats) -> None:
+        """Record the last row committed and its counts, in the chunk's transaction."""
+        BillingDataUpload.objects.filter(pk=self.upload.pk).update(
+            last_checkpoint_row=last_row_number,
+            inserted_rows=F("inserted_rows") + stats.inserted,
+            updated_rows=F("updated_rows") + stats.updated,
+            unchanged_rows=F("unchanged_rows") + stats.unchanged,
+        )
+        self.upload.last_checkpoint_row = last_row_number
+        self.upload.inserted_rows += stats.inserted
+        self.upload.updated_rows += stats.updated
+        self.upload.unchanged_rows += stats.unchanged
+
+    def _chunks(self, frames: Iterable[pd.DataFrame], start_row: int) -> Iterator[Tuple[List[dict], int]]:
+        """Yield (rows, first_row_number) for consecutive row ranges."""
+        position = 0
+        for frame in frames:
+            frame_start = position
+            position += len(frame)
+            if position <= start_row:
+                continue
+
+            # Only ship mapped columns to the workers
+            columns = [column for column in dict.fromkeys(self.mappings.values()) if column in frame.columns]
+            frame = frame[columns]
+
+            for start in range(max(0, start_row - frame_start), len(frame), self.chunk_size):
+                rows = frame.iloc[start:start + self.chunk_size].to_dict("records")
+                yield rows, frame_start + start + 1
+
+    def _normalized_chunks(
+        self, frames: Iterable[pd.DataFrame], start_row: int, total_rows: int
+    ) -> Iterator[Tuple[int, Tuple[NormalizedRows, RowErrors]]]:
+        """Yield (last_row_number, normalize_chunk result) in row order."""
+        remaining = total_rows - start_row
+        if self.workers > 1 and remaining >= max(self.chunk_size + 1, analytics_setting("INGESTION_PARALLEL_MIN_ROWS")):
+            yield from self._normalize_parallel(frames, start_row)
+            return
+
+        for rows, first_row_number in self._chunks(frames, start_row):
+            result = normalize_chunk(rows, first_row_number, self.mappings, self.date_format)
+            yield first_row_number + len(rows) - 1, result
+
+    def _normalize_parallel(
+        self, frames: Iterable[pd.DataFrame], start_row: int
+    ) -> Iterator[Tuple[int, Tuple[NormalizedRows, RowErrors]]]:
+        # spawn keeps workers free of inherited DB connections and threads
+        context = multiprocessing.get_context("spawn")
+        max_pending = self.workers * max(1, int(analytics_setting("INGESTION_MAX_PENDING_CHUNKS")))
+
+        logger.info(f"Ingesting upload {self.upload.pk} with {self.workers} worker processes")
+
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            pending = deque()
+            for rows, first_row_number in self._chunks(frames, start_row):
+                future = executor.submit(
+                    normalize_chunk, rows, first_row_number, self.mappings, self.date_format
+                )
+                pending.append((first_row_number + len(rows) - 1, future))
+                if len(pending) >= max_pending:
+                    last_row_number, future = pending.popleft()
+                    yield last_row_number, future.result()
+
+            while pending:
+                last_row_number, future = pending.popleft()
+                yield last_row_number, future.result()
+
+    def _write_chunk(self, normalized: NormalizedRows) -> Tuple[WriteStats, RowErrors]:
+        """Load one chunk, falling back to per-row saves on failure."""
+        records = []
+        errors: RowErrors = []
+
+        for row_number, record_data in normalized:
+            try:
+                record = BillingRecord(
+                    upload=self.upload, user_id=self.upload.user_id, row_number=row_number, **record_data
+                )
+                record.content_hash = content_hash(record)
+                records.append(record)
+            except Exception as e:
+                errors.append((row_number, str(e)))
+
+        stats = WriteStats()
+        if self.deduplicator is not None and records:
+            # Held until the chunk commits, so no other upload writes these keys in between
+            self.deduplicator.lock()
+            records, changed, moved, stats.unchanged, duplicates = self.deduplicator.split(records)
+            errors += duplicates
+            stats.updated = self.deduplicator.update(changed, self.chunk_size)
+            self.deduplicator.move(moved, self.chunk_size)
+
+        stats.inserted, insert_errors = self._insert(records)
+        return stats, errors + insert_errors
+
+    def _insert(self, records: List[BillingRecord]) -> Tuple[int, RowErrors]:
+        if not records:
+            return 0, []
+
+        try:
+            with transaction.atomic():
+                self.loader.load(records)
+            return len(records), []
+        except Exception as e:
+            logger.warning(f"Bulk insert failed for upload {self.upload.pk}, retrying row by row: {str(e)}")
+
+        # Retry individually so the failing rows can be reported
+        created = 0
+        errors: RowErrors = []
+        for record in records:
+            record.pk = None
+            try:
+                with transaction.atomic():
+                    record.save()
+                created += 1
+            except Exception as e:
+                errors.append((record.row_number, str(e)))
+
+        return created, errors
+
+
+def _prepare_checkpoint(upload: BillingDataUpload, resume: bool) -> int:
+    """Reset or restore ingestion state. Returns the row to start after."""
+    records = BillingRecord.objects.filter(upload=upload)
+
+    # BillingRecord has no dependent rows, so raw deletes are safe and skip
+    # the per-row delete signals.
+    if resume and upload.last_checkpoint_row:
+        stale = records.filter(row_number__gt=upload.last_checkpoint_row)
+        stale._raw_delete(stale.db)
+        if upload.ingestion_mode == BillingDataUpload.IngestionMode.UPSERT:
+            # Unchanged rows have no record of their own to count
+            upload.processed_rows = upload.inserted_rows + upload.updated_rows + upload.unchanged_rows
+        else:
+            upload.processed_rows = records.count()
+        return upload.last_checkpoint_row
+
+    delete_records(records, update_uploads=False)
+    upload.processed_rows = 0
+    upload.last_checkpoint_row = 0
+    upload.inserted_rows = upload.updated_rows = upload.unchanged_rows = 0
+    return 0
+
+
+def _fail(upload: BillingDataUpload, message: str) -> None:
+    upload.status = "ERROR"
+    upload.error_message = message
+    upload.save(update_fields=["status", "error_message"])
+    publish_upload_event(upload, "error")
+
+
+def process_upload(upload: BillingDataUpload, resume: bool = False) -> None:
+    """Process the upload and create billing records.
+
+    A fresh run replaces any records left by earlier runs. With ``resume``
+    processing continues after ``last_checkpoint_row``; row errors reported
+    by the interrupted run are not repeated.
+    """
+    reporter = None
+    try:
+        # Get mappings
+        mappings = {
+            mapping.mapped_field: mapping.original_column
+            for mapping in MappedField.objects.filter(upload=upload)
+        }
+
+        if not mappings:
+            _fail(upload, "No column mappings found")
+            return
+
+        # Check if required fields are mapped
+        missing_required = [field for field in REQUIRED_FIELDS if field not in mappings]
+        if missing_required:
+            _fail(upload, f"Missing required field mappings: {', '.join(missing_required)}")
+            return
+
+        try:
+            source = open_cached_source(upload)
+            if not upload.total_rows:
+                upload.total_rows = source.count_rows()
+        except Exception as e:
+            _fail(upload, f"Error reading file: {str(e)}")
+            return
+
+        start_row = _prepare_checkpoint(upload, resume)
+        upload.save(update_fields=[
+            "total_rows", "processed_rows", "last_checkpoint_row",
+            "inserted_rows", "updated_rows", "unchanged_rows",
+        ])
+
+        # Create billing records, streaming the file chunk by chunk
+        reporter = ProgressReporter(upload)
+        pipeline = IngestionPipeline(upload, mappings, reporter=reporter)
+        stats, errors = pipeline.run(
+            source.iter_chunks(), start_row=start_row, total_rows=upload.total_rows
+        )
+
+        # Final update, written once
+        status = "COMPLETED" if reporter.processed > 0 or not errors else "ERROR"
+        reporter.finish(status, format_row_errors(errors, reporter.processed))
+
+    except Exception as e:
+        if reporter is not None:
+            reporter.finish("ERROR", f"Processing error: {str(e)}")
+            return
+        upload.status = "ERROR"
+        upload.error_message = f"Processing error: {str(e)}"
+        upload.processing_completed_at = timezone.now()
+        upload.save()
+        publish_upload_event(upload, "error")
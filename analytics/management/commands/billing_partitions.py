@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError, connection
+
+from analytics.partitioning import (
+    DEFAULT_HASH_PARTITIONS, STRATEGIES, convert_table, current_strategy, get_config, list_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = 'Show or convert to PostgreSQL partitioning of billing records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['status', 'convert'],
+            help='status: report partitions; convert: partition the table',
+        )
+        parser.add_argument('--strategy', choices=list(STRATEGIES), help='Partitioning strategy (default: RECORD_PARTITIONING)')
+        parser.add_argument('--partitions', type=int, help='Number of hash partitions')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(f'Partitioning requires PostgreSQL (database is {connection.vendor})')
+
+        config = get_config() or {}
+        action = options['action']
+
+        if action == 'convert':
+            strategy = options['strategy'] or config.get('strategy')
+            if not strategy:
+                raise CommandError('Pass --strategy or set RECORD_PARTITIONING')
+            try:
+                convert_table(
+                    connection,
+                    strategy,
+                    partitions=options['partitions'] or config.get('partitions', DEFAULT_HASH_PARTITIONS),
+                    log=self.stdout.write,
+                )
+            except NotSupportedError as e:
+                raise CommandError(str(e))
+
+        strategy = current_strategy(connection)
+        if not strategy:
+            self.stdout.write('Billing records are not partitioned')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Partitioned by {strategy}'))
+        for partition in list_partitions(connection):
+            self.stdout.write(f"{partition['name']}: {partition['bound']} (~{partition['rows']} rows)")
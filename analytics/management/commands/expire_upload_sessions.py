@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from analytics.upload_sessions import expire_sessions
+
+
+class Command(BaseCommand):
+    help = 'Abort resumable upload sessions left unfinished and delete their stored parts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Expire sessions without a received part for at least this many hours',
+        )
+
+    def handle(self, *args, **options):
+        count = expire_sessions(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Expired {count} upload sessions'))
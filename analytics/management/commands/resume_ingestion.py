@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from analytics.ingestion import process_upload
+from analytics.models import BillingDataUpload, BillingRecord
+from analytics.signals import records_changed
+from analytics.tasks import claim_for_resume
+
+
+class Command(BaseCommand):
+    help = 'Resume uploads left in processing (worker killed, OOM) from their last committed checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('upload_ids', nargs='*', help='Uploads to resume (default: all stale processing uploads)')
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=60,
+            help='Only pick up uploads that started processing at least this many minutes ago',
+        )
+
+    def handle(self, *args, **options):
+        uploads = BillingDataUpload.objects.filter(status__iexact='processing')
+
+        if options['upload_ids']:
+            uploads = uploads.filter(pk__in=options['upload_ids'])
+        else:
+            cutoff = timezone.now() - timedelta(minutes=options['stale_minutes'])
+            uploads = uploads.filter(processing_started_at__lte=cutoff)
+
+        for upload in uploads:
+            # Another resumer may have taken it since the query ran
+            if not claim_for_resume(upload):
+                self.stdout.write(self.style.WARNING(f'Skipping {upload.pk}: already resumed elsewhere'))
+                continue
+            self.stdout.write(f'Resuming {upload.pk} after row {upload.last_checkpoint_row}')
+            process_upload(upload, resume=True)
+            records_changed.send(sender=BillingRecord, user_ids=[upload.user_id])
+            upload.refresh_from_db(fields=['status', 'processed_rows'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{upload.pk}: {upload.status} ({upload.processed_rows} records)'
+            ))
@@ -0,0 +1,228 @@
+"""
+Column mapping recommendations.
+
+Suggestions come from, in order:
+
+1. A ``MappingTemplate`` whose header signature (the normalized, order
+   independent set of headers) matches the file exactly. Templates are
+   learned whenever a user saves a mapping, so a repeat upload of the same
+   export format is mapped with no manual step.
+2. Fuzzy matching of each header against the names the user has mapped
+   each field from before (their ``MappedField`` history) and built-in
+   synonyms, scored by token and trigram similarity. Each column is used
+   for at most one field.
+"""
+
+import hashlib
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.utils import timezone
+
+from .conf import analytics_setting
+from .models import BillingDataUpload, MappedField, MappingTemplate
+from .normalization import REQUIRED_FIELDS
+
+# Built-in names for each billing field, used until a user has history
+FIELD_SYNONYMS = {
+    "customer_name": [
+        "customer name", "client name", "company", "company name", "customer", "client", "name",
+    ],
+    "invoice_number": [
+        "invoice number", "invoice id", "invoice no", "inv num", "inv number", "bill number", "invoice",
+    ],
+    "amount": [
+        "amount", "total", "invoice amount", "bill amount", "grand total", "cost", "price", "value",
+    ],
+    "date": [
+        "date", "invoice date", "bill date", "created date", "transaction date", "timestamp",
+    ],
+    "payment_status": ["payment status", "status", "paid", "payment"],
+    "description": ["description", "notes", "memo", "comment", "details"],
+    "product_name": ["product name", "product", "item", "service"],
+    "quantity": ["quantity", "qty", "units"],
+    "unit_price": ["unit price", "rate", "price per unit"],
+    "tax_amount": ["tax amount", "tax", "gst", "vat"],
+    "discount": ["discount", "discount amount"],
+    "payment_method": ["payment method", "payment mode", "method"],
+}
+
+# Learned names get a small bonus over built-in synonyms
+HISTORY_BONUS = 0.05
+# A token that abbreviates another ("inv" for "invoice") counts this much
+ABBREVIATION_WEIGHT = 0.9
+
+
+def normalize_header(header: str) -> str:
+    """Lower-case a header and collapse separators to single spaces."""
+    return " ".join(re.sub(r"[_\-./#:]+", " ", str(header).lower()).split())
+
+
+def header_signature(headers: List[str]) -> str:
+    """Order-independent fingerprint of a header set."""
+    normalized = sorted(normalize_header(header) for header in headers)
+    return hashlib.sha1("\x1f".join(normalized).encode()).hexdigest()
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _token_score(tokens_a: List[str], tokens_b: List[str]) -> float:
+    """Dice overlap of two token lists; abbreviations ("inv", "qty") count
+    as a partial match for the word they start."""
+    if not tokens_a or not tokens_b:
+        return 0.0
+
+    def match(token: str, others: List[str]) -> float:
+        if token in others:
+            return 1.0
+        if len(token) >= 3 and any(other.startswith(token) or token.startswith(other) for other in others if len(other) >= 3):
+            return ABBREVIATION_WEIGHT
+        return 0.0
+
+    matched = sum(match(token, tokens_b) for token in tokens_a) + sum(match(token, tokens_a) for token in tokens_b)
+    return matched / (len(tokens_a) + len(tokens_b))
+
+
+def similarity(a: str, b: str) -> float:
+    """Best of token and trigram similarity of two normalized names."""
+    if a == b:
+        return 1.0
+
+    token_score = _token_score(a.split(), b.split())
+
+    trigrams_a, trigrams_b = _trigrams(a), _trigrams(b)
+    trigram_score = len(trigrams_a & trigrams_b) / len(trigrams_a | trigrams_b)
+
+    return max(token_score, trigram_score)
+
+
+@dataclass
+class Recommendation:
+    """Suggested mappings (billing field -> column) and where they came from."""
+
+    mappings: Dict[str, str] = field(default_factory=dict)
+    scores: Dict[str, float] = field(default_factory=dict)
+    template: Optional[MappingTemplate] = None
+
+    @property
+    def is_complete(self) -> bool:
+        return all(name in self.mappings for name in REQUIRED_FIELDS)
+
+
+class MappingRecommender:
+    """Recommends column mappings for one user's uploads."""
+
+    def __init__(self, user):
+        self.user = user
+        self._vocabulary: Optional[Dict[str, Dict[str, float]]] = None
+
+    def _build_vocabulary(self) -> Dict[str, Dict[str, float]]:
+        """Known names per field: built-in synonyms plus the user's history."""
+        vocabulary: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for name, synonyms in FIELD_SYNONYMS.items():
+            for synonym in synonyms:
+                vocabulary[name][synonym] = 0.0
+
+        history = (
+            MappedField.objects.filter(upload__user=self.user)
+            .exclude(mapped_field=MappedField.FieldType.CUSTOM)
+            .values_list("mapped_field", "original_column")
+            .distinct()
+        )
+        for name, column in history:
+            vocabulary[name][normalize_header(column)] = HISTORY_BONUS
+
+        return vocabulary
+
+    @property
+    def vocabulary(self) -> Dict[str, Dict[str, float]]:
+        if self._vocabulary is None:
+            self._vocabulary = self._build_vocabulary()
+        return self._vocabulary
+
+    def find_template(self, headers: List[str]) -> Optional[MappingTemplate]:
+        """Return the user's template for this exact header set, if any."""
+        template = MappingTemplate.objects.filter(
+            user=self.user, header_signature=header_signature(headers)
+        ).first()
+        if template is None or not set(template.mappings.values()) <= set(headers):
+            return None
+        return template
+
+    def fuzzy_match(self, headers: List[str]) -> Tuple[Dict[str, str], Dict[str, float]]:
+        """Match headers to fields by similarity, each column used once."""
+        threshold = analytics_setting("MAPPING_MATCH_THRESHOLD")
+        candidates = []
+        for header in headers:
+            normalized = normalize_header(header)
+            for name, known in self.vocabulary.items():
+                score = max(
+                    min(1.0, similarity(normalized, candidate) + bonus)
+                    for candidate, bonus in known.items()
+                )
+                if score >= threshold:
+                    candidates.append((score, name, header))
+
+        mappings, scores = {}, {}
+        used_columns = set()
+        for score, name, header in sorted(candidates, key=lambda c: -c[0]):
+            if name in mappings or header in used_columns:
+                continue
+            mappings[name] = header
+            scores[name] = round(score, 3)
+            used_columns.add(header)
+        return mappings, scores
+
+    def recommend(self, headers: List[str]) -> Recommendation:
+        template = self.find_template(headers)
+        if template is not None:
+            return Recommendation(
+                mappings=dict(template.mappings),
+                scores={name: 1.0 for name in template.mappings},
+                template=template,
+            )
+
+        mappings, scores = self.fuzzy_match(headers)
+        return Recommendation(mappings=mappings, scores=scores)
+
+
+def apply_mappings(upload: BillingDataUpload, mappings: Dict[str, str]) -> int:
+    """Replace the upload's column mappings. Returns the number saved."""
+    MappedField.objects.filter(upload=upload).delete()
+    MappedField.objects.bulk_create([
+        MappedField(
+            upload=upload,
+            original_column=column,
+            mapped_field=name,
+            is_required=name in REQUIRED_FIELDS,
+        )
+        for name, column in mappings.items()
+    ])
+    return len(mappings)
+
+
+def learn_template(upload: BillingDataUpload, headers: List[str], mappings: Dict[str, str]) -> MappingTemplate:
+    """Remember the mapping for this file layout (one template per layout)."""
+    template, created = MappingTemplate.objects.get_or_create(
+        user=upload.user,
+        header_signature=header_signature(headers),
+        defaults={"name": upload.original_filename},
+    )
+    template.headers = list(headers)
+    template.mappings = dict(mappings)
+    template.date_format = upload.date_format
+    template.usage_count += 1
+    template.last_used_at = timezone.now()
+    template.save()
+    return template
+
+
+def mark_template_used(template: MappingTemplate) -> None:
+    template.usage_count += 1
+    template.last_used_at = timezone.now()
+    template.save(update_fields=["usage_count", "last_used_at"])
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:06
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_rows(apps, schema_editor):
+    """Keep the first record for each (upload, row_number) before adding the constraint."""
+    BillingRecord = apps.get_model("analytics", "BillingRecord")
+    duplicates = (
+        BillingRecord.objects.values("upload_id", "row_number")
+        .annotate(keep_id=Min("id"), total=models.Count("id"))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        BillingRecord.objects.filter(
+            upload_id=duplicate["upload_id"],
+            row_number=duplicate["row_number"],
+        ).exclude(id=duplicate["keep_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_add_date_format_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingdataupload',
+            name='last_checkpoint_row',
+            field=models.PositiveIntegerField(default=0, help_text='Last file row number committed by ingestion; processing resumes after it'),
+        ),
+        migrations.RunPython(remove_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='billingrecord',
+            constraint=models.UniqueConstraint(fields=('upload', 'row_number'), name='unique_billing_record_upload_row'),
+        ),
+    ]
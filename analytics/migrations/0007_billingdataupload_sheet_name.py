@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_billingdataupload_last_checkpoint_row_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingdataupload',
+            name='sheet_name',
+            field=models.CharField(blank=True, help_text='Worksheet to read for Excel uploads (blank uses the first sheet)', max_length=255),
+        ),
+    ]
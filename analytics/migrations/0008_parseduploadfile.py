@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:13
+
+import analytics.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_billingdataupload_sheet_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParsedUploadFile',
+            fields=[
+                ('upload', models.OneToOneField(help_text='Upload this file was parsed from', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='parsed_file', serialize=False, to='analytics.billingdataupload')),
+                ('sheet_name', models.CharField(blank=True, help_text='Worksheet that was parsed (blank for CSV files)', max_length=255)),
+                ('sheet_names', models.JSONField(blank=True, default=list, help_text='All worksheets in the workbook')),
+                ('encoding', models.CharField(blank=True, help_text='Detected CSV encoding', max_length=50)),
+                ('delimiter', models.CharField(blank=True, help_text='Detected CSV delimiter', max_length=5)),
+                ('headers', models.JSONField(default=list, help_text='Cleaned column headers')),
+                ('sample_rows', models.JSONField(default=list, help_text='First rows of the file, with every cell as text')),
+                ('row_count', models.PositiveIntegerField(default=0, help_text='Number of data rows (excluding the header)')),
+                ('data_file', models.FileField(blank=True, help_text='Parquet copy of the data, with every cell as text', upload_to=analytics.models.parsed_file_upload_to)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Parsed Upload File',
+                'verbose_name_plural': 'Parsed Upload Files',
+            },
+        ),
+    ]
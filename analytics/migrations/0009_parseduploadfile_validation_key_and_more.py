@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0008_parseduploadfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parseduploadfile',
+            name='validation_key',
+            field=models.CharField(blank=True, help_text='Fingerprint of the mappings the stored validation report was built for', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='parseduploadfile',
+            name='validation_result',
+            field=models.JSONField(blank=True, help_text='Last whole-file dry-run validation report', null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0009_parseduploadfile_validation_key_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MappingTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Display name, taken from the file the template was learned from', max_length=255)),
+                ('header_signature', models.CharField(help_text='Fingerprint of the normalized header set', max_length=40)),
+                ('headers', models.JSONField(default=list, help_text='Headers of the file layout')),
+                ('mappings', models.JSONField(default=dict, help_text='Billing field to file column')),
+                ('date_format', models.CharField(default='DD/MM/YYYY', help_text='Date format used by this layout', max_length=20)),
+                ('auto_process', models.BooleanField(default=True, help_text='Map and queue matching uploads for processing without review')),
+                ('usage_count', models.PositiveIntegerField(default=0, help_text='Uploads mapped with this template')),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now, help_text='When the template was last applied or saved')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(help_text='User the template was learned from', on_delete=django.db.models.deletion.CASCADE, related_name='mapping_templates', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Mapping Template',
+                'verbose_name_plural': 'Mapping Templates',
+                'ordering': ['-last_used_at'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'header_signature'), name='unique_mapping_template_user_signature')],
+            },
+        ),
+    ]
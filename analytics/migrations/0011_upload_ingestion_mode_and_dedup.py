@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0010_mappingtemplate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingdataupload',
+            name='ingestion_mode',
+            field=models.CharField(choices=[('append', 'Append all rows'), ('upsert', 'Update existing records, skip unchanged')], default='append', help_text='Whether rows already stored from earlier uploads are updated or added again', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='billingdataupload',
+            name='inserted_rows',
+            field=models.PositiveIntegerField(default=0, help_text='Rows stored as new records'),
+        ),
+        migrations.AddField(
+            model_name='billingdataupload',
+            name='unchanged_rows',
+            field=models.PositiveIntegerField(default=0, help_text='Rows identical to an existing record, not written'),
+        ),
+        migrations.AddField(
+            model_name='billingdataupload',
+            name='updated_rows',
+            field=models.PositiveIntegerField(default=0, help_text='Rows that changed an existing record'),
+        ),
+        migrations.AddField(
+            model_name='billingrecord',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the billing fields, used to skip unchanged rows', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='billingrecord',
+            name='dedup_key',
+            field=models.CharField(blank=True, editable=False, help_text="Identity across the user's uploads; set for rows ingested in upsert mode", max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0011_upload_ingestion_mode_and_dedup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='billingdataupload',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('mapped', 'Mapped'), ('processing', 'Processing'), ('completed', 'Completed'), ('error', 'Error'), ('cancelled', 'Cancelled'), ('deleting', 'Deleting')], default='pending', help_text='Current processing status of the upload', max_length=20),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_upload_owner(apps, schema_editor):
+    """Fill the tenant key of existing records from their upload."""
+    BillingDataUpload = apps.get_model("analytics", "BillingDataUpload")
+    BillingRecord = apps.get_model("analytics", "BillingRecord")
+    BillingRecord.objects.filter(user__isnull=True).update(
+        user_id=Subquery(BillingDataUpload.objects.filter(pk=OuterRef("upload_id")).values("user_id")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0012_upload_status_deleting'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingrecord',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='Owner of the upload; tenant key for scoped queries and partitioning', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='billing_records', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_upload_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0013_billingrecord_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # Separate from the backfill: PostgreSQL can't alter a table with pending
+    # deferred foreign key checks in the same transaction
+    operations = [
+        migrations.AlterField(
+            model_name='billingrecord',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='Owner of the upload; tenant key for scoped queries and partitioning', on_delete=django.db.models.deletion.CASCADE, related_name='billing_records', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='billingrecord',
+            index=models.Index(fields=['user', 'date'], name='analytics_b_user_id_c58ecb_idx'),
+        ),
+    ]
@@ -0,0 +1,132 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.db import migrations
+
+# Self-contained copy of the conversion in analytics.partitioning as of this
+# migration, so later changes to that module or the model don't alter it.
+TABLE = 'analytics_billingrecord'
+STRATEGIES = {'hash': 'user_id'}
+
+
+def _temp_name(name):
+    return f'tmp_{hashlib.md5(name.encode()).hexdigest()[:20]}'
+
+
+def _is_partitioned(cursor):
+    cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+    return cursor.fetchone() is not None
+
+
+def _constraints(cursor):
+    cursor.execute(
+        """
+        SELECT con.conname, con.contype, pg_get_constraintdef(con.oid),
+               ARRAY(
+                   SELECT a.attname FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, n)
+                   JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+                   ORDER BY k.n
+               )
+        FROM pg_constraint con
+        WHERE con.conrelid = to_regclass(%s) AND con.contype IN ('p', 'u', 'f')
+        """,
+        [TABLE],
+    )
+    return cursor.fetchall()
+
+
+def _indexes(cursor):
+    cursor.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = to_regclass(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+        """,
+        [TABLE],
+    )
+    return cursor.fetchall()
+
+
+def partition_records(apps, schema_editor):
+    # A no-op unless RECORD_PARTITIONING is set on PostgreSQL
+    config = getattr(settings, 'ANALYTICS_CONFIG', {}).get('RECORD_PARTITIONING')
+    connection = schema_editor.connection
+    if not config or connection.vendor != 'postgresql':
+        return
+
+    strategy = config.get('strategy')
+    if strategy not in STRATEGIES:
+        raise ValueError(f'RECORD_PARTITIONING strategy must be one of {", ".join(STRATEGIES)}, got {strategy!r}')
+    partitions = int(config.get('partitions', 16))
+
+    quote_name = connection.ops.quote_name
+    key = STRATEGIES[strategy]
+    staging = f'{TABLE}_partitioned'
+    renames = []
+
+    with connection.cursor() as cursor:
+        if _is_partitioned(cursor):
+            return
+
+        cursor.execute(f'LOCK TABLE {quote_name(TABLE)} IN EXCLUSIVE MODE')
+        cursor.execute(
+            f'CREATE TABLE {quote_name(staging)} (LIKE {quote_name(TABLE)} '
+            f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY {strategy.upper()} ({quote_name(key)})'
+        )
+
+        # Primary key and unique constraints must include the partition key
+        for name, kind, definition, columns in _constraints(cursor):
+            temp = _temp_name(name)
+            if kind == 'f':
+                cursor.execute(f'ALTER TABLE {quote_name(staging)} ADD CONSTRAINT {quote_name(temp)} {definition}')
+            else:
+                if key not in columns:
+                    columns = [*columns, key]
+                kind_sql = 'PRIMARY KEY' if kind == 'p' else 'UNIQUE'
+                column_sql = ', '.join(quote_name(column) for column in columns)
+                cursor.execute(
+                    f'ALTER TABLE {quote_name(staging)} ADD CONSTRAINT {quote_name(temp)} {kind_sql} ({column_sql})'
+                )
+            renames.append(('ALTER TABLE {table} RENAME CONSTRAINT {old} TO {new}', temp, name))
+
+        for name, definition in _indexes(cursor):
+            temp = _temp_name(name)
+            definition = re.sub(
+                r'^(CREATE (?:UNIQUE )?INDEX) \S+ ON \S+ ',
+                lambda match: f'{match.group(1)} {quote_name(temp)} ON {quote_name(staging)} ',
+                definition,
+            )
+            cursor.execute(definition)
+            renames.append(('ALTER INDEX {old} RENAME TO {new}', temp, name))
+
+        for remainder in range(partitions):
+            cursor.execute(
+                f'CREATE TABLE {quote_name(f"{TABLE}_p{remainder}")} PARTITION OF {quote_name(staging)} '
+                f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})'
+            )
+
+        cursor.execute(f'INSERT INTO {quote_name(staging)} SELECT * FROM {quote_name(TABLE)}')
+        cursor.execute(f'DROP TABLE {quote_name(TABLE)}')
+        cursor.execute(f'ALTER TABLE {quote_name(staging)} RENAME TO {quote_name(TABLE)}')
+        for statement, temp, name in renames:
+            cursor.execute(statement.format(table=quote_name(TABLE), old=quote_name(temp), new=quote_name(name)))
+
+        # Identity columns on partitioned tables need PostgreSQL 17
+        sequence = quote_name(f'{TABLE}_id_seq')
+        cursor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {quote_name(TABLE)}.id')
+        cursor.execute(f"SELECT setval('{sequence}', COALESCE(MAX(id), 0) + 1, false) FROM {quote_name(TABLE)}")
+        cursor.execute(f"ALTER TABLE {quote_name(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0014_billingrecord_user_not_null'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_records, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def lowercase_payment_statuses(apps, schema_editor):
+    # The old admin actions wrote PAID/OVERDUE/PENDING, outside the choices
+    BillingRecord = apps.get_model('analytics', 'BillingRecord')
+    BillingRecord.objects.filter(payment_status__in=['PAID', 'OVERDUE', 'PENDING']).update(
+        payment_status=Lower('payment_status')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0015_billingrecord_partitioning'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkUpdateJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(help_text='What the job does, e.g. the admin action', max_length=255)),
+                ('values', models.JSONField(default=dict, help_text='Field values written to each record')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('error', 'Error')], default='queued', help_text='Current state of the job', max_length=20)),
+                ('total_records', models.PositiveIntegerField(blank=True, help_text='Records matched, counted when the job starts', null=True)),
+                ('updated_records', models.PositiveIntegerField(default=0, help_text='Records updated so far')),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, help_text='User who started the job', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bulk_update_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Bulk Update Job',
+                'verbose_name_plural': 'Bulk Update Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(lowercase_payment_statuses, migrations.RunPython.noop),
+    ]
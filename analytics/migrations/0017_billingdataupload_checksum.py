@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0016_bulkupdatejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingdataupload',
+            name='checksum',
+            field=models.CharField(blank=True, help_text='SHA-256 of the file contents', max_length=64),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:43
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0017_billingdataupload_checksum'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(help_text='Name of the file being uploaded', max_length=255)),
+                ('file_size', models.PositiveBigIntegerField(help_text='Total size of the file in bytes')),
+                ('part_size', models.PositiveIntegerField(help_text='Size of every part but the last, in bytes')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('completed', 'Completed'), ('aborted', 'Aborted')], default='open', help_text='Current state of the session', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('upload', models.OneToOneField(blank=True, help_text='Upload created when the session was completed', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='analytics.billingdataupload')),
+                ('user', models.ForeignKey(help_text='User uploading the file', on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload Session',
+                'verbose_name_plural': 'Upload Sessions',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0018_uploadsession'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='billingdataupload',
+            index=models.Index(fields=['user', 'checksum'], name='analytics_b_user_id_650d49_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0019_billingdataupload_user_checksum_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, help_text='Existing upload of the same file, when the session completed as a duplicate', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='analytics.billingdataupload'),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='message',
+            field=models.TextField(blank=True, help_text='Outcome of completing the session, until it is shown to the user'),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='message_level',
+            field=models.PositiveSmallIntegerField(default=20, help_text='Message level (django.contrib.messages) of the message'),
+        ),
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('completing', 'Completing'), ('completed', 'Completed'), ('failed', 'Failed'), ('aborted', 'Aborted')], default='open', help_text='Current state of the session', max_length=20),
+        ),
+    ]
@@ -5,6 +5,7 @@ from typing import Dict, Any, Optional
 
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.messages import constants as message_constants
 from django.core.validators import FileExtensionValidator
 from django.utils import timezone
 from django.urls import reverse
@@ -14,6 +15,11 @@ User = get_user_model()
 
 def upload_to_user_directory(instance: "BillingDataUpload", filename: str) -> str:
     """Generate upload path for user files."""
+    if instance.checksum:
+        # Content-addressed, so identical files share one stored object:
+        # MEDIA_ROOT/billing_uploads/user_<id>/<hash[:2]>/<hash>.<ext>
+        extension = os.path.splitext(filename)[1].lower()
+        return f"billing_uploads/user_{instance.user.id}/{instance.checksum[:2]}/{instance.checksum}{extension}"
     # File will be uploaded to MEDIA_ROOT/billing_uploads/user_<id>/<filename>
     return f"billing_uploads/user_{instance.user.id}/{filename}"
 
@@ -28,6 +34,11 @@ class BillingDataUpload(models.Model):
         COMPLETED = "completed", "Completed"
         ERROR = "error", "Error"
         CANCELLED = "cancelled", "Cancelled"
+        DELETING = "deleting", "Deleting"
+    
+    class IngestionMode(models.TextChoices):
+        APPEND = "append", "Append all rows"
+        UPSERT = "upsert", "Update existing records, skip unchanged"
     
     # Core fields
     id = models.UUIDField(
@@ -68,6 +79,16 @@ class BillingDataUpload(models.Model):
     file_size = models.PositiveIntegerField(
         help_text="Size of the uploaded file in bytes"
     )
+    checksum = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="SHA-256 of the file contents"
+    )
+    sheet_name = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Worksheet to read for Excel uploads (blank uses the first sheet)"
+    )
     
     # Processing metadata
     total_rows = models.PositiveIntegerField(
@@ -83,6 +104,24 @@ class BillingDataUpload(models.Model):
         blank=True,
         help_text="Error message if processing failed"
     )
+    last_checkpoint_row = models.PositiveIntegerField(
+        default=0,
+        help_text="Last file row number committed by ingestion; processing resumes after it"
+    )
+    
+    # Upsert mode results; processed_rows is their sum
+    inserted_rows = models.PositiveIntegerField(
+        default=0,
+        help_text="Rows stored as new records"
+    )
+    updated_rows = models.PositiveIntegerField(
+        default=0,
+        help_text="Rows that changed an existing record"
+    )
+    unchanged_rows = models.PositiveIntegerField(
+        default=0,
+        help_text="Rows identical to an existing record, not written"
+    )
     
     # Processing timestamps
     processing_started_at = models.DateTimeField(
@@ -111,6 +150,12 @@ class BillingDataUpload(models.Model):
         ],
         help_text="Date format used in the uploaded file"
     )
+    ingestion_mode = models.CharField(
+        max_length=10,
+        choices=IngestionMode.choices,
+        default=IngestionMode.APPEND,
+        help_text="Whether rows already stored from earlier uploads are updated or added again"
+    )
     
     class Meta:
         ordering = ["-upload_date"]
@@ -119,6 +164,7 @@ class BillingDataUpload(models.Model):
         indexes = [
             models.Index(fields=["user", "-upload_date"]),
             models.Index(fields=["status"]),
+            models.Index(fields=["user", "checksum"]),
         ]
     
     def __str__(self) -> str:
@@ -230,6 +276,13 @@ class BillingRecord(models.Model):
         related_name="billing_records",
         help_text="The upload this record originated from"
     )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="billing_records",
+        db_index=False,  # Covered by the (user, date) index
+        help_text="Owner of the upload; tenant key for scoped queries and partitioning"
+    )
     
     # Standard billing fields
     date = models.DateField(
@@ -312,6 +365,20 @@ class BillingRecord(models.Model):
     row_number = models.PositiveIntegerField(
         help_text="Original row number in the uploaded file"
     )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        help_text="Hash of the billing fields, used to skip unchanged rows"
+    )
+    dedup_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        help_text="Identity across the user's uploads; set for rows ingested in upsert mode"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -321,16 +388,30 @@ class BillingRecord(models.Model):
         verbose_name_plural = "Billing Records"
         indexes = [
             models.Index(fields=["upload", "date"]),
+            models.Index(fields=["user", "date"]),
             models.Index(fields=["customer_name"]),
             models.Index(fields=["invoice_number"]),
             models.Index(fields=["amount"]),
             models.Index(fields=["payment_status"]),
             models.Index(fields=["date"]),
         ]
+        constraints = [
+            # Makes replaying a chunk after a crash safe
+            models.UniqueConstraint(
+                fields=["upload", "row_number"],
+                name="unique_billing_record_upload_row"
+            ),
+        ]
     
     def __str__(self) -> str:
         return f"{self.invoice_number} - {self.customer_name} (₹{self.amount})"
     
+    def save(self, *args, **kwargs):
+        # The tenant key always mirrors the upload's owner
+        if self.user_id is None and self.upload_id is not None:
+            self.user_id = self.upload.user_id
+        super().save(*args, **kwargs)
+    
     def get_absolute_url(self) -> str:
         return reverse("analytics:record_detail", kwargs={"pk": self.pk})
     
@@ -403,4 +484,274 @@ class AnalyticsQuery(models.Model):
         verbose_name_plural = "Analytics Queries"
     
     def __str__(self) -> str:
-        return f"{self.user.email}: {self.query_text[:50]}..." 
\ No newline at end of file
+        return f"{self.user.email}: {self.query_text[:50]}..." 
+
+def parsed_file_upload_to(instance: "ParsedUploadFile", filename: str) -> str:
+    """Store the columnar copy next to the user's uploads."""
+    return f"billing_uploads/user_{instance.upload.user_id}/parsed/{filename}"
+
+
+class ParsedUploadFile(models.Model):
+    """Parsed form of an upload's file, reused by every step after upload."""
+    
+    upload = models.OneToOneField(
+        BillingDataUpload,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="parsed_file",
+        help_text="Upload this file was parsed from"
+    )
+    sheet_name = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Worksheet that was parsed (blank for CSV files)"
+    )
+    sheet_names = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="All worksheets in the workbook"
+    )
+    encoding = models.CharField(
+        max_length=50,
+        blank=True,
+        help_text="Detected CSV encoding"
+    )
+    delimiter = models.CharField(
+        max_length=5,
+        blank=True,
+        help_text="Detected CSV delimiter"
+    )
+    headers = models.JSONField(
+        default=list,
+        help_text="Cleaned column headers"
+    )
+    sample_rows = models.JSONField(
+        default=list,
+        help_text="First rows of the file, with every cell as text"
+    )
+    row_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of data rows (excluding the header)"
+    )
+    data_file = models.FileField(
+        upload_to=parsed_file_upload_to,
+        blank=True,
+        help_text="Parquet copy of the data, with every cell as text"
+    )
+    validation_key = models.CharField(
+        max_length=40,
+        blank=True,
+        help_text="Fingerprint of the mappings the stored validation report was built for"
+    )
+    validation_result = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Last whole-file dry-run validation report"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Parsed Upload File"
+        verbose_name_plural = "Parsed Upload Files"
+    
+    def __str__(self) -> str:
+        return f"{self.upload.original_filename} ({self.row_count} rows)"
+
+
+class MappingTemplate(models.Model):
+    """Column mapping learned from a user's earlier uploads of one file layout."""
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="mapping_templates",
+        help_text="User the template was learned from"
+    )
+    name = models.CharField(
+        max_length=255,
+        help_text="Display name, taken from the file the template was learned from"
+    )
+    header_signature = models.CharField(
+        max_length=40,
+        help_text="Fingerprint of the normalized header set"
+    )
+    headers = models.JSONField(
+        default=list,
+        help_text="Headers of the file layout"
+    )
+    mappings = models.JSONField(
+        default=dict,
+        help_text="Billing field to file column"
+    )
+    date_format = models.CharField(
+        max_length=20,
+        default="DD/MM/YYYY",
+        help_text="Date format used by this layout"
+    )
+    auto_process = models.BooleanField(
+        default=True,
+        help_text="Map and queue matching uploads for processing without review"
+    )
+    usage_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Uploads mapped with this template"
+    )
+    last_used_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="When the template was last applied or saved"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ["-last_used_at"]
+        verbose_name = "Mapping Template"
+        verbose_name_plural = "Mapping Templates"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "header_signature"],
+                name="unique_mapping_template_user_signature"
+            ),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.name} ({len(self.mappings)} fields)"
+
+
+class BulkUpdateJob(models.Model):
+    """A bulk change to billing records, applied in chunks in the background."""
+    
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        COMPLETED = "completed", "Completed"
+        ERROR = "error", "Error"
+    
+    description = models.CharField(
+        max_length=255,
+        help_text="What the job does, e.g. the admin action"
+    )
+    values = models.JSONField(
+        default=dict,
+        help_text="Field values written to each record"
+    )
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="bulk_update_jobs",
+        help_text="User who started the job"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.QUEUED,
+        help_text="Current state of the job"
+    )
+    total_records = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Records matched, counted when the job starts"
+    )
+    updated_records = models.PositiveIntegerField(
+        default=0,
+        help_text="Records updated so far"
+    )
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Bulk Update Job"
+        verbose_name_plural = "Bulk Update Jobs"
+    
+    def __str__(self) -> str:
+        return f"{self.description} ({self.status})"
+    
+    @property
+    def progress_percentage(self) -> float:
+        """Share of the matched records updated so far."""
+        if self.total_records:
+            return (self.updated_records / self.total_records) * 100
+        return 100.0 if self.status == self.Status.COMPLETED else 0.0
+
+
+class UploadSession(models.Model):
+    """A chunked, resumable file upload; becomes a ``BillingDataUpload`` when completed."""
+    
+    class Status(models.TextChoices):
+        OPEN = "open", "Open"
+        COMPLETING = "completing", "Completing"
+        COMPLETED = "completed", "Completed"
+        FAILED = "failed", "Failed"
+        ABORTED = "aborted", "Aborted"
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+        help_text="User uploading the file"
+    )
+    filename = models.CharField(
+        max_length=255,
+        help_text="Name of the file being uploaded"
+    )
+    file_size = models.PositiveBigIntegerField(
+        help_text="Total size of the file in bytes"
+    )
+    part_size = models.PositiveIntegerField(
+        help_text="Size of every part but the last, in bytes"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.OPEN,
+        help_text="Current state of the session"
+    )
+    upload = models.OneToOneField(
+        BillingDataUpload,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="upload_session",
+        help_text="Upload created when the session was completed"
+    )
+    duplicate_of = models.ForeignKey(
+        BillingDataUpload,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text="Existing upload of the same file, when the session completed as a duplicate"
+    )
+    message = models.TextField(
+        blank=True,
+        help_text="Outcome of completing the session, until it is shown to the user"
+    )
+    message_level = models.PositiveSmallIntegerField(
+        default=message_constants.INFO,
+        help_text="Message level (django.contrib.messages) of the message"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Upload Session"
+        verbose_name_plural = "Upload Sessions"
+    
+    def __str__(self) -> str:
+        return f"{self.filename} ({self.status})"
+    
+    @property
+    def part_count(self) -> int:
+        return max(1, -(-self.file_size // self.part_size))
+    
+    def part_length(self, index: int) -> int:
+        """Expected size of part ``index`` (0-based)."""
+        if index < self.part_count - 1:
+            return self.part_size
+        return self.file_size - self.part_size * (self.part_count - 1)
@@ -0,0 +1,167 @@
+"""
+Row normalization for billing data ingestion.
+
+Converts raw file rows into ``BillingRecord`` field values according to the
+upload's column mappings. This module deliberately has no Django imports so
+it can run inside ``ProcessPoolExecutor`` workers.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+REQUIRED_FIELDS = ["customer_name", "invoice_number", "amount", "date"]
+MONEY_FIELDS = ["amount", "tax_amount", "discount", "unit_price"]
+QUANTITY_FIELDS = ["quantity"]
+DATE_FIELDS = ["date", "due_date", "payment_date"]
+
+DATE_FORMAT_PATTERNS = {
+    "DD/MM/YYYY": ["%d/%m/%Y", "%d/%m/%y"],
+    "MM/DD/YYYY": ["%m/%d/%Y", "%m/%d/%y"],
+    "YYYY-MM-DD": ["%Y-%m-%d"],
+    "DD-MM-YYYY": ["%d-%m-%Y", "%d-%m-%y"],
+    "MM-DD-YYYY": ["%m-%d-%Y", "%m-%d-%y"],
+    "DD.MM.YYYY": ["%d.%m.%Y", "%d.%m.%y"],
+}
+
+# (row_number, record_data) pairs and (row_number, message) errors
+NormalizedRows = List[Tuple[int, Dict[str, Any]]]
+RowErrors = List[Tuple[int, str]]
+
+
+def parse_date_with_format(date_value, date_format: str):
+    """Parse date value according to the specified format."""
+    if pd.isna(date_value) or not date_value:
+        return None
+
+    date_str = str(date_value).strip()
+    if not date_str:
+        return None
+
+    # Auto-detect format
+    if date_format == "auto":
+        all_patterns = []
+        for patterns in DATE_FORMAT_PATTERNS.values():
+            all_patterns.extend(patterns)
+    else:
+        all_patterns = DATE_FORMAT_PATTERNS.get(date_format, ["%d/%m/%Y"])
+
+    # Try to parse with each pattern
+    for pattern in all_patterns:
+        try:
+            parsed_date = datetime.strptime(date_str, pattern)
+            return parsed_date.date()
+        except (ValueError, TypeError):
+            continue
+
+    # Fallback to pandas datetime parsing
+    try:
+        # For Indian format, specify dayfirst=True
+        dayfirst = date_format in ["DD/MM/YYYY", "DD-MM-YYYY", "DD.MM.YYYY"] or date_format == "auto"
+        parsed_date = pd.to_datetime(date_str, dayfirst=dayfirst, errors="coerce")
+        if pd.notna(parsed_date):
+            return parsed_date.date()
+    except Exception:
+        pass
+
+    return None
+
+
+def normalize_row(row: Dict[str, Any], mappings: Dict[str, str], date_format: str) -> Tuple[Dict[str, Any], List[str]]:
+    """Extract record data for one row.
+
+    ``mappings`` maps billing field -> file column. Returns the record data
+    and a list of validation errors (empty when the row is valid).
+    """
+    record_data = {}
+
+    # Process each mapped field
+    for field, column in mappings.items():
+        if column in row and pd.notna(row[column]):
+            value = row[column]
+
+            # Type conversion for specific fields
+            if field in MONEY_FIELDS:
+                try:
+                    # Clean monetary values
+                    cleaned_value = str(value).replace("₹", "").replace(",", "").strip()
+                    record_data[field] = float(cleaned_value) if cleaned_value else 0.0
+                except (ValueError, TypeError):
+                    record_data[field] = 0.0
+            elif field in QUANTITY_FIELDS:
+                try:
+                    record_data[field] = float(str(value).strip()) if str(value).strip() else None
+                except (ValueError, TypeError):
+                    record_data[field] = None
+            elif field in DATE_FIELDS:
+                try:
+                    # Use the upload's date format preference for parsing
+                    record_data[field] = parse_date_with_format(value, date_format)
+                except (ValueError, TypeError):
+                    record_data[field] = None
+            else:
+                record_data[field] = str(value).strip()
+        else:
+            # Handle missing values for required fields
+            if field in REQUIRED_FIELDS:
+                if field in ["amount"]:
+                    record_data[field] = 0.0
+                elif field in ["date"]:
+                    record_data[field] = None
+                else:
+                    record_data[field] = ""
+
+    # Validate required fields have values
+    validation_errors = []
+    if not record_data.get("customer_name"):
+        validation_errors.append("customer_name is required")
+    if not record_data.get("invoice_number"):
+        validation_errors.append("invoice_number is required")
+    if record_data.get("amount") is None or record_data.get("amount") < 0:
+        validation_errors.append("amount must be a positive number")
+    if not record_data.get("date"):
+        validation_errors.append("date is required")
+
+    return record_data, validation_errors
+
+
+def normalize_chunk(
+    rows: List[Dict[str, Any]],
+    first_row_number: int,
+    mappings: Dict[str, str],
+    date_format: str,
+) -> Tuple[NormalizedRows, RowErrors]:
+    """Normalize a contiguous range of rows.
+
+    Row numbers are ``first_row_number`` onwards, so results from separately
+    processed chunks can be merged in order.
+    """
+    normalized: NormalizedRows = []
+    errors: RowErrors = []
+
+    for offset, row in enumerate(rows):
+        row_number = first_row_number + offset
+        try:
+            record_data, validation_errors = normalize_row(row, mappings, date_format)
+        except Exception as e:
+            errors.append((row_number, str(e)))
+            continue
+
+        if validation_errors:
+            errors.append((row_number, "; ".join(validation_errors)))
+        else:
+            normalized.append((row_number, record_data))
+
+    return normalized, errors
+
+
+def format_row_errors(errors: RowErrors, created_count: int, limit: int = 10) -> Optional[str]:
+    """Summarize row errors for ``BillingDataUpload.error_message``."""
+    if not errors:
+        return None
+
+    error_message = "; ".join(f"Row {row_number}: {message}" for row_number, message in errors[:limit])
+    if created_count > 0:
+        error_message += f" ({len(errors)} total errors, {created_count} records created)"
+    return error_message
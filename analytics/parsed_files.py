@@ -0,0 +1,176 @@
+"""
+Per-upload parsed-file cache.
+
+An upload's file is parsed once, at upload time, into a ``ParsedUploadFile``
+holding the cleaned headers, the detected CSV encoding and delimiter, the
+worksheet names, a sample of rows and the row count, plus a Parquet copy of
+the data. Header detection, previews, column mapping and ingestion all read
+from it instead of re-parsing the original file.
+
+Every cell is stored as text (``str(value)`` or null). Normalization works
+on ``str(value)`` anyway, so records are identical whether ingestion reads
+the Parquet copy or the original file.
+
+Stored files are read through the local file cache of
+``analytics.file_access``. The Parquet copy needs ``pyarrow``; without it only the metadata is cached
+and ingestion streams the original file. The cache is evicted with its
+upload (see ``analytics.signals``) and rebuilt when another worksheet is
+selected.
+"""
+
+import logging
+import os
+import tempfile
+from typing import Any, Iterator, List, Optional
+
+import pandas as pd
+from django.core.files import File
+
+from .conf import analytics_setting
+from .file_access import cache_field_file, field_file_local_path
+from .models import BillingDataUpload, ParsedUploadFile
+from .sources import open_upload_source
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+
+def _to_text(value: Any) -> Optional[str]:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    return str(value)
+
+
+def stringify_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Return ``df`` with every cell as ``str`` or ``None``."""
+    # map() may infer a string dtype that turns None back into NaN
+    text = df.astype(object).map(_to_text).astype(object)
+    return text.where(text.notna(), None)
+
+
+def build_parsed_file(upload: BillingDataUpload, sheet_name: Optional[str] = None) -> ParsedUploadFile:
+    """Parse the upload's file in one streaming pass and store the result."""
+    sheet_name = upload.sheet_name if sheet_name is None else sheet_name
+    source = open_upload_source(upload, sheet_name)
+
+    sheet_names = source.sheet_names()
+    if not sheet_name and sheet_names:
+        sheet_name = sheet_names[0]
+
+    headers = source.headers()
+    sample_size = analytics_setting("PARSED_SAMPLE_ROWS")
+    sample_rows: List[dict] = []
+    row_count = 0
+
+    tmp_path = None
+    writer = None
+    try:
+        if pq is not None:
+            fd, tmp_path = tempfile.mkstemp(suffix=".parquet")
+            os.close(fd)
+            schema = pa.schema([(header, pa.string()) for header in headers])
+            writer = pq.ParquetWriter(tmp_path, schema)
+
+        for chunk in source.iter_chunks():
+            chunk = stringify_frame(chunk)
+            chunk.columns = headers
+            row_count += len(chunk)
+
+            if len(sample_rows) < sample_size:
+                sample_rows.extend(chunk.head(sample_size - len(sample_rows)).to_dict("records"))
+            if writer is not None:
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+        if writer is not None:
+            writer.close()
+            writer = None
+
+        parsed, _ = ParsedUploadFile.objects.get_or_create(upload=upload)
+        if parsed.data_file:
+            parsed.data_file.delete(save=False)
+
+        parsed.sheet_name = sheet_name or ""
+        parsed.sheet_names = sheet_names
+        parsed.encoding = getattr(source, "encoding", "")
+        parsed.delimiter = getattr(source, "delimiter", "")
+        parsed.headers = headers
+        parsed.sample_rows = sample_rows
+        parsed.row_count = row_count
+        parsed.validation_key = ""
+        parsed.validation_result = None
+
+        if tmp_path is not None:
+            with open(tmp_path, "rb") as handle:
+                parsed.data_file.save(f"{upload.pk}.parquet", File(handle), save=False)
+            # Ingestion usually follows; spare it the download
+            cache_field_file(parsed.data_file, tmp_path)
+        parsed.save()
+        upload.parsed_file = parsed
+
+    finally:
+        if writer is not None:
+            writer.close()
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(f"Parsed upload {upload.pk}: {row_count} rows, {len(headers)} columns")
+    return parsed
+
+
+def get_parsed_file(upload: BillingDataUpload) -> ParsedUploadFile:
+    """Return the upload's parsed file, building it if missing or stale."""
+    try:
+        parsed = upload.parsed_file
+    except ParsedUploadFile.DoesNotExist:
+        return build_parsed_file(upload)
+
+    wanted_sheet = upload.sheet_name or (parsed.sheet_names[0] if parsed.sheet_names else "")
+    if parsed.sheet_name != wanted_sheet:
+        return build_parsed_file(upload)
+    return parsed
+
+
+class ParsedSource:
+    """Source interface (see ``analytics.sources``) served from the cache."""
+
+    def __init__(self, parsed: ParsedUploadFile):
+        self.parsed = parsed
+
+    def sheet_names(self) -> List[str]:
+        return list(self.parsed.sheet_names)
+
+    def headers(self) -> List[str]:
+        return list(self.parsed.headers)
+
+    def count_rows(self) -> int:
+        return self.parsed.row_count
+
+    def sample(self, num_rows: int) -> pd.DataFrame:
+        if num_rows <= len(self.parsed.sample_rows) or len(self.parsed.sample_rows) == self.parsed.row_count:
+            return pd.DataFrame(self.parsed.sample_rows[:num_rows], columns=self.headers())
+        return next(self.iter_chunks(num_rows), pd.DataFrame(columns=self.headers()))
+
+    def iter_chunks(self, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        chunk_size = chunk_size or analytics_setting("CHUNK_SIZE")
+
+        if pq is None or not self.parsed.data_file:
+            source = open_upload_source(self.parsed.upload, self.parsed.sheet_name)
+            yield from source.iter_chunks(chunk_size)
+            return
+
+        parquet = pq.ParquetFile(field_file_local_path(self.parsed.data_file))
+        try:
+            for batch in parquet.iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+        finally:
+            parquet.close()
+
+
+def open_cached_source(upload: BillingDataUpload) -> ParsedSource:
+    """Return a source for the upload backed by its parsed-file cache."""
+    return ParsedSource(get_parsed_file(upload))
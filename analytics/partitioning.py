@@ -0,0 +1,225 @@
+"""
+Optional declarative partitioning of ``BillingRecord`` on PostgreSQL.
+
+Configured with ``ANALYTICS_CONFIG['RECORD_PARTITIONING']``:
+
+- ``None`` (default): one table. The only mode on SQLite.
+- ``{"strategy": "hash", "partitions": 16}``: hash partitions on
+  ``user_id``. Tenant-scoped queries (``filter(user=...)``) are pruned to
+  the tenant's partition.
+
+The table is converted by the ``0015`` migration when partitioning is
+configured at migrate time, or later with
+``manage.py billing_partitions convert``, which also reports partition
+sizes.
+
+PostgreSQL requires the partition key in every primary key and unique
+constraint, so the conversion extends them with it and keeps their names:
+the primary key becomes (id, user_id), ``unique_billing_record_upload_row``
+(upload_id, row_number, user_id) and the ``dedup_key`` constraint
+(dedup_key, user_id). Uploads and dedup keys belong to one user, so these
+enforce the same rules as before. That is why records aren't partitioned
+by ``date``: (dedup_key, date) would let a record whose date changed be
+stored a second time by an upsert.
+"""
+
+import hashlib
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import NotSupportedError, transaction
+
+from .conf import analytics_setting
+from .models import BillingRecord
+
+logger = logging.getLogger(__name__)
+
+# Partition key column per strategy
+STRATEGIES = {"hash": "user_id"}
+DEFAULT_HASH_PARTITIONS = 16
+
+
+def get_config() -> Optional[Dict[str, Any]]:
+    """The configured partitioning, or ``None`` when disabled."""
+    config = analytics_setting("RECORD_PARTITIONING")
+    if not config:
+        return None
+
+    strategy = config.get("strategy")
+    if strategy not in STRATEGIES:
+        raise ImproperlyConfigured(
+            f"RECORD_PARTITIONING strategy must be one of {', '.join(STRATEGIES)}, got {strategy!r}"
+        )
+    return {
+        "strategy": strategy,
+        "partitions": int(config.get("partitions", DEFAULT_HASH_PARTITIONS)),
+    }
+
+
+def _table() -> str:
+    return BillingRecord._meta.db_table
+
+
+def _temp_name(name: str) -> str:
+    """Short unique name for an object created next to its original."""
+    return f"tmp_{hashlib.md5(name.encode()).hexdigest()[:20]}"
+
+
+def current_strategy(connection) -> Optional[str]:
+    """How the table is partitioned now, or ``None`` for a plain table."""
+    if connection.vendor != "postgresql":
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT partstrat FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [_table()],
+        )
+        row = cursor.fetchone()
+    return {"h": "hash", "r": "range"}.get(row[0]) if row else None
+
+
+def list_partitions(connection) -> List[Dict[str, Any]]:
+    """Name, bound and estimated row count of each partition."""
+    if not current_strategy(connection):
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), GREATEST(c.reltuples, 0)::bigint
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            ORDER BY c.relname
+            """,
+            [_table()],
+        )
+        return [{"name": name, "bound": bound, "rows": rows} for name, bound, rows in cursor.fetchall()]
+
+
+def _constraints(cursor, table: str) -> List[tuple]:
+    """(name, type, definition, columns) of the table's key and foreign key constraints."""
+    cursor.execute(
+        """
+        SELECT con.conname, con.contype, pg_get_constraintdef(con.oid),
+               ARRAY(
+                   SELECT a.attname FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, n)
+                   JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+                   ORDER BY k.n
+               )
+        FROM pg_constraint con
+        WHERE con.conrelid = to_regclass(%s) AND con.contype IN ('p', 'u', 'f')
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _indexes(cursor, table: str) -> List[tuple]:
+    """(name, definition) of indexes that don't back a constraint."""
+    cursor.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = to_regclass(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def convert_table(
+    connection,
+    strategy: str,
+    partitions: int = DEFAULT_HASH_PARTITIONS,
+    log: Callable[[str], None] = logger.info,
+) -> None:
+    """Rebuild the records table as a partitioned table, keeping its rows.
+
+    Runs in one transaction; writes to the table are blocked while rows are
+    copied.
+    """
+    if connection.vendor != "postgresql":
+        raise NotSupportedError("BillingRecord partitioning requires PostgreSQL")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown partitioning strategy {strategy!r}")
+    if current_strategy(connection):
+        raise NotSupportedError(f"{_table()} is already partitioned")
+
+    quote_name = connection.ops.quote_name
+    key = STRATEGIES[strategy]
+    table = _table()
+    staging = f"{table}_partitioned"
+    renames = []  # (statement template, temporary name, original name)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quote_name(table)} IN EXCLUSIVE MODE")
+        cursor.execute(
+            f"CREATE TABLE {quote_name(staging)} (LIKE {quote_name(table)} "
+            f"INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY {strategy.upper()} ({quote_name(key)})"
+        )
+
+        for name, kind, definition, columns in _constraints(cursor, table):
+            temp = _temp_name(name)
+            if kind == "f":
+                cursor.execute(f"ALTER TABLE {quote_name(staging)} ADD CONSTRAINT {quote_name(temp)} {definition}")
+            else:
+                if key not in columns:
+                    columns = [*columns, key]
+                kind_sql = "PRIMARY KEY" if kind == "p" else "UNIQUE"
+                column_sql = ", ".join(quote_name(column) for column in columns)
+                cursor.execute(
+                    f"ALTER TABLE {quote_name(staging)} ADD CONSTRAINT {quote_name(temp)} {kind_sql} ({column_sql})"
+                )
+            renames.append(("ALTER TABLE {table} RENAME CONSTRAINT {old} TO {new}", temp, name))
+
+        for name, definition in _indexes(cursor, table):
+            temp = _temp_name(name)
+            definition = re.sub(
+                r"^(CREATE (?:UNIQUE )?INDEX) \S+ ON \S+ ",
+                lambda match: f"{match.group(1)} {quote_name(temp)} ON {quote_name(staging)} ",
+                definition,
+            )
+            cursor.execute(definition)
+            renames.append(("ALTER INDEX {old} RENAME TO {new}", temp, name))
+
+        for remainder in range(partitions):
+            cursor.execute(
+                f"CREATE TABLE {quote_name(f'{table}_p{remainder}')} PARTITION OF {quote_name(staging)} "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            )
+
+        cursor.execute(f"INSERT INTO {quote_name(staging)} SELECT * FROM {quote_name(table)}")
+        log(f"Copied {cursor.rowcount} records into {strategy} partitions")
+
+        cursor.execute(f"DROP TABLE {quote_name(table)}")
+        cursor.execute(f"ALTER TABLE {quote_name(staging)} RENAME TO {quote_name(table)}")
+        for statement, temp, name in renames:
+            cursor.execute(statement.format(table=quote_name(table), old=quote_name(temp), new=quote_name(name)))
+
+        # Identity columns on partitioned tables need PostgreSQL 17, so ids come
+        # from an owned sequence (found by pg_get_serial_sequence like before)
+        sequence = quote_name(f"{table}_id_seq")
+        cursor.execute(f"CREATE SEQUENCE {sequence} OWNED BY {quote_name(table)}.id")
+        cursor.execute(f"SELECT setval('{sequence}', COALESCE(MAX(id), 0) + 1, false) FROM {quote_name(table)}")
+        cursor.execute(f"ALTER TABLE {quote_name(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+
+    log(f"{table} is now partitioned by {strategy} on {key}")
+
+
+def apply_configured_partitioning(connection, log: Callable[[str], None] = logger.info) -> bool:
+    """Convert the table if partitioning is configured and not yet applied.
+
+    A no-op on other databases, so development on SQLite is unaffected.
+    Returns whether the table was converted.
+    """
+    config = get_config()
+    if config is None or connection.vendor != "postgresql" or current_strategy(connection):
+        return False
+
+    convert_table(connection, config["strategy"], config["partitions"], log=log)
+    return True
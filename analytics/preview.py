@@ -0,0 +1,125 @@
+"""
+Upload previews served from the parsed-file cache.
+
+Everything here works on the stored sample (``ParsedUploadFile.sample_rows``),
+so a preview costs the same whatever the size of the file: the first rows,
+per-column statistics and a dry run of the current column mappings.
+"""
+
+import math
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from .models import BillingDataUpload, MappedField
+from .normalization import REQUIRED_FIELDS, normalize_chunk, parse_date_with_format
+from .parsed_files import get_parsed_file
+
+BOOLEAN_VALUES = {"true", "false", "yes", "no", "y", "n"}
+# Share of non-empty sample values that must parse for a type to be inferred
+TYPE_THRESHOLD = 0.9
+MAX_DRY_RUN_ERRORS = 10
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value.replace("₹", "").replace(",", "").strip())
+        return True
+    except ValueError:
+        return False
+
+
+def infer_type(values: List[str], date_format: str) -> str:
+    """Infer a ``MappedField.data_type`` from non-empty text values."""
+    if not values:
+        return "empty"
+
+    checks = [
+        ("boolean", lambda value: value.strip().lower() in BOOLEAN_VALUES),
+        ("number", _is_number),
+        ("date", lambda value: parse_date_with_format(value, date_format) is not None),
+    ]
+    for data_type, check in checks:
+        matches = sum(1 for value in values if check(value))
+        if matches >= TYPE_THRESHOLD * len(values):
+            return data_type
+    return "string"
+
+
+def estimate_distinct(values: List[str], population: int) -> int:
+    """Estimate the distinct values in ``population`` rows from a sample.
+
+    Uses the GEE estimator: values seen once in the sample are scaled by
+    sqrt(population / sample size), repeated values are counted once. A
+    sample without repeats is treated as a unique column.
+    """
+    if not values:
+        return 0
+
+    counts = Counter(values)
+    if len(values) >= population:
+        return len(counts)
+
+    singletons = sum(1 for count in counts.values() if count == 1)
+    if singletons == len(values):
+        return population
+
+    estimate = math.sqrt(population / len(values)) * singletons + (len(counts) - singletons)
+    return min(population, int(round(estimate)))
+
+
+def column_stats(headers: List[str], rows: List[Dict[str, Any]], total_rows: int, date_format: str) -> List[Dict[str, Any]]:
+    """Null rate, inferred type and distinct-count estimate per column."""
+    stats = []
+    for header in headers:
+        values = [row.get(header) for row in rows]
+        present = [value for value in values if value is not None and str(value).strip()]
+        null_rate = 1 - len(present) / len(values) if values else 0.0
+
+        stats.append({
+            "name": header,
+            "null_rate": round(null_rate, 4),
+            "inferred_type": infer_type(present, date_format),
+            "distinct_estimate": estimate_distinct(present, round(total_rows * (1 - null_rate))),
+            "sample_values": list(dict.fromkeys(present))[:3],
+        })
+    return stats
+
+
+def dry_run_mappings(
+    rows: List[Dict[str, Any]], headers: List[str], mappings: Dict[str, str], date_format: str
+) -> Dict[str, Any]:
+    """Validate the sample against the mappings without writing anything."""
+    normalized, errors = normalize_chunk(rows, 1, mappings, date_format)
+
+    return {
+        "checked_rows": len(rows),
+        "valid_rows": len(normalized),
+        "invalid_rows": len(errors),
+        "errors": [
+            {"row": row_number, "message": message}
+            for row_number, message in errors[:MAX_DRY_RUN_ERRORS]
+        ],
+        "missing_required": [field for field in REQUIRED_FIELDS if field not in mappings],
+        "unknown_columns": [column for column in mappings.values() if column not in headers],
+    }
+
+
+def build_preview(upload: BillingDataUpload, num_rows: Optional[int] = None) -> Dict[str, Any]:
+    """Return the first rows, column stats and a mapping dry run for an upload."""
+    parsed = get_parsed_file(upload)
+    headers = list(parsed.headers)
+    rows = parsed.sample_rows
+
+    mappings = {
+        mapping.mapped_field: mapping.original_column
+        for mapping in MappedField.objects.filter(upload=upload)
+    }
+
+    return {
+        "headers": headers,
+        "sample_data": rows[:num_rows] if num_rows else rows,
+        "total_rows": parsed.row_count,
+        "sample_size": len(rows),
+        "column_stats": column_stats(headers, rows, parsed.row_count, upload.date_format),
+        "validation": dry_run_mappings(rows, headers, mappings, upload.date_format) if mappings else None,
+    }
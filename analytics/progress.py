@@ -0,0 +1,84 @@
+"""
+Throttled progress reporting for upload ingestion.
+
+Progress is kept in memory and flushed to the ``BillingDataUpload`` row at
+most once per interval, touching only ``processed_rows``. The final state
+is written once when processing finishes.
+"""
+
+import threading
+import time
+from typing import Optional, Set
+
+from django.db.models import F
+from django.utils import timezone
+
+from .events import publish_upload_event
+from .models import BillingDataUpload
+
+DEFAULT_INTERVAL_SECONDS = 1.0
+
+_active_uploads: Set[str] = set()
+_active_lock = threading.Lock()
+
+
+def is_reporting(upload_id) -> bool:
+    """Whether a ProgressReporter currently owns progress for the upload."""
+    with _active_lock:
+        return str(upload_id) in _active_uploads
+
+
+class ProgressReporter:
+    """Coalesces progress updates for one upload into periodic writes."""
+
+    def __init__(self, upload: BillingDataUpload, interval: float = DEFAULT_INTERVAL_SECONDS):
+        self.upload = upload
+        self.interval = interval
+        self.processed = upload.processed_rows or 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+        with _active_lock:
+            _active_uploads.add(str(upload.pk))
+
+    def advance(self, rows: int = 1) -> None:
+        """Record newly processed rows, flushing if the interval has elapsed."""
+        self.processed += rows
+        self._pending += rows
+
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write pending progress to the database and publish an event."""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+
+        BillingDataUpload.objects.filter(pk=self.upload.pk).update(
+            processed_rows=F("processed_rows") + self._pending
+        )
+        self._pending = 0
+
+        self.upload.processed_rows = self.processed
+        publish_upload_event(self.upload)
+
+    def finish(self, status: str, error_message: Optional[str] = None) -> None:
+        """Persist the final upload state in a single write."""
+        self._release()
+        self._pending = 0
+
+        self.upload.status = status
+        self.upload.processed_rows = self.processed
+        self.upload.processing_completed_at = timezone.now()
+        update_fields = ["status", "processed_rows", "processing_completed_at"]
+        if error_message is not None:
+            self.upload.error_message = error_message
+            update_fields.append("error_message")
+        self.upload.save(update_fields=update_fields)
+
+        publish_upload_event(self.upload, status.lower())
+
+    def _release(self) -> None:
+        with _active_lock:
+            _active_uploads.discard(str(self.upload.pk))
@@ -0,0 +1,139 @@
+"""
+Read-replica routing for analytics reads.
+
+With ``ANALYTICS_CONFIG['READ_REPLICA']`` set to a database alias, the
+read-only analytics views (dashboards, charts, search and export) run their
+queries on that replica, keeping them off the primary that ingestion writes
+to. Everything else, including background jobs, reads the primary.
+
+Replicas lag behind, so a user is pinned to the primary for
+``REPLICA_STICKY_SECONDS`` after their own writes: an upload finishing
+processing, bulk record changes (``records_changed``) and any unsafe
+(POST, PUT, ...) request of theirs (``ReplicaPinMiddleware``). Pins live in
+the ``CACHE_ALIAS`` cache, which must be shared between worker processes
+for them to hold across workers.
+
+Setup::
+
+    DATABASES["replica"] = {..., "TEST": {"MIRROR": "default"}}
+    DATABASE_ROUTERS = ["analytics.replicas.ReplicaRouter"]
+    MIDDLEWARE += ["analytics.replicas.ReplicaPinMiddleware"]
+    ANALYTICS_CONFIG = {"READ_REPLICA": "replica", ...}
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Iterable, Iterator, Optional
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .conf import analytics_setting
+
+
+# Alias that reads in the current request are routed to, if any
+_read_alias: ContextVar[Optional[str]] = ContextVar("analytics_read_alias", default=None)
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS", "TRACE"}
+
+
+def _pin_key(user_id) -> str:
+    return f"analytics:primary-pin:{user_id}"
+
+
+def pin_to_primary(user_ids: Iterable) -> None:
+    """Read from the primary for these users until the replica has caught up."""
+    if not analytics_setting("READ_REPLICA"):
+        return
+    timeout = analytics_setting("REPLICA_STICKY_SECONDS")
+    caches[analytics_setting("CACHE_ALIAS")].set_many({_pin_key(user_id): True for user_id in user_ids}, timeout)
+
+
+def is_pinned(user_id) -> bool:
+    return bool(caches[analytics_setting("CACHE_ALIAS")].get(_pin_key(user_id)))
+
+
+@contextmanager
+def replica_reads(user) -> Iterator[Optional[str]]:
+    """Route reads in this block to the replica unless ``user`` is pinned.
+
+    Yields the alias reads go to (``None`` for the primary).
+    """
+    alias = analytics_setting("READ_REPLICA")
+    if alias and user.is_authenticated and is_pinned(user.pk):
+        alias = None
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def reading_from_replica() -> bool:
+    """Whether reads at this point are routed to the replica."""
+    return _read_alias.get() is not None
+
+
+class ReplicaReadsMixin:
+    """Runs a read-only view's queries on the read replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads(request.user):
+            response = super().dispatch(request, *args, **kwargs)
+            # Lazy context (querysets, analytics.fragments) is evaluated while rendering
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+            return response
+
+
+def reads_from_replica(view_func):
+    """Function-view version of ``ReplicaReadsMixin``."""
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads(request.user):
+            return view_func(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """Sends reads inside ``replica_reads`` to the replica; writes stay on the primary."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Django would otherwise write an instance back to the database it was read from
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db == analytics_setting("READ_REPLICA"):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica rows are copies of primary rows
+        aliases = {DEFAULT_DB_ALIAS, analytics_setting("READ_REPLICA")}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its schema from the primary
+        if db == analytics_setting("READ_REPLICA"):
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """Pins users to the primary after requests that may have written."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, "user", None)
+        if request.method not in SAFE_METHODS and user is not None and user.is_authenticated:
+            pin_to_primary([user.pk])
+        return response
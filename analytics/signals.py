@@ -1,8 +1,31 @@
 from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 from django.utils import timezone
 
-from .models import BillingDataUpload, MappedField, BillingRecord
+from .fragments import invalidate_user_data
+from .models import BillingDataUpload, MappedField, BillingRecord, ParsedUploadFile
+from .progress import is_reporting
+from .replicas import pin_to_primary
+
+# Sent with ``user_ids`` after billing records are changed in bulk (ingestion,
+# queryset updates and deletes that skip the model signals); cached analytics
+# and rollups derived from those users' records should be invalidated by
+# receivers.
+records_changed = Signal()
+
+
+# Receivers run in registration order: the pin must be in place before the
+# new data version, which tags replica-routed responses (analytics.conditional)
+@receiver(records_changed)
+def pin_changed_users_to_primary(sender, user_ids, **kwargs):
+    """Keep the users' analytics reads off the replica until it has the changes."""
+    pin_to_primary(user_ids)
+
+
+@receiver(records_changed)
+def invalidate_cached_fragments(sender, user_ids, **kwargs):
+    """Rebuild the users' cached analytics widgets from the changed records."""
+    invalidate_user_data(user_ids)
 
 
 @receiver(post_save, sender=BillingDataUpload)
@@ -33,15 +56,30 @@ def handle_mapping_change(sender, instance: MappedField, created: bool, **kwargs
 @receiver(post_save, sender=BillingRecord)
 def update_upload_progress(sender, instance: BillingRecord, created: bool, **kwargs):
     """Update upload processing progress when records are created."""
-    if created:
+    # Ingestion reports its own throttled progress (see analytics.progress)
+    if created and not is_reporting(instance.upload_id):
         upload = instance.upload
         upload.processed_rows = upload.billing_records.count()
         upload.save(update_fields=["processed_rows"])
 
 
+@receiver(post_save, sender=BillingRecord)
+@receiver(post_delete, sender=BillingRecord)
+def record_changed(sender, instance: BillingRecord, **kwargs):
+    """Single record saves and deletes (e.g. record edits) change the user's data too."""
+    records_changed.send(sender=BillingRecord, user_ids=[instance.user_id])
+
+
 @receiver(post_delete, sender=BillingRecord)
 def update_upload_progress_on_delete(sender, instance: BillingRecord, **kwargs):
     """Update upload processing progress when records are deleted."""
     upload = instance.upload
     upload.processed_rows = upload.billing_records.count()
-    upload.save(update_fields=["processed_rows"]) 
\ No newline at end of file
+    upload.save(update_fields=["processed_rows"])
+
+
+@receiver(post_delete, sender=ParsedUploadFile)
+def delete_parsed_data_file(sender, instance: ParsedUploadFile, **kwargs):
+    """Evict the parsed copy from storage with its cache row."""
+    if instance.data_file:
+        instance.data_file.delete(save=False)
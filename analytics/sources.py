@@ -0,0 +1,297 @@
+"""
+Streaming readers for uploaded billing files.
+
+Each source exposes the header row, a row count, a sample and an iterator
+of DataFrame chunks, without materializing the whole file:
+
+- ``.xlsx`` files are read with ``openpyxl`` in read-only mode, one row at a
+  time, so a large workbook never has its full DOM in memory.
+- ``.xls`` files (capped at 65,536 rows by the format) are read with pandas
+  and the ``xlrd`` engine, then chunked.
+- ``.csv`` files are read with ``pandas.read_csv(chunksize=...)`` after
+  detecting the encoding and delimiter.
+"""
+
+import codecs
+import csv
+from typing import Any, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from .conf import analytics_setting
+from .file_access import upload_local_path
+
+CSV_ENCODINGS = ["utf-8", "latin-1", "cp1252", "iso-8859-1"]
+CSV_DELIMITERS = ",;\t|"
+ENCODING_PROBE_BLOCK = 1024 * 1024
+DELIMITER_PROBE_SIZE = 64 * 1024
+
+
+def clean_headers(raw_headers: List[Any]) -> List[str]:
+    """Name blank headers and de-duplicate repeats the way pandas does."""
+    headers = []
+    seen: Dict[str, int] = {}
+
+    for index, header in enumerate(raw_headers):
+        if header is None or (isinstance(header, str) and not header.strip()):
+            name = f"Unnamed: {index}"
+        else:
+            name = str(header).strip()
+
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        headers.append(name)
+
+    return headers
+
+
+def _rewind(file) -> None:
+    if hasattr(file, "seek"):
+        file.seek(0)
+
+
+class ExcelSource:
+    """Reads an ``.xlsx`` workbook row by row with openpyxl read-only mode."""
+
+    def __init__(self, file, sheet_name: Optional[str] = None):
+        self.file = file
+        self.sheet_name = sheet_name or None
+
+    def _open(self):
+        from openpyxl import load_workbook
+
+        _rewind(self.file)
+        return load_workbook(self.file, read_only=True, data_only=True)
+
+    def _worksheet(self, workbook):
+        if self.sheet_name and self.sheet_name in workbook.sheetnames:
+            return workbook[self.sheet_name]
+        return workbook.worksheets[0]
+
+    def _rows(self) -> Iterator[tuple]:
+        """Yield the first non-empty row as the header, then the data rows.
+
+        Blank rows between data rows are kept, like ``pandas.read_excel``
+        does, so row numbers (in row errors and checkpoints) stay the
+        sheet's; only trailing blank rows are dropped.
+        """
+        workbook = self._open()
+        try:
+            header_seen = False
+            blank_rows = []
+            for row in self._worksheet(workbook).iter_rows(values_only=True):
+                if not any(value is not None and value != "" for value in row):
+                    if header_seen:
+                        blank_rows.append(row)
+                    continue
+                yield from blank_rows
+                blank_rows = []
+                header_seen = True
+                yield row
+        finally:
+            workbook.close()
+
+    def sheet_names(self) -> List[str]:
+        workbook = self._open()
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+
+    def headers(self) -> List[str]:
+        for row in self._rows():
+            return clean_headers(list(row))
+        return []
+
+    def count_rows(self) -> int:
+        """Count data rows (excluding the header) in a single streaming pass."""
+        return max(sum(1 for _ in self._rows()) - 1, 0)
+
+    def sample(self, num_rows: int) -> pd.DataFrame:
+        return next(self.iter_chunks(num_rows), pd.DataFrame(columns=self.headers()))
+
+    def iter_chunks(self, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        chunk_size = chunk_size or analytics_setting("CHUNK_SIZE")
+        rows = self._rows()
+
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+        headers = clean_headers(list(header_row))
+        width = len(headers)
+
+        buffer = []
+        for row in rows:
+            # Pad/truncate ragged rows to the header width
+            values = list(row[:width]) + [None] * (width - len(row))
+            buffer.append(values)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=headers)
+                buffer = []
+
+        if buffer:
+            yield pd.DataFrame(buffer, columns=headers)
+
+
+class XlsSource:
+    """Reads a legacy ``.xls`` workbook with the xlrd engine."""
+
+    def __init__(self, file, sheet_name: Optional[str] = None):
+        self.file = file
+        self.sheet_name = sheet_name or None
+
+    def _read(self, **kwargs) -> pd.DataFrame:
+        _rewind(self.file)
+        try:
+            df = pd.read_excel(self.file, sheet_name=self.sheet_name or 0, engine="xlrd", **kwargs)
+        except ImportError:
+            raise ValueError("Reading .xls files requires the xlrd package; please upload .xlsx or .csv instead")
+        df.columns = clean_headers(list(df.columns))
+        return df
+
+    def sheet_names(self) -> List[str]:
+        _rewind(self.file)
+        try:
+            return list(pd.ExcelFile(self.file, engine="xlrd").sheet_names)
+        except ImportError:
+            return []
+
+    def headers(self) -> List[str]:
+        return list(self._read(nrows=0).columns)
+
+    def count_rows(self) -> int:
+        return len(self._read())
+
+    def sample(self, num_rows: int) -> pd.DataFrame:
+        return self._read(nrows=num_rows)
+
+    def iter_chunks(self, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        chunk_size = chunk_size or analytics_setting("CHUNK_SIZE")
+        df = self._read()
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size].reset_index(drop=True)
+
+
+class CsvSource:
+    """Reads a CSV file in chunks with the first encoding that decodes it."""
+
+    def __init__(self, file, encoding: Optional[str] = None, delimiter: Optional[str] = None):
+        self.file = file
+        self._encoding = encoding
+        self._delimiter = delimiter
+
+    @property
+    def encoding(self) -> str:
+        if self._encoding is None:
+            self._encoding = self._detect_encoding()
+        return self._encoding
+
+    @property
+    def delimiter(self) -> str:
+        if self._delimiter is None:
+            self._delimiter = self._detect_delimiter()
+        return self._delimiter
+
+    def _detect_delimiter(self) -> str:
+        """Sniff the delimiter from the start of the file, defaulting to a comma."""
+        handle = self._open_binary()
+        try:
+            head = handle.read(DELIMITER_PROBE_SIZE).decode(self.encoding, errors="ignore")
+        finally:
+            self._close(handle)
+
+        # Only sniff complete lines
+        lines = head.splitlines()[:-1] or head.splitlines()
+        try:
+            return csv.Sniffer().sniff("\n".join(lines), delimiters=CSV_DELIMITERS).delimiter
+        except csv.Error:
+            return ","
+
+    def _detect_encoding(self) -> str:
+        """Return the first candidate encoding that decodes the whole file."""
+        for encoding in CSV_ENCODINGS:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            handle = self._open_binary()
+            try:
+                while True:
+                    block = handle.read(ENCODING_PROBE_BLOCK)
+                    if not block:
+                        decoder.decode(b"", final=True)
+                        return encoding
+                    decoder.decode(block)
+            except UnicodeDecodeError:
+                continue
+            finally:
+                self._close(handle)
+        return CSV_ENCODINGS[-1]
+
+    def _open_binary(self):
+        if isinstance(self.file, (str, bytes)) or hasattr(self.file, "__fspath__"):
+            return open(self.file, "rb")
+        _rewind(self.file)
+        return self.file
+
+    def _close(self, handle) -> None:
+        if handle is not self.file:
+            handle.close()
+
+    def _read(self, **kwargs):
+        handle = self._open_binary()
+        try:
+            return pd.read_csv(handle, encoding=self.encoding, sep=self.delimiter, **kwargs)
+        finally:
+            if "chunksize" not in kwargs:
+                self._close(handle)
+
+    def sheet_names(self) -> List[str]:
+        return []
+
+    def headers(self) -> List[str]:
+        return clean_headers(list(self._read(nrows=0).columns))
+
+    def count_rows(self) -> int:
+        return sum(len(chunk) for chunk in self.iter_chunks())
+
+    def sample(self, num_rows: int) -> pd.DataFrame:
+        df = self._read(nrows=num_rows)
+        df.columns = clean_headers(list(df.columns))
+        return df
+
+    def iter_chunks(self, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        chunk_size = chunk_size or analytics_setting("CHUNK_SIZE")
+        handle = self._open_binary()
+        try:
+            with pd.read_csv(
+                handle, encoding=self.encoding, sep=self.delimiter, chunksize=chunk_size
+            ) as reader:
+                for chunk in reader:
+                    chunk.columns = clean_headers(list(chunk.columns))
+                    yield chunk
+        finally:
+            self._close(handle)
+
+
+def get_file_extension(filename: str) -> str:
+    return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+
+def open_source(file, filename: str, sheet_name: Optional[str] = None):
+    """Return the streaming source for a file based on its extension."""
+    extension = get_file_extension(filename)
+
+    if extension == "csv":
+        return CsvSource(file)
+    if extension == "xlsx":
+        return ExcelSource(file, sheet_name)
+    if extension == "xls":
+        return XlsSource(file, sheet_name)
+
+    raise ValueError(f"Unsupported file format: {extension}")
+
+
+def open_upload_source(upload, sheet_name: Optional[str] = None):
+    """Return the streaming source for an upload's stored file (from any storage)."""
+    return open_source(upload_local_path(upload), upload.original_filename, sheet_name or upload.sheet_name)
@@ -0,0 +1,214 @@
+"""
+In-process background queue for analytics work.
+
+Jobs run on a small thread pool inside the web process, so requests return
+immediately; progress reaches the browser through ``analytics.events``.
+Uploads whose processing dies with the process are picked up again by the
+``resume_ingestion`` management command.
+
+``ANALYTICS_CONFIG['BACKGROUND_WORKERS'] = 0`` runs jobs inline instead.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.contrib import messages
+from django.db import close_old_connections, connection
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .bulk_updates import run_update_job
+from .conf import analytics_setting
+from .deletion import delete_upload
+from .duplicates import duplicate_message
+from .events import publish_upload_event
+from .ingestion import process_upload
+from .mapping import MappingRecommender, apply_mappings, mark_template_used
+from .models import BillingDataUpload, BillingRecord, BulkUpdateJob, UploadSession
+from .normalization import REQUIRED_FIELDS
+from .parsed_files import build_parsed_file
+from .signals import records_changed
+from .upload_sessions import begin_completion, complete_session, fail_session
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=analytics_setting("BACKGROUND_WORKERS"),
+                thread_name_prefix="analytics-jobs",
+            )
+        return _executor
+
+
+def _run_job(func: Callable, *args, **kwargs) -> None:
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background job {getattr(func, '__name__', func)} failed")
+    finally:
+        # Worker threads keep their own connection; don't leak it
+        connection.close()
+
+
+def submit(func: Callable, *args, **kwargs) -> Optional[Future]:
+    """Run ``func(*args, **kwargs)`` in the background (or inline)."""
+    if analytics_setting("BACKGROUND_WORKERS") <= 0:
+        func(*args, **kwargs)
+        return None
+    return _get_executor().submit(_run_job, func, *args, **kwargs)
+
+
+def _process_upload_job(upload_id) -> None:
+    upload = BillingDataUpload.objects.get(pk=upload_id)
+    try:
+        process_upload(upload)
+    finally:
+        # The user's next reads must see the new records
+        records_changed.send(sender=BillingRecord, user_ids=[upload.user_id])
+
+
+def enqueue_processing(upload: BillingDataUpload) -> bool:
+    """Claim a mapped upload for processing and queue its ingestion.
+
+    The claim is a conditional update, so of two concurrent requests (a
+    double submit) only one queues a run. Returns whether this call did.
+    """
+    started_at = timezone.now()
+    claimed = BillingDataUpload.objects.filter(
+        pk=upload.pk, user_id=upload.user_id, status__iexact=BillingDataUpload.UploadStatus.MAPPED
+    ).update(status="PROCESSING", processing_started_at=started_at)
+    if claimed != 1:
+        return False
+
+    upload.status = "PROCESSING"
+    upload.processing_started_at = started_at
+    publish_upload_event(upload, "progress")
+    submit(_process_upload_job, upload.pk)
+    return True
+
+
+def claim_for_resume(upload: BillingDataUpload) -> bool:
+    """Take over an interrupted run; only one resumer can claim it.
+
+    ``upload`` must be the processing upload as last read: the claim fails
+    if another resumer moved ``processing_started_at`` on since.
+    """
+    started_at = timezone.now()
+    claimed = BillingDataUpload.objects.filter(
+        pk=upload.pk,
+        status__iexact=BillingDataUpload.UploadStatus.PROCESSING,
+        processing_started_at=upload.processing_started_at,
+    ).update(processing_started_at=started_at)
+    if claimed != 1:
+        return False
+
+    upload.processing_started_at = started_at
+    return True
+
+
+def _apply_saved_template(upload: BillingDataUpload, headers: List[str]) -> bool:
+    """Map and queue a file whose layout matches an auto-process template."""
+    template = MappingRecommender(upload.user).find_template(headers)
+    if template is None or not template.auto_process:
+        return False
+    if not all(field in template.mappings for field in REQUIRED_FIELDS):
+        return False
+
+    apply_mappings(upload, template.mappings)
+    upload.date_format = template.date_format
+    upload.status = "MAPPED"
+    upload.save(update_fields=["date_format", "status"])
+    mark_template_used(template)
+    return enqueue_processing(upload)
+
+
+def prepare_new_upload(upload: BillingDataUpload) -> Tuple[List[str], int, bool]:
+    """Parse a newly stored upload and apply a matching saved template.
+
+    Returns (headers, total rows, whether it was queued by a template).
+    """
+    # Parse the file once; later steps reuse the parsed copy
+    parsed = build_parsed_file(upload)
+    upload.total_rows = parsed.row_count
+    upload.save(update_fields=["total_rows"])
+    return parsed.headers, parsed.row_count, _apply_saved_template(upload, parsed.headers)
+
+
+def _complete_session_job(session_id, allow_duplicate: bool) -> None:
+    session = UploadSession.objects.get(pk=session_id)
+    try:
+        upload, created = complete_session(session, allow_duplicate=allow_duplicate)
+    except Exception as e:
+        logger.exception(f"Completing upload session {session_id} failed")
+        fail_session(session, f"Upload failed: {str(e)}")
+        return
+
+    if not created:
+        session.message, session.message_level = duplicate_message(upload), messages.INFO
+    else:
+        try:
+            headers, total_rows, auto_processed = prepare_new_upload(upload)
+            if auto_processed:
+                session.message = (
+                    f"File uploaded successfully! It matches a saved mapping template, so its {total_rows} rows are being processed."
+                )
+            else:
+                session.message = f"File uploaded successfully! Found {len(headers)} columns and {total_rows} rows."
+            session.message_level = messages.SUCCESS
+        except Exception as e:
+            logger.error(f"Error processing file {upload.original_filename}: {str(e)}")
+            session.message, session.message_level = f"Error processing file: {str(e)}", messages.ERROR
+    session.save(update_fields=["message", "message_level", "updated_at"])
+
+
+def enqueue_session_completion(session: UploadSession, allow_duplicate: bool = False) -> Optional[Future]:
+    """Mark the session as completing and queue joining, storing and parsing its file."""
+    if not begin_completion(session):
+        # Already being completed by an earlier request
+        return None
+    return submit(_complete_session_job, session.pk, allow_duplicate)
+
+
+def _delete_upload_job(upload_id) -> None:
+    upload = BillingDataUpload.objects.filter(pk=upload_id).first()
+    if upload is not None:
+        try:
+            delete_upload(upload)
+        finally:
+            records_changed.send(sender=BillingRecord, user_ids=[upload.user_id])
+
+
+def enqueue_deletion(upload: BillingDataUpload) -> Optional[Future]:
+    """Mark the upload as being deleted and queue the deletion."""
+    upload.status = "DELETING"
+    upload.save(update_fields=["status"])
+    publish_upload_event(upload)
+
+    return submit(_delete_upload_job, upload.pk)
+
+
+def _update_records_job(job_id, query) -> None:
+    job = BulkUpdateJob.objects.get(pk=job_id)
+    queryset = BillingRecord.objects.all()
+    queryset.query = query
+    run_update_job(job, queryset)
+
+
+def enqueue_record_update(
+    queryset: QuerySet, values: Dict[str, Any], description: str, requested_by=None
+) -> BulkUpdateJob:
+    """Create a ``BulkUpdateJob`` writing ``values`` to the queryset's records and queue it."""
+    job = BulkUpdateJob.objects.create(description=description, values=values, requested_by=requested_by)
+    # The query is rebuilt in the worker; querysets aren't shared across threads
+    submit(_update_records_job, job.pk, queryset.query.clone())
+    return job
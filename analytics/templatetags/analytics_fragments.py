@@ -0,0 +1,60 @@
+"""
+Per-user fragment caching for analytics widgets (see ``analytics.fragments``).
+
+Usage::
+
+    {% load analytics_fragments %}
+    {% datafragment "fragment-name" [var1 var2 ...] %}
+        .. widget markup ..
+    {% enddatafragment %}
+"""
+
+from django import template
+
+from ..fragments import data_version, fragment_cache, fragment_key
+from ..replicas import reading_from_replica
+
+register = template.Library()
+
+
+class DataFragmentNode(template.Node):
+    def __init__(self, nodelist, fragment_name: str, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context) -> str:
+        cache = fragment_cache()
+        user = getattr(context.get("request"), "user", None)
+        if cache is None or user is None or not user.is_authenticated:
+            return self.nodelist.render(context)
+
+        # Read the version once per page, before any of the data it covers
+        versions = context.render_context.setdefault("analytics_data_versions", {})
+        if user.pk not in versions:
+            versions[user.pk] = data_version(user.pk)
+
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = fragment_key(self.fragment_name, user.pk, versions[user.pk], vary_on)
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            # A lagging replica may not have the data of this version yet
+            if not reading_from_replica():
+                cache.set(key, value)
+        return value
+
+
+@register.tag
+def datafragment(parser, token):
+    """Cache the enclosed widget per user and data version."""
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+    nodelist = parser.parse(("enddatafragment",))
+    parser.delete_first_token()
+    return DataFragmentNode(
+        nodelist,
+        bits[1].strip("\"'"),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
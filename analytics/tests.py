@@ -0,0 +1,451 @@
+"""
+Tests for the analytics app.
+
+They run on any database: ingestion uses the ``bulk_create`` loader and
+jobs run inline (``BACKGROUND_WORKERS = 0``).
+"""
+
+import io
+import json
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock, skipIf
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import Workbook
+
+from .conditional import conditional_on_data
+from .deletion import delete_records, delete_upload
+from .ingestion import IngestionPipeline, process_upload
+from .loaders import BulkCreateLoader, PostgresCopyLoader, get_record_loader
+from .models import BillingDataUpload, BillingRecord, MappedField, UploadSession
+from .partitioning import DEFAULT_HASH_PARTITIONS, get_config
+from .replicas import reading_from_replica, reads_from_replica
+from .signals import records_changed
+from .tasks import enqueue_processing
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix="analytics-tests-")
+
+TEST_CONFIG = {
+    "CHUNK_SIZE": 3,
+    "INGESTION_LOADER": "bulk_create",
+    "BACKGROUND_WORKERS": 0,
+    "DELETE_CHUNK_SIZE": 2,
+    "UPLOAD_PART_SIZE": 64,
+    "UPLOAD_SESSION_DIR": f"{MEDIA_ROOT}/sessions",
+    "FILE_CACHE_DIR": f"{MEDIA_ROOT}/file-cache",
+    "CACHE_ALIAS": "default",
+    "FRAGMENT_CACHE_ALIAS": "default",
+    "READ_REPLICA": None,
+}
+
+TEST_CACHES = {
+    alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"analytics-tests-{alias}"}
+    for alias in ("default", "analytics", "templates", "ratelimit")
+}
+
+COLUMNS = {
+    "customer_name": "Customer",
+    "invoice_number": "Invoice",
+    "amount": "Total",
+    "date": "Date",
+    "payment_status": "Status",
+}
+
+UPSERT = BillingDataUpload.IngestionMode.UPSERT
+
+
+def billing_csv(rows) -> bytes:
+    """CSV file content with one line per (customer, invoice, amount, date, status) row."""
+    lines = ["Customer,Invoice,Total,Date,Status"] + [",".join(row) for row in rows]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def billing_xlsx(rows) -> bytes:
+    """Workbook equivalent of ``billing_csv``; ``None`` rows are left blank."""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Customer", "Invoice", "Total", "Date", "Status"])
+    for row in rows:
+        sheet.append(row or [])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def invoice_rows(numbers, status="paid"):
+    return [(f"Customer {n}", f"INV{n:04d}", f"{n}.50", "15/03/2024", status) for n in numbers]
+
+
+class Interrupted(BaseException):
+    """Stands in for a worker dying mid-upload."""
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ANALYTICS_CONFIG=TEST_CONFIG)
+class AnalyticsTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user("analyst@example.com", "password")
+
+    def make_upload(self, content: bytes, mode=BillingDataUpload.IngestionMode.APPEND, name="billing.csv"):
+        """A mapped upload of ``content``."""
+        upload = BillingDataUpload(
+            user=self.user, original_filename=name, file_size=len(content), status="MAPPED",
+            date_format="DD/MM/YYYY", ingestion_mode=mode,
+        )
+        upload.file.save(name, ContentFile(content), save=False)
+        upload.save()
+        for field, column in COLUMNS.items():
+            MappedField.objects.create(upload=upload, original_column=column, mapped_field=field)
+        return upload
+
+    def interrupt_after_first_chunk(self):
+        """Patch the pipeline so the run dies before committing its second chunk."""
+        checkpoint = IngestionPipeline._checkpoint
+        calls = []
+
+        def failing_checkpoint(pipeline, last_row_number, stats):
+            calls.append(last_row_number)
+            if len(calls) == 2:
+                raise Interrupted()
+            checkpoint(pipeline, last_row_number, stats)
+
+        return mock.patch.object(IngestionPipeline, "_checkpoint", failing_checkpoint)
+
+
+class RecordLoaderTests(AnalyticsTestCase):
+    @skipIf(connection.vendor == "postgresql", "COPY is picked on PostgreSQL")
+    @override_settings(ANALYTICS_CONFIG={**TEST_CONFIG, "INGESTION_LOADER": "auto"})
+    def test_auto_loader_falls_back_to_bulk_create(self):
+        self.assertIsInstance(get_record_loader(), BulkCreateLoader)
+        upload = self.make_upload(billing_csv(invoice_rows(range(4))))
+
+        process_upload(upload)
+
+        self.assertEqual(BillingRecord.objects.filter(upload=upload).count(), 4)
+
+    @override_settings(ANALYTICS_CONFIG={**TEST_CONFIG, "INGESTION_LOADER": "copy"})
+    def test_copy_rows_follow_the_column_list(self):
+        loader = get_record_loader()
+        self.assertIsInstance(loader, PostgresCopyLoader)
+        upload = self.make_upload(billing_csv([]))
+        record = BillingRecord(
+            upload=upload, user=self.user, date=date(2024, 3, 15), customer_name="Acme", invoice_number="INV0001",
+            amount=Decimal("10.50"), custom_fields={"region": "north"}, row_number=1,
+        )
+
+        row = dict(zip((field.name for field in loader.fields), (loader._copy_value(f, record) for f in loader.fields)))
+
+        self.assertEqual(row["date"], "2024-03-15")
+        self.assertEqual(row["custom_fields"], json.dumps({"region": "north"}))
+        self.assertEqual(row["description"], "")
+        self.assertIsNone(row["quantity"])
+        self.assertIsNone(row["dedup_key"])
+        self.assertEqual(row["upload"], upload.pk)
+        self.assertIsNotNone(row["created_at"])
+        # Blank NOT NULL text must not be read back as NULL
+        force_not_null = loader.copy_sql.split("FORCE_NOT_NULL", 1)[1]
+        self.assertIn(connection.ops.quote_name("description"), force_not_null)
+        self.assertNotIn(connection.ops.quote_name("dedup_key"), force_not_null)
+
+
+class ChunkedIngestionTests(AnalyticsTestCase):
+    def test_rows_are_committed_in_checkpointed_chunks(self):
+        upload = self.make_upload(billing_csv(invoice_rows(range(7))))
+
+        process_upload(upload)
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "COMPLETED")
+        self.assertEqual(upload.processed_rows, 7)
+        self.assertEqual(upload.last_checkpoint_row, 7)
+        self.assertEqual(
+            list(BillingRecord.objects.filter(upload=upload).order_by("row_number").values_list("row_number", flat=True)),
+            list(range(1, 8)),
+        )
+
+    def test_resume_continues_after_the_checkpoint(self):
+        upload = self.make_upload(billing_csv(invoice_rows(range(7))))
+        with self.interrupt_after_first_chunk(), self.assertRaises(Interrupted):
+            process_upload(upload)
+        upload.refresh_from_db()
+        self.assertEqual(upload.last_checkpoint_row, 3)
+        self.assertEqual(BillingRecord.objects.filter(upload=upload).count(), 3)
+
+        process_upload(upload, resume=True)
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "COMPLETED")
+        self.assertEqual(upload.processed_rows, 7)
+        self.assertEqual(BillingRecord.objects.filter(upload=upload).values("row_number").distinct().count(), 7)
+
+    def test_double_submit_queues_one_run(self):
+        upload = self.make_upload(billing_csv(invoice_rows(range(3))))
+        stale_copy = BillingDataUpload.objects.get(pk=upload.pk)
+
+        with mock.patch("analytics.tasks.submit") as submit:
+            self.assertTrue(enqueue_processing(upload))
+            self.assertFalse(enqueue_processing(stale_copy))
+
+        self.assertEqual(submit.call_count, 1)
+
+    def test_mapping_cannot_change_while_processing(self):
+        upload = self.make_upload(billing_csv(invoice_rows(range(3))))
+        self.client.force_login(self.user)
+        with mock.patch("analytics.tasks.submit"):
+            enqueue_processing(upload)
+
+        response = self.client.post(
+            reverse("analytics:column_mapping", args=[upload.pk]),
+            {"date_format": "MM/DD/YYYY", "mapping_amount": "Customer"},
+        )
+
+        self.assertRedirects(response, reverse("analytics:upload_detail", args=[upload.pk]), fetch_redirect_response=False)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "PROCESSING")
+        self.assertEqual(upload.date_format, "DD/MM/YYYY")
+        self.assertEqual(MappedField.objects.get(upload=upload, mapped_field="amount").original_column, "Total")
+
+
+class UpsertDedupTests(AnalyticsTestCase):
+    def test_resume_keeps_identical_rows_without_key_fields(self):
+        # Whole-row keys are numbered by occurrence; a resume must continue the numbering
+        upload = self.make_upload(billing_csv(invoice_rows([1] * 6)), mode=UPSERT)
+        with self.interrupt_after_first_chunk(), self.assertRaises(Interrupted):
+            process_upload(upload)
+
+        process_upload(upload, resume=True)
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.inserted_rows, 6)
+        self.assertEqual(BillingRecord.objects.filter(upload=upload).count(), 6)
+
+    def test_overlapping_upload_only_writes_the_delta(self):
+        first = self.make_upload(billing_csv(invoice_rows(range(0, 6))), name="week1.csv", mode=UPSERT)
+        process_upload(first)
+        second = self.make_upload(billing_csv(invoice_rows(range(3, 9))), name="week2.csv", mode=UPSERT)
+
+        process_upload(second)
+
+        second.refresh_from_db()
+        self.assertEqual((second.inserted_rows, second.updated_rows, second.unchanged_rows), (3, 0, 3))
+        self.assertEqual(BillingRecord.objects.filter(user=self.user).count(), 9)
+        # Records in both files belong to the newer upload
+        self.assertEqual(BillingRecord.objects.filter(upload=first).count(), 3)
+        self.assertEqual(BillingRecord.objects.filter(upload=second).count(), 6)
+
+        delete_upload(first)
+        self.assertEqual(BillingRecord.objects.filter(user=self.user).count(), 6)
+
+    @override_settings(ANALYTICS_CONFIG={**TEST_CONFIG, "DEDUP_KEY_FIELDS": ["invoice_number"]})
+    def test_changed_rows_are_updated_in_place(self):
+        process_upload(self.make_upload(billing_csv(invoice_rows(range(4), status="pending")), mode=UPSERT))
+        record_ids = set(BillingRecord.objects.values_list("pk", flat=True))
+        rows = invoice_rows(range(2), status="paid") + invoice_rows(range(2, 4), status="pending")
+        upload = self.make_upload(billing_csv(rows), mode=UPSERT)
+
+        process_upload(upload)
+
+        upload.refresh_from_db()
+        self.assertEqual((upload.inserted_rows, upload.updated_rows, upload.unchanged_rows), (0, 2, 2))
+        self.assertEqual(set(BillingRecord.objects.values_list("pk", flat=True)), record_ids)
+        self.assertEqual(BillingRecord.objects.filter(payment_status="paid").count(), 2)
+
+    @override_settings(ANALYTICS_CONFIG={**TEST_CONFIG, "DEDUP_KEY_FIELDS": ["invoice_number"]})
+    def test_repeated_keys_in_one_file_are_reported(self):
+        # Row 2 repeats row 1 in the same chunk, row 5 repeats row 1 in the next one
+        rows = invoice_rows([1]) + invoice_rows([1], status="pending") + invoice_rows([2, 3]) + invoice_rows([1])
+        upload = self.make_upload(billing_csv(rows), mode=UPSERT)
+
+        process_upload(upload)
+
+        upload.refresh_from_db()
+        self.assertEqual((upload.inserted_rows, upload.updated_rows, upload.unchanged_rows), (3, 0, 0))
+        self.assertIn("Row 2: Same invoice_number as row 1", upload.error_message)
+        self.assertIn("Row 5: Same invoice_number as row 1", upload.error_message)
+        self.assertEqual(BillingRecord.objects.get(invoice_number="INV0001").payment_status, "paid")
+
+    def test_uploads_append_unless_upsert_is_chosen(self):
+        process_upload(self.make_upload(billing_csv(invoice_rows(range(3)))))
+        upload = BillingDataUpload.objects.create(user=self.user, original_filename="again.csv", file_size=1)
+
+        self.assertEqual(upload.ingestion_mode, BillingDataUpload.IngestionMode.APPEND)
+        self.assertFalse(BillingRecord.objects.exclude(dedup_key=None).exists())
+
+
+class ChunkedDeletionTests(AnalyticsTestCase):
+    def test_records_are_deleted_in_chunks(self):
+        upload = self.make_upload(billing_csv(invoice_rows(range(7))))
+        process_upload(upload)
+        totals = []
+
+        deleted = delete_records(BillingRecord.objects.filter(upload=upload), on_chunk=totals.append)
+
+        self.assertEqual(deleted, 7)
+        self.assertEqual(totals, [2, 4, 6, 7])
+        self.assertFalse(BillingRecord.objects.filter(upload=upload).exists())
+        upload.refresh_from_db()
+        self.assertEqual(upload.processed_rows, 0)
+
+    def test_delete_upload_removes_upload_and_records(self):
+        upload = self.make_upload(billing_csv(invoice_rows(range(5))))
+        process_upload(upload)
+
+        self.assertEqual(delete_upload(upload), 5)
+
+        self.assertFalse(BillingDataUpload.objects.filter(pk=upload.pk).exists())
+        self.assertFalse(BillingRecord.objects.exists())
+
+
+class UploadSessionTests(AnalyticsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.content = billing_csv(invoice_rows(range(10)))
+
+    def create_session(self):
+        response = self.client.post(
+            reverse("analytics:upload_session_create"),
+            json.dumps({"filename": "large.csv", "file_size": len(self.content)}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def send_part(self, session, index):
+        start = index * session["part_size"]
+        return self.client.put(
+            reverse("analytics:upload_session_part", args=[session["id"], index]),
+            self.content[start:start + session["part_size"]],
+            content_type="application/octet-stream",
+        )
+
+    def complete(self, session):
+        return self.client.post(
+            reverse("analytics:upload_session_complete", args=[session["id"]]), "{}", content_type="application/json"
+        )
+
+    def test_interrupted_upload_resumes_and_completes(self):
+        session = self.create_session()
+        self.assertGreater(session["part_count"], 2)
+        for index in range(0, session["part_count"], 2):
+            self.assertEqual(self.send_part(session, index).status_code, 200)
+
+        self.assertEqual(self.complete(session).status_code, 400)
+        state = self.client.get(reverse("analytics:upload_session", args=[session["id"]])).json()
+        self.assertEqual(state["missing_parts"], list(range(1, session["part_count"], 2)))
+
+        for index in state["missing_parts"]:
+            self.send_part(session, index)
+        response = self.complete(session)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], UploadSession.Status.COMPLETED)
+        upload = BillingDataUpload.objects.get(user=self.user)
+        self.assertEqual(upload.total_rows, 10)
+        with upload.file.open("rb") as stored:
+            self.assertEqual(stored.read(), self.content)
+
+    def test_completing_twice_creates_one_upload(self):
+        session = self.create_session()
+        for index in range(session["part_count"]):
+            self.send_part(session, index)
+
+        self.assertEqual(self.complete(session).status_code, 202)
+        self.assertEqual(self.complete(session).status_code, 400)
+
+        self.assertEqual(BillingDataUpload.objects.filter(user=self.user).count(), 1)
+
+
+class ConditionalResponseTests(AnalyticsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        upload = self.make_upload(billing_csv(invoice_rows(range(5))))
+        enqueue_processing(upload)
+        self.url = reverse("analytics:summary_stats_api")
+
+    def test_unchanged_data_is_answered_with_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        with CaptureQueriesContext(connection) as queries:
+            revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(revalidated.status_code, 304)
+        table = BillingRecord._meta.db_table
+        self.assertFalse([query for query in queries.captured_queries if table in query["sql"]])
+
+    def test_changed_data_gets_a_new_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        record = BillingRecord.objects.filter(user=self.user).first()
+        record.amount += 1
+        record.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(ANALYTICS_CONFIG={**TEST_CONFIG, "READ_REPLICA": "replica"})
+    def test_tagged_bodies_are_read_from_the_replica_unless_pinned(self):
+        replica = []
+
+        @conditional_on_data
+        @reads_from_replica
+        def view(request):
+            replica.append(reading_from_replica())
+            return HttpResponse()
+
+        request = RequestFactory().get(self.url)
+        request.user = self.user
+        view(request)
+        records_changed.send(sender=BillingRecord, user_ids=[self.user.pk])
+        response = view(request)
+
+        self.assertEqual(replica, [True, False])
+        self.assertTrue(response.has_header("ETag"))
+
+
+class PartitioningConfigTests(AnalyticsTestCase):
+    @override_settings(ANALYTICS_CONFIG={**TEST_CONFIG, "RECORD_PARTITIONING": {"strategy": "hash"}})
+    def test_hash_partitioning_defaults(self):
+        self.assertEqual(get_config(), {"strategy": "hash", "partitions": DEFAULT_HASH_PARTITIONS})
+
+    @override_settings(ANALYTICS_CONFIG={**TEST_CONFIG, "RECORD_PARTITIONING": {"strategy": "range"}})
+    def test_date_partitioning_is_rejected(self):
+        # (dedup_key, date) uniqueness would let an upsert store a redated record twice
+        with self.assertRaises(ImproperlyConfigured):
+            get_config()
+
+
+class ExcelSourceTests(AnalyticsTestCase):
+    def test_blank_rows_keep_the_sheet_row_numbers(self):
+        rows = invoice_rows([1]) + [None] + invoice_rows([2]) + [None, None]
+        upload = self.make_upload(billing_xlsx(rows), name="billing.xlsx")
+
+        process_upload(upload)
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.total_rows, 3)
+        self.assertTrue(upload.error_message.startswith("Row 2: "))
+        self.assertEqual(
+            list(BillingRecord.objects.filter(upload=upload).order_by("row_number").values_list("row_number", flat=True)),
+            [1, 3],
+        )
@@ -0,0 +1,259 @@
+"""
+Chunked, resumable uploads.
+
+Multipart form uploads are limited by ``FILE_UPLOAD_MAX_MEMORY_SIZE`` /
+``DATA_UPLOAD_MAX_MEMORY_SIZE`` and tie up a worker for the whole
+transfer. Instead the browser:
+
+1. creates an ``UploadSession`` with the file name and size;
+2. sends the file in ``UPLOAD_PART_SIZE`` parts, each a raw request body
+   streamed straight to the part store (never read into memory whole);
+   after an interruption it asks which parts arrived and sends the rest;
+3. completes the session: the parts are joined into the stored file and a
+   ``BillingDataUpload`` is created, as if it had been posted in one go.
+   A file the user already uploaded completes as that upload instead
+   (see ``analytics.duplicates``), unless a duplicate is asked for.
+   Joining and storing up to ``MAX_RESUMABLE_FILE_SIZE`` bytes takes a
+   while, so the request only marks the session ``completing`` and the
+   work runs as a background job (``analytics.tasks``); the browser polls
+   the session until it is ``completed`` or ``failed``.
+
+``LocalPartStore`` keeps parts on the local filesystem
+(``UPLOAD_SESSION_DIR``), standing in for a remote store such as GCS
+(whose compose operation would join parts server-side). With several
+hosts behind a load balancer the directory must be shared.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from typing import BinaryIO, List, Optional, Tuple
+
+from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .conf import analytics_setting
+from .duplicates import find_duplicate_upload, reuse_stored_copy
+from .file_access import cache_uploaded_file
+from .models import BillingDataUpload, UploadSession
+from .sources import get_file_extension
+
+logger = logging.getLogger(__name__)
+
+STREAM_BLOCK_SIZE = 64 * 1024
+PART_NAME = re.compile(r"^(\d{6})\.part$")
+
+
+class LocalPartStore:
+    """Stores session parts as files under ``UPLOAD_SESSION_DIR/<session id>/``."""
+
+    def __init__(self, root: str = None):
+        self.root = root or analytics_setting("UPLOAD_SESSION_DIR") or os.path.join(
+            tempfile.gettempdir(), "analytics-upload-sessions"
+        )
+
+    def _dir(self, session: UploadSession) -> str:
+        return os.path.join(self.root, str(session.pk))
+
+    def write_part(self, session: UploadSession, index: int, stream: BinaryIO, length: int) -> None:
+        """Stream a part to disk; it only becomes visible once complete."""
+        directory = self._dir(session)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".incoming-")
+        written = 0
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                while written < length:
+                    block = stream.read(min(STREAM_BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    handle.write(block)
+                    written += len(block)
+            if written != length:
+                raise ValidationError(f"Part {index} is incomplete: received {written} of {length} bytes")
+            os.replace(tmp_path, os.path.join(directory, f"{index:06d}.part"))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def received_parts(self, session: UploadSession) -> List[int]:
+        """Indexes of the parts stored with their expected size."""
+        directory = self._dir(session)
+        if not os.path.isdir(directory):
+            return []
+
+        received = []
+        for entry in os.scandir(directory):
+            match = PART_NAME.match(entry.name)
+            if match:
+                index = int(match.group(1))
+                if index < session.part_count and entry.stat().st_size == session.part_length(index):
+                    received.append(index)
+        return sorted(received)
+
+    def assemble(self, session: UploadSession) -> Tuple[str, str]:
+        """Join the parts, in order, into one local file. Returns (path, SHA-256)."""
+        directory = self._dir(session)
+        path = os.path.join(directory, "assembled")
+        digest = hashlib.sha256()
+        with open(path, "wb") as output:
+            for index in range(session.part_count):
+                with open(os.path.join(directory, f"{index:06d}.part"), "rb") as part:
+                    while block := part.read(STREAM_BLOCK_SIZE):
+                        digest.update(block)
+                        output.write(block)
+        return path, digest.hexdigest()
+
+    def discard(self, session: UploadSession) -> None:
+        shutil.rmtree(self._dir(session), ignore_errors=True)
+
+
+def get_part_store() -> LocalPartStore:
+    return LocalPartStore()
+
+
+def create_session(user, filename: str, file_size: int) -> UploadSession:
+    """Validate the announced file and open a session for it."""
+    filename = os.path.basename(filename or "").strip()
+    allowed_extensions = analytics_setting("ALLOWED_EXTENSIONS")
+    if get_file_extension(filename) not in allowed_extensions:
+        raise ValidationError(f"File type is not supported. Please upload: {', '.join(allowed_extensions)}")
+
+    max_size = analytics_setting("MAX_RESUMABLE_FILE_SIZE")
+    if file_size <= 0:
+        raise ValidationError("The file is empty.")
+    if file_size > max_size:
+        raise ValidationError(f"File size must be less than {max_size // (1024 * 1024)}MB.")
+
+    return UploadSession.objects.create(
+        user=user, filename=filename, file_size=file_size, part_size=analytics_setting("UPLOAD_PART_SIZE")
+    )
+
+
+def store_part(session: UploadSession, index: int, stream: BinaryIO, length: int) -> None:
+    """Write part ``index`` of an open session from ``stream``."""
+    if session.status != UploadSession.Status.OPEN:
+        raise ValidationError("The upload session is no longer open.")
+    if not 0 <= index < session.part_count:
+        raise ValidationError(f"Part {index} is out of range (0-{session.part_count - 1}).")
+    if length != session.part_length(index):
+        raise ValidationError(f"Part {index} must be {session.part_length(index)} bytes, got {length}.")
+
+    get_part_store().write_part(session, index, stream, length)
+    # Marks activity, so expiry only removes abandoned sessions
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+
+
+def missing_parts(session: UploadSession) -> List[int]:
+    received = set(get_part_store().received_parts(session))
+    return [index for index in range(session.part_count) if index not in received]
+
+
+def begin_completion(session: UploadSession) -> bool:
+    """Mark a session whose parts have all arrived as completing.
+
+    Returns whether this call claimed it; a session that is already
+    completing (a repeated request) is left to the job claiming it.
+    """
+    if session.status == UploadSession.Status.COMPLETING:
+        return False
+    if session.status != UploadSession.Status.OPEN:
+        raise ValidationError("The upload session is no longer open.")
+    missing = missing_parts(session)
+    if missing:
+        raise ValidationError(f"{len(missing)} parts are missing, starting with part {missing[0]}.")
+
+    claimed = UploadSession.objects.filter(pk=session.pk, status=UploadSession.Status.OPEN).update(
+        status=UploadSession.Status.COMPLETING, updated_at=timezone.now()
+    )
+    session.refresh_from_db(fields=["status", "updated_at"])
+    return claimed == 1
+
+
+def complete_session(session: UploadSession, allow_duplicate: bool = False) -> Tuple[BillingDataUpload, bool]:
+    """Assemble the parts of a completing session into a new ``BillingDataUpload``.
+
+    Returns (upload, created). When the user already uploaded the same
+    file and ``allow_duplicate`` is false, nothing is stored and the
+    existing upload is returned.
+    """
+    if session.status != UploadSession.Status.COMPLETING:
+        raise ValidationError("The upload session is not being completed.")
+
+    store = get_part_store()
+    path, checksum = store.assemble(session)
+
+    duplicate = None if allow_duplicate else find_duplicate_upload(session.user, checksum)
+    if duplicate is not None:
+        store.discard(session)
+        session.status = UploadSession.Status.COMPLETED
+        session.duplicate_of = duplicate
+        session.save(update_fields=["status", "duplicate_of", "updated_at"])
+        logger.info(f"Upload session {session.pk} is a duplicate of upload {duplicate.pk}")
+        return duplicate, False
+
+    with open(path, "rb") as handle:
+        upload = BillingDataUpload(
+            user=session.user, original_filename=session.filename, file_size=session.file_size, checksum=checksum
+        )
+        if not reuse_stored_copy(upload, session.filename):
+            upload.file.save(session.filename, File(handle, name=session.filename), save=False)
+        cache_uploaded_file(upload, File(handle, name=session.filename))
+
+        with transaction.atomic():
+            upload.save()
+            session.status = UploadSession.Status.COMPLETED
+            session.upload = upload
+            session.save(update_fields=["status", "upload", "updated_at"])
+
+    store.discard(session)
+    logger.info(f"Upload session {session.pk} completed as upload {upload.pk} ({session.file_size} bytes)")
+    return upload, True
+
+
+def fail_session(session: UploadSession, message: str) -> None:
+    """Record that completing the session failed; its parts are dropped."""
+    get_part_store().discard(session)
+    session.status = UploadSession.Status.FAILED
+    session.message = message
+    session.message_level = messages.ERROR
+    session.save(update_fields=["status", "message", "message_level", "updated_at"])
+
+
+def take_message(session: UploadSession) -> Optional[Tuple[int, str]]:
+    """The session's outcome message as (level, text), handed out only once."""
+    if not session.message:
+        return None
+    taken = UploadSession.objects.filter(pk=session.pk).exclude(message="").update(message="")
+    return (session.message_level, session.message) if taken else None
+
+
+def abort_session(session: UploadSession) -> None:
+    get_part_store().discard(session)
+    session.status = UploadSession.Status.ABORTED
+    session.save(update_fields=["status", "updated_at"])
+
+
+def expire_sessions(max_age: timedelta) -> int:
+    """Abort open sessions without activity for ``max_age``. Returns how many.
+
+    Sessions left completing that long lost their job (e.g. to a restart).
+    """
+    stale = UploadSession.objects.filter(
+        status__in=[UploadSession.Status.OPEN, UploadSession.Status.COMPLETING],
+        updated_at__lt=timezone.now() - max_age,
+    )
+    count = 0
+    for session in stale:
+        abort_session(session)
+        count += 1
+    return count
@@ -29,6 +29,12 @@ urlpatterns = [
     path("upload/<uuid:upload_id>/process/", views.ProcessUploadView.as_view(), name="process_upload"),
     path("uploads/<uuid:pk>/preview/", views.DataPreviewView.as_view(), name="data_preview"),
     
+    # Chunked, resumable uploads
+    path("api/upload-sessions/", views.UploadSessionCreateAPIView.as_view(), name="upload_session_create"),
+    path("api/upload-sessions/<uuid:session_id>/", views.UploadSessionAPIView.as_view(), name="upload_session"),
+    path("api/upload-sessions/<uuid:session_id>/parts/<int:index>/", views.UploadSessionPartAPIView.as_view(), name="upload_session_part"),
+    path("api/upload-sessions/<uuid:session_id>/complete/", views.UploadSessionCompleteAPIView.as_view(), name="upload_session_complete"),
+    
     # Billing records
     path("records/", views.BillingRecordListView.as_view(), name="record_list"),
     path("record/<int:record_id>/", views.RecordDetailView.as_view(), name="record_detail"),
@@ -48,6 +54,8 @@ urlpatterns = [
     # API endpoints for AJAX requests
     path("ajax/chat/", views.ajax_chat_query, name="ajax_chat"),
     path("ajax/upload-status/<uuid:upload_id>/", views.ajax_upload_status, name="ajax_upload_status"),
+    path("events/upload/<uuid:upload_id>/", views.upload_events_stream, name="upload_events"),
+    path("events/notifications/", views.notifications_stream, name="notifications_stream"),
     path("ajax/analytics-data/", views.ajax_analytics_data, name="ajax_analytics_data"),
     path("api/debug-columns/<uuid:upload_id>/", views.DebugFileColumnsAPIView.as_view(), name="debug_file_columns"),
     path("api/validate-data/<uuid:pk>/", views.ValidateDataAPIView.as_view(), name="validate_data_api"),
@@ -13,170 +13,32 @@ from django.db.models import QuerySet, Sum, Avg, Count, Q
 from django.core.exceptions import ValidationError
 
 from .models import BillingDataUpload, MappedField, BillingRecord
+from .parsed_files import get_parsed_file, open_cached_source
 
 
 class FileProcessor:
-    """Utility class for processing uploaded files."""
+    """Utility class for reading uploaded files through the parsed-file cache."""
     
     def __init__(self, upload: BillingDataUpload):
         self.upload = upload
     
-    def get_file_headers(self) -> List[str]:
-        """Extract column headers from the uploaded file."""
+    def _parsed_file(self):
         try:
-            file_extension = self.upload.original_filename.split(".")[-1].lower()
-            
-            if file_extension == "csv":
-                return self._get_csv_headers()
-            elif file_extension in ["xlsx", "xls"]:
-                return self._get_excel_headers()
-            else:
-                raise ValueError(f"Unsupported file format: {file_extension}")
-                
+            return get_parsed_file(self.upload)
         except Exception as e:
-            raise ValidationError(f"Error reading file headers: {str(e)}")
-    
-    def _get_csv_headers(self) -> List[str]:
-        """Get headers from CSV file."""
-        self.upload.file.seek(0)
-        
-        # Try different encodings
-        encodings = ["utf-8", "latin-1", "cp1252"]
-        for encoding in encodings:
-            try:
-                self.upload.file.seek(0)
-                content = self.upload.file.read().decode(encoding)
-                
-                # Reset file pointer
-                self.upload.file.seek(0)
-                
-                # Parse CSV
-                csv_reader = csv.reader(io.StringIO(content))
-                headers = next(csv_reader)
-                
-                # Clean headers
-                return [header.strip() for header in headers if header.strip()]
-                
-            except UnicodeDecodeError:
-                continue
-            except Exception as e:
-                continue
-        
-        raise ValidationError("Unable to read CSV file. Please check the file encoding.")
+            raise ValidationError(f"Error reading file: {str(e)}")
     
-    def _get_excel_headers(self) -> List[str]:
-        """Get headers from Excel file."""
-        try:
-            # Read Excel file
-            df = pd.read_excel(self.upload.file, nrows=0)  # Only read headers
-            return df.columns.tolist()
-            
-        except Exception as e:
-            raise ValidationError(f"Error reading Excel file: {str(e)}")
+    def get_file_headers(self) -> List[str]:
+        """Extract column headers from the uploaded file."""
+        return list(self._parsed_file().headers)
     
     def get_sample_data(self, num_rows: int = 5) -> List[Dict[str, Any]]:
         """Get sample data from the file for preview."""
-        try:
-            file_extension = self.upload.original_filename.split(".")[-1].lower()
-            
-            if file_extension == "csv":
-                return self._get_csv_sample(num_rows)
-            elif file_extension in ["xlsx", "xls"]:
-                return self._get_excel_sample(num_rows)
-            else:
-                raise ValueError(f"Unsupported file format: {file_extension}")
-                
-        except Exception as e:
-            raise ValidationError(f"Error reading sample data: {str(e)}")
-    
-    def _get_csv_sample(self, num_rows: int) -> List[Dict[str, Any]]:
-        """Get sample data from CSV file."""
-        self.upload.file.seek(0)
-        
-        # Try different encodings
-        encodings = ["utf-8", "latin-1", "cp1252"]
-        for encoding in encodings:
-            try:
-                self.upload.file.seek(0)
-                content = self.upload.file.read().decode(encoding)
-                
-                # Parse CSV
-                csv_reader = csv.DictReader(io.StringIO(content))
-                
-                sample_data = []
-                for i, row in enumerate(csv_reader):
-                    if i >= num_rows:
-                        break
-                    sample_data.append(dict(row))
-                
-                return sample_data
-                
-            except UnicodeDecodeError:
-                continue
-            except Exception:
-                continue
-        
-        raise ValidationError("Unable to read CSV file sample data.")
-    
-    def _get_excel_sample(self, num_rows: int) -> List[Dict[str, Any]]:
-        """Get sample data from Excel file."""
-        try:
-            df = pd.read_excel(self.upload.file, nrows=num_rows)
-            
-            # Convert to list of dictionaries
-            return df.to_dict("records")
-            
-        except Exception as e:
-            raise ValidationError(f"Error reading Excel sample data: {str(e)}")
+        return self._parsed_file().sample_rows[:num_rows]
     
     def count_total_rows(self) -> int:
         """Count total rows in the file (excluding header)."""
-        try:
-            file_extension = self.upload.original_filename.split(".")[-1].lower()
-            
-            if file_extension == "csv":
-                return self._count_csv_rows()
-            elif file_extension in ["xlsx", "xls"]:
-                return self._count_excel_rows()
-            else:
-                raise ValueError(f"Unsupported file format: {file_extension}")
-                
-        except Exception as e:
-            raise ValidationError(f"Error counting rows: {str(e)}")
-    
-    def _count_csv_rows(self) -> int:
-        """Count rows in CSV file."""
-        self.upload.file.seek(0)
-        
-        # Try different encodings
-        encodings = ["utf-8", "latin-1", "cp1252"]
-        for encoding in encodings:
-            try:
-                self.upload.file.seek(0)
-                content = self.upload.file.read().decode(encoding)
-                
-                # Count rows
-                csv_reader = csv.reader(io.StringIO(content))
-                next(csv_reader)  # Skip header
-                
-                row_count = sum(1 for row in csv_reader if any(cell.strip() for cell in row))
-                return row_count
-                
-            except UnicodeDecodeError:
-                continue
-            except Exception:
-                continue
-        
-        raise ValidationError("Unable to count CSV rows.")
-    
-    def _count_excel_rows(self) -> int:
-        """Count rows in Excel file."""
-        try:
-            df = pd.read_excel(self.upload.file)
-            return len(df)
-            
-        except Exception as e:
-            raise ValidationError(f"Error counting Excel rows: {str(e)}")
+        return self._parsed_file().row_count
 
 
 class DataProcessor:
@@ -254,18 +116,18 @@ class DataProcessor:
         processed_count = 0
         
         try:
-            df = pd.read_excel(self.upload.file)
+            source = open_cached_source(self.upload)
+            row_number = 1  # Excel rows start at 1, header is row 1
             
-            for index, row in df.iterrows():
-                row_number = index + 2  # Excel rows start at 1, header is row 1
-                try:
-                    # Convert pandas Series to dict
-                    row_dict = row.to_dict()
-                    record = self._create_billing_record(row_dict, row_number)
-                    if record:
-                        processed_count += 1
-                except Exception as e:
-                    errors.append(f"Row {row_number}: {str(e)}")
+            for chunk in source.iter_chunks():
+                for row_dict in chunk.to_dict("records"):
+                    row_number += 1
+                    try:
+                        record = self._create_billing_record(row_dict, row_number)
+                        if record:
+                            processed_count += 1
+                    except Exception as e:
+                        errors.append(f"Row {row_number}: {str(e)}")
             
             return processed_count, errors
             
@@ -388,7 +250,7 @@ class AnalyticsCalculator:
     
     def _get_base_queryset(self) -> QuerySet:
         """Get the base queryset for analytics calculations."""
-        queryset = BillingRecord.objects.filter(upload__user=self.user)
+        queryset = BillingRecord.objects.filter(user=self.user)
         
         if self.start_date:
             queryset = queryset.filter(date__gte=self.start_date)
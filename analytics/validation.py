@@ -0,0 +1,230 @@
+"""
+Whole-file dry-run validation.
+
+Applies an upload's column mappings and type conversions to every row with
+vectorized pandas operations (one pass per chunk instead of
+``normalize_row`` per row) and reports what ingestion would do, without
+writing anything:
+
+- errors: rows ingestion would reject, grouped by reason. They follow
+  ``analytics.normalization``, plus values over the ``BillingRecord``
+  column limits that PostgreSQL rejects at insert time.
+- warnings: values ingestion silently coerces (e.g. a non-numeric amount
+  stored as 0).
+
+Reports are stored on the upload's ``ParsedUploadFile`` and reused until the
+mappings, date format or parsed file change.
+"""
+
+import hashlib
+import json
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+from django.db import models
+
+from .models import BillingDataUpload, BillingRecord, MappedField
+from .normalization import DATE_FORMAT_PATTERNS, MONEY_FIELDS, QUANTITY_FIELDS, REQUIRED_FIELDS
+from .parsed_files import ParsedSource, get_parsed_file
+
+MAX_CATEGORY_ROWS = 5
+MAX_SAMPLE_FAILURES = 10
+
+
+def _as_bool(mask: pd.Series) -> pd.Series:
+    """Plain boolean mask; comparisons against missing text yield NA."""
+    return mask.fillna(False).astype(bool)
+
+
+class _Report:
+    """Accumulates per-chunk findings."""
+
+    def __init__(self):
+        self.total_rows = 0
+        self.invalid_rows = 0
+        self.categories = {"errors": defaultdict(list), "warnings": defaultdict(list)}
+        self.counts = {"errors": defaultdict(int), "warnings": defaultdict(int)}
+        self.sample_failures: List[Dict[str, Any]] = []
+
+    def add(self, kind: str, message: str, mask: pd.Series, row_numbers: pd.Series) -> None:
+        mask = _as_bool(mask)
+        count = int(mask.sum())
+        if not count:
+            return
+        self.counts[kind][message] += count
+        rows = self.categories[kind][message]
+        if len(rows) < MAX_CATEGORY_ROWS:
+            rows.extend(int(n) for n in row_numbers[mask].head(MAX_CATEGORY_ROWS - len(rows)))
+
+    def as_dict(self) -> Dict[str, Any]:
+        def grouped(kind):
+            return sorted(
+                (
+                    {"message": message, "count": count, "rows": self.categories[kind][message]}
+                    for message, count in self.counts[kind].items()
+                ),
+                key=lambda group: -group["count"],
+            )
+
+        return {
+            "total_rows": self.total_rows,
+            "valid_rows": self.total_rows - self.invalid_rows,
+            "invalid_rows": self.invalid_rows,
+            "errors": grouped("errors"),
+            "warnings": grouped("warnings"),
+            "sample_failures": self.sample_failures,
+        }
+
+
+def _text(series: pd.Series) -> pd.Series:
+    """Stripped text values; missing cells become NA."""
+    return series.astype("string").str.strip()
+
+
+def _parse_dates(text: pd.Series, date_format: str) -> pd.Series:
+    """Vectorized ``parse_date_with_format``: explicit patterns, then inference."""
+    if date_format == "auto":
+        patterns = [pattern for group in DATE_FORMAT_PATTERNS.values() for pattern in group]
+    else:
+        patterns = DATE_FORMAT_PATTERNS.get(date_format, ["%d/%m/%Y"])
+
+    parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    remaining = text.notna() & (text != "")
+    for pattern in patterns:
+        if not remaining.any():
+            break
+        attempt = pd.to_datetime(text[remaining], format=pattern, errors="coerce")
+        parsed[attempt.index] = attempt
+        remaining &= parsed.isna()
+
+    if remaining.any():
+        dayfirst = date_format in ["DD/MM/YYYY", "DD-MM-YYYY", "DD.MM.YYYY", "auto"]
+        attempt = pd.to_datetime(text[remaining], dayfirst=dayfirst, errors="coerce", format="mixed")
+        parsed[attempt.index] = attempt
+    return parsed
+
+
+def _parse_numbers(text: pd.Series) -> pd.Series:
+    cleaned = text.str.replace("₹", "", regex=False).str.replace(",", "", regex=False).str.strip()
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+def _validate_chunk(
+    chunk: pd.DataFrame, first_row_number: int, mappings: Dict[str, str], date_format: str, report: _Report
+) -> None:
+    row_numbers = pd.Series(range(first_row_number, first_row_number + len(chunk)), index=chunk.index)
+    invalid = pd.Series(False, index=chunk.index)
+    messages: Dict[str, pd.Series] = {}
+    model_fields = {field.name: field for field in BillingRecord._meta.concrete_fields}
+
+    def error(message: str, mask: pd.Series) -> None:
+        nonlocal invalid
+        mask = _as_bool(mask)
+        report.add("errors", message, mask, row_numbers)
+        invalid |= mask
+        messages[message] = messages[message] | mask if message in messages else mask
+
+    # Unmapped required fields, or mapped to a column the file lacks. Like
+    # ingestion, a mapped but absent amount column means an amount of 0.
+    all_rows = pd.Series(True, index=chunk.index)
+    for field in REQUIRED_FIELDS:
+        column = mappings.get(field)
+        if column in chunk.columns:
+            continue
+        if field != "amount":
+            error(f"{field} is required", all_rows)
+        elif column is None:
+            error("amount must be a positive number", all_rows)
+
+    for field, column in mappings.items():
+        if column not in chunk.columns:
+            continue
+
+        text = _text(chunk[column])
+        present = text.notna() & (text != "")
+        model_field = model_fields.get(field)
+
+        if model_field is None:
+            error(f"{field} is not a billing record field", all_rows)
+        elif field in MONEY_FIELDS or field in QUANTITY_FIELDS:
+            # Ingestion strips currency symbols and separators from money only
+            numbers = _parse_numbers(text) if field in MONEY_FIELDS else pd.to_numeric(text, errors="coerce")
+            unparsed = present & numbers.isna()
+            fallback = "stored as 0" if field in MONEY_FIELDS else "left empty"
+            report.add("warnings", f"{field} is not a number; {fallback}", unparsed, row_numbers)
+
+            if field == "amount":
+                error("amount must be a positive number", present & (numbers < 0))
+            limit = 10 ** (model_field.max_digits - model_field.decimal_places)
+            error(f"{field} exceeds {model_field.max_digits - model_field.decimal_places} digits", numbers.abs() >= limit)
+        elif isinstance(model_field, models.DateField):
+            dates = _parse_dates(text, date_format)
+            if field == "date":
+                error("date is required", dates.isna())
+        else:
+            if field in ("customer_name", "invoice_number"):
+                error(f"{field} is required", ~present)
+            max_length = getattr(model_field, "max_length", None)
+            if max_length:
+                error(f"{field} is longer than {max_length} characters", present & (text.str.len() > max_length))
+
+    failed = invalid[invalid]
+    report.total_rows += len(chunk)
+    report.invalid_rows += len(failed)
+
+    for index in failed.index[:MAX_SAMPLE_FAILURES - len(report.sample_failures)]:
+        report.sample_failures.append({
+            "row": int(row_numbers[index]),
+            "errors": [message for message, mask in messages.items() if mask[index]],
+            "values": {
+                field: None if pd.isna(chunk.at[index, column]) else str(chunk.at[index, column])
+                for field, column in mappings.items() if column in chunk.columns
+            },
+        })
+
+
+def validate_frames(frames: Iterable[pd.DataFrame], mappings: Dict[str, str], date_format: str) -> Dict[str, Any]:
+    """Validate a stream of DataFrame chunks against the mappings."""
+    report = _Report()
+    for chunk in frames:
+        chunk = chunk.reset_index(drop=True)
+        _validate_chunk(chunk, report.total_rows + 1, mappings, date_format, report)
+    return report.as_dict()
+
+
+def validation_key(mappings: Dict[str, str], date_format: str, parsed) -> str:
+    """Fingerprint of everything a validation report depends on."""
+    payload = json.dumps(
+        [sorted(mappings.items()), date_format, parsed.sheet_name, parsed.row_count, parsed.data_file.name],
+        default=str,
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def validate_upload(upload: BillingDataUpload, refresh: bool = False) -> Optional[Dict[str, Any]]:
+    """Dry-run the whole file against the upload's current mappings.
+
+    Returns ``None`` when the upload has no mappings yet.
+    """
+    mappings = {
+        mapping.mapped_field: mapping.original_column
+        for mapping in MappedField.objects.filter(upload=upload)
+    }
+    if not mappings:
+        return None
+
+    parsed = get_parsed_file(upload)
+    key = validation_key(mappings, upload.date_format, parsed)
+    if not refresh and parsed.validation_key == key and parsed.validation_result:
+        return {**parsed.validation_result, "cached": True}
+
+    started = time.monotonic()
+    result = validate_frames(ParsedSource(parsed).iter_chunks(), mappings, upload.date_format)
+    result["duration_ms"] = int((time.monotonic() - started) * 1000)
+
+    parsed.validation_key = key
+    parsed.validation_result = result
+    parsed.save(update_fields=["validation_key", "validation_result"])
+    return {**result, "cached": False}
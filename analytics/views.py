@@ -9,6 +9,7 @@ This module contains all the views for the analytics application including:
 """
 
 import json
+import logging
 import uuid
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
@@ -20,7 +21,7 @@ from django.views.generic import (
     TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView
 )
 from django.views import View
-from django.http import JsonResponse, HttpResponse, HttpRequest, Http404
+from django.http import HttpResponse, HttpRequest, Http404, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator
@@ -31,14 +32,33 @@ from django.utils import timezone
 from django.conf import settings
 
 from .models import (
-    BillingDataUpload, MappedField, BillingRecord, AnalyticsQuery
+    BillingDataUpload, MappedField, BillingRecord, AnalyticsQuery, MappingTemplate, UploadSession
 )
 from .utils import (
-    DataProcessor, AnalyticsCalculator, ChatGPTIntegration
+    AnalyticsCalculator, ChatGPTIntegration
 )
-
-
-class DashboardView(LoginRequiredMixin, TemplateView):
+from .conditional import ConditionalDataMixin, conditional_on_data
+from .conf import analytics_setting
+from .duplicates import duplicate_message, find_duplicate_upload, reuse_stored_copy
+from .file_access import cache_uploaded_file
+from .fragments import lazy_context
+from .upload_sessions import abort_session, create_session, missing_parts, store_part, take_message
+from .events import stream_upload_events, stream_user_notifications
+from .mapping import MappingRecommender, apply_mappings, learn_template
+from .normalization import REQUIRED_FIELDS, parse_date_with_format
+from .parsed_files import build_parsed_file, get_parsed_file
+from .preview import build_preview
+from .replicas import ReplicaReadsMixin, reads_from_replica
+from .responses import OrjsonResponse, dumps
+from .sources import open_upload_source
+from .deletion import delete_records
+from .tasks import enqueue_deletion, enqueue_processing, enqueue_session_completion, prepare_new_upload
+from .validation import validate_upload
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardView(LoginRequiredMixin, ReplicaReadsMixin, TemplateView):
     """Main dashboard view for the analytics application."""
     
     template_name = "analytics/dashboard.html"
@@ -54,7 +74,7 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         ).order_by("-upload_date")[:5]
         
         # Calculate statistics - aggregate by invoice first
-        user_records = BillingRecord.objects.filter(upload__user=self.request.user)
+        user_records = BillingRecord.objects.filter(user=self.request.user)
         total_records = user_records.count()
         
         # Aggregate by invoice_number first, then sum
@@ -92,6 +112,9 @@ class FileUploadView(LoginRequiredMixin, CreateView):
         """Add segment to context."""
         context = super().get_context_data(**kwargs)
         context["segment"] = "file_upload"
+        # Larger files are sent in parts through an upload session
+        context["max_file_size"] = analytics_setting("MAX_FILE_SIZE")
+        context["max_resumable_file_size"] = analytics_setting("MAX_RESUMABLE_FILE_SIZE")
         return context
     
     def form_valid(self, form):
@@ -116,36 +139,35 @@ class FileUploadView(LoginRequiredMixin, CreateView):
                 form.add_error('file', f'File type "{file_extension}" is not supported. Please upload: {", ".join(allowed_extensions)}')
                 return self.form_invalid(form)
             
+            # Checksum the file and keep a local copy for parsing, so remote
+            # storage isn't read back right after the upload
+            cache_uploaded_file(form.instance, uploaded_file)
+            
+            # The same file again: send the user to the upload that already
+            # has its parsed copy and records, instead of ingesting it twice
+            duplicate = find_duplicate_upload(self.request.user, form.instance.checksum)
+            if duplicate is not None and not self.request.POST.get("allow_duplicate"):
+                messages.info(self.request, duplicate_message(duplicate))
+                return redirect("analytics:upload_detail", upload_id=duplicate.id)
+            
+            # Identical content is stored once; a forced duplicate shares it
+            reuse_stored_copy(form.instance, uploaded_file.name)
+            
             response = super().form_valid(form)
             
             # Process file headers and sample data
             try:
-                import pandas as pd
-                import os
-                
-                file_path = form.instance.file.path
-                
-                # Read file to get basic info
-                if file_path.endswith(".csv"):
-                    df = pd.read_csv(file_path, nrows=0)  # Just get headers
-                    total_rows = sum(1 for line in open(file_path)) - 1  # Subtract header
-                elif file_path.endswith((".xlsx", ".xls")):
-                    df = pd.read_excel(file_path, nrows=0)  # Just get headers
-                    full_df = pd.read_excel(file_path)
-                    total_rows = len(full_df)
+                headers, total_rows, auto_processed = prepare_new_upload(form.instance)
+                if auto_processed:
+                    messages.success(
+                        self.request,
+                        f"File uploaded successfully! It matches a saved mapping template, so its {total_rows} rows are being processed."
+                    )
                 else:
-                    raise ValueError("Unsupported file format")
-                
-                headers = list(df.columns)
-                
-                # Update the upload with file info
-                form.instance.total_rows = total_rows
-                form.instance.save()
-                
-                messages.success(
-                    self.request, 
-                    f"File uploaded successfully! Found {len(headers)} columns and {total_rows} rows."
-                )
+                    messages.success(
+                        self.request, 
+                        f"File uploaded successfully! Found {len(headers)} columns and {total_rows} rows."
+                    )
             except Exception as e:
                 # Log the error for debugging
                 import logging
@@ -178,6 +200,101 @@ class FileUploadView(LoginRequiredMixin, CreateView):
         return super().form_invalid(form)
 
 
+def _session_state(session: UploadSession) -> Dict[str, Any]:
+    state = {
+        "id": str(session.pk),
+        "filename": session.filename,
+        "file_size": session.file_size,
+        "part_size": session.part_size,
+        "part_count": session.part_count,
+        "status": session.status,
+        "missing_parts": missing_parts(session) if session.status == UploadSession.Status.OPEN else [],
+        "upload_id": str(session.upload_id) if session.upload_id else None,
+    }
+    if session.status == UploadSession.Status.COMPLETED:
+        if session.duplicate_of_id:
+            state["duplicate_of"] = str(session.duplicate_of_id)
+            state["redirect_url"] = reverse("analytics:upload_detail", kwargs={"upload_id": session.duplicate_of_id})
+        else:
+            state["redirect_url"] = reverse("analytics:upload_list")
+    if session.status == UploadSession.Status.FAILED:
+        state["error"] = session.message or "Upload failed"
+    return state
+
+
+def _deliver_outcome(request: HttpRequest, session: UploadSession) -> None:
+    """Show a completed session's message on the page the browser moves on to."""
+    if session.status == UploadSession.Status.COMPLETED:
+        message = take_message(session)
+        if message is not None:
+            messages.add_message(request, *message)
+
+
+class UploadSessionCreateAPIView(LoginRequiredMixin, View):
+    """Start a chunked, resumable upload (see ``analytics.upload_sessions``)."""
+    
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            session = create_session(request.user, data.get("filename", ""), int(data.get("file_size", 0)))
+        except (ValueError, TypeError):
+            return OrjsonResponse({"error": "Expected JSON with filename and file_size"}, status=400)
+        except ValidationError as e:
+            return OrjsonResponse({"error": " ".join(e.messages)}, status=400)
+        
+        return OrjsonResponse(_session_state(session), status=201)
+
+
+class UploadSessionAPIView(LoginRequiredMixin, View):
+    """Report which parts of a session are missing, or abort it."""
+    
+    def get(self, request, session_id):
+        session = get_object_or_404(UploadSession, pk=session_id, user=request.user)
+        _deliver_outcome(request, session)
+        return OrjsonResponse(_session_state(session))
+    
+    def delete(self, request, session_id):
+        session = get_object_or_404(UploadSession, pk=session_id, user=request.user)
+        if session.status == UploadSession.Status.OPEN:
+            abort_session(session)
+        return OrjsonResponse(_session_state(session))
+
+
+class UploadSessionPartAPIView(LoginRequiredMixin, View):
+    """Receive one part as the raw request body."""
+    
+    def put(self, request, session_id, index):
+        session = get_object_or_404(UploadSession, pk=session_id, user=request.user)
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+            # Streamed from the request; request.body would buffer the part
+            store_part(session, index, request, length)
+        except ValidationError as e:
+            return OrjsonResponse({"error": " ".join(e.messages)}, status=400)
+        
+        return OrjsonResponse({"part": index, "received": True})
+
+
+class UploadSessionCompleteAPIView(LoginRequiredMixin, View):
+    """Start assembling a session's parts into an upload; poll the session for the outcome."""
+    
+    def post(self, request, session_id):
+        session = get_object_or_404(UploadSession, pk=session_id, user=request.user)
+        try:
+            options = json.loads(request.body) if request.content_type == "application/json" else {}
+        except ValueError:
+            return OrjsonResponse({"error": "Expected a JSON body"}, status=400)
+        try:
+            enqueue_session_completion(session, allow_duplicate=bool(options.get("allow_duplicate")))
+        except ValidationError as e:
+            return OrjsonResponse({"error": " ".join(e.messages), **_session_state(session)}, status=400)
+        
+        # Completed already when jobs run inline
+        session.refresh_from_db()
+        _deliver_outcome(request, session)
+        return OrjsonResponse(_session_state(session), status=202)
+
+
 class UploadListView(LoginRequiredMixin, ListView):
     """List view for all uploaded files."""
     
@@ -220,9 +337,25 @@ class UploadDetailView(LoginRequiredMixin, DetailView):
             upload=upload
         ).order_by("-created_at")[:10]
         
+        # First rows of the file, from the parsed-file cache
+        try:
+            preview = build_preview(upload, analytics_setting("SAMPLE_ROWS"))
+            context["sample_headers"] = preview["headers"]
+            context["sample_table"] = _preview_table(preview)
+        except Exception as e:
+            logger.error(f"Error building preview for upload {upload.pk}: {str(e)}")
+        
         return context
 
 
+def _preview_table(preview: Dict[str, Any]) -> List[List[Any]]:
+    """Sample rows as lists in header order, for templates."""
+    return [
+        [row.get(header) for header in preview["headers"]]
+        for row in preview["sample_data"]
+    ]
+
+
 class UploadDeleteView(LoginRequiredMixin, DeleteView):
     """Delete an upload and all associated data."""
     model = BillingDataUpload
@@ -234,10 +367,27 @@ class UploadDeleteView(LoginRequiredMixin, DeleteView):
     def get_queryset(self) -> QuerySet[BillingDataUpload]:
         return BillingDataUpload.objects.filter(user=self.request.user)
 
-    def delete(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
-        upload = self.get_object()
-        messages.success(request, f"Upload '{upload.file.name}' has been deleted successfully.")
-        return super().delete(request, *args, **kwargs)
+    def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
+        """Count the records the upload holds now.
+
+        In upsert mode records move to the latest upload containing them,
+        so this can be fewer than the upload processed.
+        """
+        context = super().get_context_data(**kwargs)
+        context["record_count"] = BillingRecord.objects.filter(upload=self.object).count()
+        return context
+
+    def form_valid(self, form) -> HttpResponse:
+        """Delete the upload's records in the background, in chunks."""
+        upload = self.object
+        if upload.status.lower() == BillingDataUpload.UploadStatus.PROCESSING:
+            messages.error(self.request, "This upload is still being processed and can't be deleted yet.")
+            return redirect("analytics:upload_detail", upload_id=upload.pk)
+        
+        filename = upload.original_filename
+        enqueue_deletion(upload)
+        messages.success(self.request, f"Upload '{filename}' is being deleted.")
+        return redirect(self.get_success_url())
 
 
 class ColumnMappingView(LoginRequiredMixin, TemplateView):
@@ -270,13 +420,24 @@ class ColumnMappingView(LoginRequiredMixin, TemplateView):
             for mapping in MappedField.objects.filter(upload=upload)
         }
         
+        # Worksheet to map; "?sheet=" previews another sheet before saving
+        sheet_name = self.request.GET.get("sheet", upload.sheet_name)
+        sheet_names = self._get_sheet_names(upload)
+        if sheet_name not in sheet_names:
+            sheet_name = sheet_names[0] if sheet_names else ""
+        
         # Read actual file columns from the uploaded file
-        file_columns = self._get_file_columns(upload)
+        file_columns = self._get_file_columns(upload, sheet_name)
         
-        # Get intelligent suggestions if no mappings exist yet
+        # Suggestions from a saved template or the user's past mappings
         suggested_mappings = {}
+        suggestion_scores = {}
+        mapping_template = None
         if not mappings and file_columns:
-            suggested_mappings = self._suggest_column_mappings(file_columns)
+            recommendation = MappingRecommender(self.request.user).recommend(file_columns)
+            suggested_mappings = recommendation.mappings
+            suggestion_scores = recommendation.scores
+            mapping_template = recommendation.template
         
         # Required billing fields with their current mappings
         required_fields = [
@@ -362,6 +523,7 @@ class ColumnMappingView(LoginRequiredMixin, TemplateView):
         for field in required_fields + optional_fields:
             if not field["mapped_column"] and field["key"] in suggested_mappings:
                 field["suggested_column"] = suggested_mappings[field["key"]]
+                field["suggestion_score"] = suggestion_scores.get(field["key"])
         
         context.update({
             "upload": upload,
@@ -370,190 +532,90 @@ class ColumnMappingView(LoginRequiredMixin, TemplateView):
             "optional_fields": optional_fields,
             "file_columns": file_columns,
             "suggested_mappings": suggested_mappings,
+            "mapping_template": mapping_template,
             "current_date_format": upload.date_format,
+            "ingestion_modes": BillingDataUpload.IngestionMode.choices,
+            "current_ingestion_mode": upload.ingestion_mode,
+            "sheet_names": sheet_names,
+            "current_sheet": sheet_name,
         })
         
         return context
     
-    def _get_file_columns(self, upload: BillingDataUpload) -> List[str]:
+    def _get_sheet_names(self, upload: BillingDataUpload) -> List[str]:
+        """List the worksheets of an Excel upload (empty for CSV files)."""
+        try:
+            return get_parsed_file(upload).sheet_names
+        except Exception as e:
+            logger.error(f"Error reading sheet names for upload {upload.pk}: {str(e)}")
+            return []
+    
+    def _get_file_columns(self, upload: BillingDataUpload, sheet_name: str = "") -> List[str]:
         """Extract column names from the uploaded file."""
         try:
-            import pandas as pd
-            import os
-            
-            file_path = upload.file.path
-            
-            # Check if file exists
-            if not os.path.exists(file_path):
-                print(f"File does not exist at path: {file_path}")
-                return []
-            
-            # Read file headers based on file type
-            if file_path.endswith(".csv"):
-                # Try different encodings for CSV files
-                encodings = ["utf-8", "latin-1", "cp1252", "iso-8859-1"]
-                df = None
-                
-                for encoding in encodings:
-                    try:
-                        df = pd.read_csv(file_path, nrows=0, encoding=encoding)
-                        print(f"Successfully read CSV with encoding: {encoding}")
-                        break
-                    except (UnicodeDecodeError, UnicodeError) as e:
-                        print(f"Failed to read with encoding {encoding}: {e}")
-                        continue
-                
-                if df is None:
-                    # Fallback: try with default encoding
-                    try:
-                        df = pd.read_csv(file_path, nrows=0)
-                        print("Successfully read CSV with default encoding")
-                    except Exception as e:
-                        print(f"Failed to read CSV with default encoding: {e}")
-                        return []
-                    
-            elif file_path.endswith((".xlsx", ".xls")):
-                try:
-                    df = pd.read_excel(file_path, nrows=0)
-                    print("Successfully read Excel file")
-                except Exception as e:
-                    print(f"Failed to read Excel file: {e}")
-                    return []
-            else:
-                print(f"Unsupported file format: {file_path}")
+            if not upload.file.storage.exists(upload.file.name):
+                logger.error(f"File does not exist in storage: {upload.file.name}")
                 return []
             
-            # Get column names and clean them
-            columns = list(df.columns)
-            print(f"Raw columns from file: {columns}")
+            # Headers are cleaned (stripped, blank and duplicate names made
+            # unique) the same way the ingestion pipeline reads them
+            parsed = get_parsed_file(upload)
+            if not sheet_name or sheet_name == parsed.sheet_name:
+                return parsed.headers
             
-            # Clean column names (remove extra spaces, handle unnamed columns)
-            cleaned_columns = []
-            for i, col in enumerate(columns):
-                if pd.isna(col) or str(col).startswith("Unnamed:"):
-                    cleaned_columns.append(f"Column_{i+1}")
-                else:
-                    cleaned_columns.append(str(col).strip())
-            
-            print(f"Cleaned columns: {cleaned_columns}")
-            return cleaned_columns
+            # Previewing another worksheet; it is parsed once saved
+            return open_upload_source(upload, sheet_name).headers()
             
-        except ImportError:
-            print("Error: pandas library not available")
-            return []
         except Exception as e:
-            # Log the error (in production, use proper logging)
-            print(f"Error reading file columns: {str(e)}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
+            logger.error(f"Error reading file columns for upload {upload.pk}: {str(e)}")
             return []
     
-    def _suggest_column_mappings(self, file_columns: List[str]) -> Dict[str, str]:
-        """Suggest column mappings based on column name similarity."""
-        suggestions = {}
-        
-        # Define mapping patterns for common column variations
-        mapping_patterns = {
-            "customer_name": [
-                "customer_name", "customer name", "client_name", "client name", 
-                "company", "company_name", "customer", "client", "name"
-            ],
-            "invoice_number": [
-                "invoice_number", "invoice number", "invoice_id", "invoice id",
-                "inv_num", "inv_number", "bill_number", "bill number", "invoice"
-            ],
-            "amount": [
-                "amount", "total", "invoice_amount", "invoice amount", 
-                "bill_amount", "bill amount", "cost", "price", "value"
-            ],
-            "date": [
-                "date", "invoice_date", "invoice date", "bill_date", "bill date",
-                "created_date", "created date", "timestamp"
-            ],
-            "payment_status": [
-                "payment_status", "payment status", "status", "paid", "payment"
-            ],
-            "description": [
-                "description", "notes", "memo", "comment", "details"
-            ],
-            "customer_email": [
-                "email", "customer_email", "customer email", "client_email", "e_mail"
-            ],
-            "due_date": [
-                "due_date", "due date", "payment_due", "payment due", "due"
-            ]
-        }
-        
-        # Find best matches for each predefined field
-        for field, patterns in mapping_patterns.items():
-            best_match = None
-            best_score = 0
-            
-            for file_col in file_columns:
-                file_col_lower = file_col.lower().replace("_", " ").replace("-", " ")
-                
-                for pattern in patterns:
-                    pattern_lower = pattern.lower()
-                    
-                    # Exact match gets highest score
-                    if file_col_lower == pattern_lower:
-                        best_match = file_col
-                        best_score = 100
-                        break
-                    
-                    # Partial match scoring
-                    if pattern_lower in file_col_lower:
-                        score = len(pattern_lower) / len(file_col_lower) * 80
-                        if score > best_score:
-                            best_match = file_col
-                            best_score = score
-                    
-                    elif file_col_lower in pattern_lower:
-                        score = len(file_col_lower) / len(pattern_lower) * 70
-                        if score > best_score:
-                            best_match = file_col
-                            best_score = score
-                
-                if best_score >= 100:  # Exact match found
-                    break
-            
-            # Only suggest if confidence is high enough
-            if best_match and best_score >= 60:
-                suggestions[field] = best_match
-        
-        return suggestions
-    
     def post(self, request, *args, **kwargs):
         """Handle column mapping form submission."""
         upload = self.get_object()
         
-        # Save date format preference
+        # A running job reads the file and mappings and owns the status
+        if upload.status.lower() in (BillingDataUpload.UploadStatus.PROCESSING, BillingDataUpload.UploadStatus.DELETING):
+            messages.error(request, "This upload is being processed or deleted, so its mappings can't be changed now.")
+            return redirect("analytics:upload_detail", upload_id=upload.pk)
+        
+        # Save date format and worksheet preferences
         date_format = request.POST.get("date_format", "DD/MM/YYYY")
         upload.date_format = date_format
-        upload.save(update_fields=["date_format"])
+        update_fields = ["date_format"]
         
-        # Clear existing mappings
-        MappedField.objects.filter(upload=upload).delete()
+        ingestion_mode = request.POST.get("ingestion_mode")
+        if ingestion_mode in BillingDataUpload.IngestionMode.values:
+            upload.ingestion_mode = ingestion_mode
+            update_fields.append("ingestion_mode")
         
-        # Create new mappings
-        mappings_created = 0
-        for field_name, column_name in request.POST.items():
-            if field_name.startswith("mapping_") and column_name:
-                mapped_field = field_name.replace("mapping_", "")
-                is_required = mapped_field in ["customer_name", "invoice_number", "amount", "date"]
-                
-                MappedField.objects.create(
-                    upload=upload,
-                    original_column=column_name,
-                    mapped_field=mapped_field,
-                    is_required=is_required
-                )
-                mappings_created += 1
+        sheet_name = request.POST.get("sheet_name", upload.sheet_name)
+        if sheet_name != upload.sheet_name:
+            upload.sheet_name = sheet_name
+            try:
+                upload.total_rows = build_parsed_file(upload).row_count
+            except Exception as e:
+                logger.error(f"Error parsing sheet {sheet_name!r}: {str(e)}")
+            update_fields += ["sheet_name", "total_rows"]
+        upload.save(update_fields=update_fields)
+        
+        mappings = {
+            field_name.replace("mapping_", "", 1): column_name
+            for field_name, column_name in request.POST.items()
+            if field_name.startswith("mapping_") and column_name
+        }
+        mappings_created = apply_mappings(upload, mappings)
+        
+        # Remember complete mappings so the next file in this layout maps itself
+        if all(field in mappings for field in REQUIRED_FIELDS):
+            file_columns = self._get_file_columns(upload, upload.sheet_name)
+            if file_columns:
+                learn_template(upload, file_columns, mappings)
         
         # Update upload status to MAPPED if mappings were created
         if mappings_created > 0:
             upload.status = "MAPPED"
-            upload.save()
+            upload.save(update_fields=["status"])
             messages.success(request, f"Column mappings and date format saved successfully! {mappings_created} fields mapped. You can now process the upload.")
         else:
             messages.warning(request, "No column mappings were created. Please map at least one field.")
@@ -566,237 +628,22 @@ class ProcessUploadView(LoginRequiredMixin, View):
     
     def post(self, request: HttpRequest, upload_id: uuid.UUID) -> HttpResponse:
         try:
-            upload = BillingDataUpload.objects.get(
-                id=upload_id, 
-                user=request.user,
-                status="MAPPED"
-            )
-            
-            # Update status to processing
-            upload.status = "PROCESSING"
-            upload.processing_started_at = timezone.now()
-            upload.save()
-            
-            # Process in background (for now, we'll do it synchronously)
-            self._process_upload(upload)
+            upload = BillingDataUpload.objects.get(id=upload_id, user=request.user)
             
-            messages.success(request, "Upload processing has started.")
+            # Ingestion runs on the background queue; progress streams via SSE.
+            # Only a mapped upload is claimed, and only once.
+            if enqueue_processing(upload):
+                messages.success(request, "Upload processing has started.")
+            else:
+                messages.warning(request, "Upload is not ready for processing or is already being processed.")
             return redirect("analytics:upload_detail", upload_id=upload_id)
             
         except BillingDataUpload.DoesNotExist:
-            messages.error(request, "Upload not found or not ready for processing.")
+            messages.error(request, "Upload not found.")
             return redirect("analytics:upload_list")
         except Exception as e:
             messages.error(request, f"Error starting processing: {str(e)}")
             return redirect("analytics:upload_detail", upload_id=upload_id)
-    
-    def _process_upload(self, upload: BillingDataUpload) -> None:
-        """Process the upload and create billing records."""
-        try:
-            # Get mappings
-            mappings = {
-                mapping.mapped_field: mapping.original_column
-                for mapping in MappedField.objects.filter(upload=upload)
-            }
-            
-            if not mappings:
-                upload.status = "ERROR"
-                upload.error_message = "No column mappings found"
-                upload.save()
-                return
-            
-            # Check if required fields are mapped
-            required_fields = ["customer_name", "invoice_number", "amount", "date"]
-            missing_required = [field for field in required_fields if field not in mappings]
-            
-            if missing_required:
-                upload.status = "ERROR"
-                upload.error_message = f"Missing required field mappings: {', '.join(missing_required)}"
-                upload.save()
-                return
-            
-            # Read file data
-            file_path = upload.file.path
-            try:
-                if file_path.endswith(".csv"):
-                    import pandas as pd
-                    # Try different encodings for CSV files
-                    encodings = ["utf-8", "latin-1", "cp1252", "iso-8859-1"]
-                    df = None
-                    
-                    for encoding in encodings:
-                        try:
-                            df = pd.read_csv(file_path, encoding=encoding)
-                            break
-                        except (UnicodeDecodeError, UnicodeError):
-                            continue
-                    
-                    if df is None:
-                        df = pd.read_csv(file_path)  # Fallback to default
-                        
-                elif file_path.endswith((".xlsx", ".xls")):
-                    import pandas as pd
-                    df = pd.read_excel(file_path)
-                else:
-                    upload.status = "ERROR"
-                    upload.error_message = "Unsupported file format"
-                    upload.save()
-                    return
-            except Exception as e:
-                upload.status = "ERROR"
-                upload.error_message = f"Error reading file: {str(e)}"
-                upload.save()
-                return
-            
-            upload.total_rows = len(df)
-            upload.save()
-            
-            # Create billing records
-            created_count = 0
-            errors = []
-            
-            for index, row in df.iterrows():
-                try:
-                    # Extract data based on mappings
-                    record_data = {}
-                    
-                    # Process each mapped field
-                    for field, column in mappings.items():
-                        if column in row and pd.notna(row[column]):
-                            value = row[column]
-                            
-                            # Type conversion for specific fields
-                            if field in ["amount", "tax_amount", "discount", "unit_price"]:
-                                try:
-                                    # Clean monetary values
-                                    cleaned_value = str(value).replace("₹", "").replace(",", "").strip()
-                                    record_data[field] = float(cleaned_value) if cleaned_value else 0.0
-                                except (ValueError, TypeError):
-                                    record_data[field] = 0.0
-                            elif field in ["quantity"]:
-                                try:
-                                    record_data[field] = float(str(value).strip()) if str(value).strip() else None
-                                except (ValueError, TypeError):
-                                    record_data[field] = None
-                            elif field in ["date", "due_date", "payment_date"]:
-                                try:
-                                    # Use the upload's date format preference for parsing
-                                    record_data[field] = self._parse_date_with_format(value, upload.date_format)
-                                except (ValueError, TypeError):
-                                    record_data[field] = None
-                            else:
-                                record_data[field] = str(value).strip()
-                        else:
-                            # Handle missing values for required fields
-                            if field in required_fields:
-                                if field in ["amount"]:
-                                    record_data[field] = 0.0
-                                elif field in ["date"]:
-                                    record_data[field] = None
-                                else:
-                                    record_data[field] = ""
-                    
-                    # Validate required fields have values
-                    validation_errors = []
-                    if not record_data.get("customer_name"):
-                        validation_errors.append("customer_name is required")
-                    if not record_data.get("invoice_number"):
-                        validation_errors.append("invoice_number is required")
-                    if record_data.get("amount") is None or record_data.get("amount") < 0:
-                        validation_errors.append("amount must be a positive number")
-                    if not record_data.get("date"):
-                        validation_errors.append("date is required")
-                    
-                    if validation_errors:
-                        errors.append(f"Row {index + 1}: {'; '.join(validation_errors)}")
-                        continue
-                    
-                    # Create billing record
-                    BillingRecord.objects.create(
-                        upload=upload,
-                        row_number=index + 1,
-                        **record_data
-                    )
-                    created_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Row {index + 1}: {str(e)}")
-                
-                # Update progress every 10 rows
-                if (index + 1) % 10 == 0:
-                    upload.processed_rows = created_count
-                    upload.save()
-            
-            # Final update
-            upload.processed_rows = created_count
-            
-            # Update final status
-            if errors:
-                upload.status = "COMPLETED" if created_count > 0 else "ERROR"
-                upload.error_message = "; ".join(errors[:10])  # Keep only first 10 errors
-                if created_count > 0:
-                    upload.error_message += f" ({len(errors)} total errors, {created_count} records created)"
-            else:
-                upload.status = "COMPLETED"
-            
-            upload.processing_completed_at = timezone.now()
-            upload.save()
-            
-        except Exception as e:
-            upload.status = "ERROR"
-            upload.error_message = f"Processing error: {str(e)}"
-            upload.processing_completed_at = timezone.now()
-            upload.save()
-
-    def _parse_date_with_format(self, date_value, date_format: str):
-        """Parse date value according to the specified format."""
-        import pandas as pd
-        from datetime import datetime
-        
-        if pd.isna(date_value) or not date_value:
-            return None
-            
-        date_str = str(date_value).strip()
-        if not date_str:
-            return None
-        
-        # Define format mappings
-        format_patterns = {
-            "DD/MM/YYYY": ["%d/%m/%Y", "%d/%m/%y"],
-            "MM/DD/YYYY": ["%m/%d/%Y", "%m/%d/%y"],
-            "YYYY-MM-DD": ["%Y-%m-%d"],
-            "DD-MM-YYYY": ["%d-%m-%Y", "%d-%m-%y"],
-            "MM-DD-YYYY": ["%m-%d-%Y", "%m-%d-%y"],
-            "DD.MM.YYYY": ["%d.%m.%Y", "%d.%m.%y"],
-        }
-        
-        # Auto-detect format
-        if date_format == "auto":
-            all_patterns = []
-            for patterns in format_patterns.values():
-                all_patterns.extend(patterns)
-        else:
-            all_patterns = format_patterns.get(date_format, ["%d/%m/%Y"])
-        
-        # Try to parse with each pattern
-        for pattern in all_patterns:
-            try:
-                parsed_date = datetime.strptime(date_str, pattern)
-                return parsed_date.date()
-            except (ValueError, TypeError):
-                continue
-        
-        # Fallback to pandas datetime parsing
-        try:
-            # For Indian format, specify dayfirst=True
-            dayfirst = date_format in ["DD/MM/YYYY", "DD-MM-YYYY", "DD.MM.YYYY"] or date_format == "auto"
-            parsed_date = pd.to_datetime(date_str, dayfirst=dayfirst, errors="coerce")
-            if pd.notna(parsed_date):
-                return parsed_date.date()
-        except Exception:
-            pass
-        
-        return None
 
 
 class DataPreviewView(LoginRequiredMixin, TemplateView):
@@ -814,16 +661,27 @@ class DataPreviewView(LoginRequiredMixin, TemplateView):
             user=self.request.user
         )
         
+        try:
+            preview = build_preview(upload)
+        except Exception as e:
+            logger.error(f"Error building preview for upload {upload.pk}: {str(e)}")
+            messages.error(self.request, f"Error reading file: {str(e)}")
+            preview = {"headers": [], "sample_data": [], "column_stats": [], "validation": None}
+        
         context.update({
+            "segment": "uploads",
             "upload": upload,
-            "sample_data": [],  # Sample data not stored in model
-            "headers": [],  # Headers not stored in model
+            "sample_data": _preview_table(preview),
+            "headers": preview["headers"],
+            "column_stats": preview["column_stats"],
+            "validation": preview["validation"],
+            "total_rows": preview.get("total_rows", upload.total_rows or 0),
         })
         
         return context
 
 
-class AnalyticsView(LoginRequiredMixin, TemplateView):
+class AnalyticsView(LoginRequiredMixin, ReplicaReadsMixin, TemplateView):
     """Main analytics dashboard view."""
     
     template_name = "analytics/analytics.html"
@@ -832,9 +690,19 @@ class AnalyticsView(LoginRequiredMixin, TemplateView):
         """Add analytics data to context."""
         context = super().get_context_data(**kwargs)
         context["segment"] = "analytics"
+        context["today"] = timezone.now().date().strftime("%Y-%m-%d")
+        context["date_range"] = self.request.GET.get("date_range", "30")
         
+        # Only computed when a widget isn't cached yet (see analytics.fragments)
+        context.update(lazy_context(
+            self.get_widget_data, ["analytics_data", "has_data", "recent_records", "total_records"]
+        ))
+        return context
+    
+    def get_widget_data(self) -> Dict[str, Any]:
+        """Statistics, chart data and recent records for the dashboard widgets."""
         # Get user's billing records
-        records = BillingRecord.objects.filter(upload__user=self.request.user)
+        records = BillingRecord.objects.filter(user=self.request.user)
         
         if records.exists():
             # Get recent records for display
@@ -925,21 +793,20 @@ class AnalyticsView(LoginRequiredMixin, TemplateView):
                 "average_invoice": float(average_invoice),
                 "total_records": total_invoices,  # Changed to total_invoices instead of record count
                 # Chart data as JSON strings for JavaScript
-                "monthly_revenue_labels": json.dumps(monthly_revenue_labels),
-                "monthly_revenue_data": json.dumps(monthly_revenue_data),
-                "payment_status_labels": json.dumps(payment_status_labels),
-                "payment_status_data": json.dumps(payment_status_counts),
-                "top_customers_labels": json.dumps(top_customers_labels),
-                "top_customers_data": json.dumps(top_customers_amounts),
+                "monthly_revenue_labels": dumps(monthly_revenue_labels).decode(),
+                "monthly_revenue_data": dumps(monthly_revenue_data).decode(),
+                "payment_status_labels": dumps(payment_status_labels).decode(),
+                "payment_status_data": dumps(payment_status_counts).decode(),
+                "top_customers_labels": dumps(top_customers_labels).decode(),
+                "top_customers_data": dumps(top_customers_amounts).decode(),
             }
             
-            context.update({
+            return {
                 "analytics_data": analytics_data,
                 "has_data": True,
                 "recent_records": recent_records,
                 "total_records": total_invoices,  # Changed to show invoice count
-                "date_range": self.request.GET.get("date_range", "30"),
-            })
+            }
         else:
             # Empty data structure for no data case
             analytics_data = {
@@ -947,33 +814,31 @@ class AnalyticsView(LoginRequiredMixin, TemplateView):
                 "total_customers": 0,
                 "average_invoice": 0.0,
                 "total_records": 0,
-                "monthly_revenue_labels": json.dumps([]),
-                "monthly_revenue_data": json.dumps([]),
-                "payment_status_labels": json.dumps([]),
-                "payment_status_data": json.dumps([]),
-                "top_customers_labels": json.dumps([]),
-                "top_customers_data": json.dumps([]),
+                "monthly_revenue_labels": dumps([]).decode(),
+                "monthly_revenue_data": dumps([]).decode(),
+                "payment_status_labels": dumps([]).decode(),
+                "payment_status_data": dumps([]).decode(),
+                "top_customers_labels": dumps([]).decode(),
+                "top_customers_data": dumps([]).decode(),
             }
             
-            context.update({
+            return {
                 "analytics_data": analytics_data,
                 "has_data": False,
                 "recent_records": [],
                 "total_records": 0,
-            })
-        
-        return context
+            }
 
 
-class ChartsDataView(LoginRequiredMixin, View):
+class ChartsDataView(LoginRequiredMixin, ConditionalDataMixin, ReplicaReadsMixin, View):
     """API view for chart data."""
     
     def get(self, request):
         """Return chart data as JSON."""
-        records = BillingRecord.objects.filter(upload__user=request.user)
+        records = BillingRecord.objects.filter(user=request.user)
         
         if not records.exists():
-            return JsonResponse({"error": "No data available"}, status=404)
+            return OrjsonResponse({"error": "No data available"}, status=404)
         
         # Pass the user object instead of the records QuerySet
         calculator = AnalyticsCalculator(request.user)
@@ -990,34 +855,46 @@ class ChartsDataView(LoginRequiredMixin, View):
         elif chart_type == "payment_status":
             data = calculator.get_payment_status_distribution()
         else:
-            return JsonResponse({"error": "Invalid chart type"}, status=400)
+            return OrjsonResponse({"error": "Invalid chart type"}, status=400)
         
-        return JsonResponse(data)
+        return OrjsonResponse(data, safe=False)
 
 
-class SummaryStatsView(LoginRequiredMixin, View):
+class SummaryStatsView(LoginRequiredMixin, ConditionalDataMixin, ReplicaReadsMixin, View):
     """API view for summary statistics."""
     
     def get(self, request):
         """Return summary statistics as JSON."""
-        records = BillingRecord.objects.filter(upload__user=request.user)
+        records = BillingRecord.objects.filter(user=request.user)
         
         if not records.exists():
-            return JsonResponse({"error": "No data available"}, status=404)
+            return OrjsonResponse({"error": "No data available"}, status=404)
         
         # Pass the user object instead of the records QuerySet
         calculator = AnalyticsCalculator(request.user)
         stats = calculator.get_summary_stats()
         
-        return JsonResponse(stats)
+        return OrjsonResponse(stats)
 
 
-class ExportDataView(LoginRequiredMixin, View):
+EXPORT_FIELDS = ["invoice_number", "customer_name", "amount", "date", "payment_status", "description"]
+
+
+def _json_export(records: QuerySet[BillingRecord], filename: str) -> OrjsonResponse:
+    """Records as a downloadable JSON array."""
+    response = OrjsonResponse(list(records.values(*EXPORT_FIELDS)), safe=False)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+class ExportDataView(LoginRequiredMixin, ReplicaReadsMixin, View):
     """View to export billing data."""
     
     def get(self, request):
-        """Export data as CSV."""
-        records = BillingRecord.objects.filter(upload__user=request.user)
+        """Export data as CSV, or as JSON with ``?format=json``."""
+        records = BillingRecord.objects.filter(user=request.user)
+        if request.GET.get("format") == "json":
+            return _json_export(records, "billing_data.json")
         
         response = HttpResponse(content_type="text/csv")
         response["Content-Disposition"] = 'attachment; filename="billing_data.csv"'
@@ -1047,21 +924,24 @@ class ExportDataView(LoginRequiredMixin, View):
         return response
 
 
-class ExportRecordsView(LoginRequiredMixin, View):
+class ExportRecordsView(LoginRequiredMixin, ReplicaReadsMixin, View):
     """View to export selected billing records."""
     
     def get(self, request):
-        """Export selected records as CSV."""
+        """Export selected records as CSV, or as JSON with ``?format=json``."""
         # Get selected IDs from query parameters
         selected_ids = request.GET.get("ids", "").split(",")
         
         if selected_ids and selected_ids[0]:
             records = BillingRecord.objects.filter(
                 id__in=selected_ids,
-                upload__user=request.user
+                user=request.user
             )
         else:
-            records = BillingRecord.objects.filter(upload__user=request.user)
+            records = BillingRecord.objects.filter(user=request.user)
+        
+        if request.GET.get("format") == "json":
+            return _json_export(records, "selected_billing_records.json")
         
         response = HttpResponse(content_type="text/csv")
         response["Content-Disposition"] = 'attachment; filename="selected_billing_records.csv"'
@@ -1101,7 +981,7 @@ class BillingRecordListView(LoginRequiredMixin, ListView):
     
     def get_queryset(self):
         """Filter records by current user with search functionality."""
-        queryset = BillingRecord.objects.filter(upload__user=self.request.user)
+        queryset = BillingRecord.objects.filter(user=self.request.user)
         
         # Search functionality
         search = self.request.GET.get("search")
@@ -1130,7 +1010,7 @@ class BillingRecordListView(LoginRequiredMixin, ListView):
         if high_value_filter == "true":
             # Calculate average invoice amount
             invoice_totals = BillingRecord.objects.filter(
-                upload__user=self.request.user
+                user=self.request.user
             ).values("invoice_number").annotate(
                 invoice_total=Sum("amount")
             )
@@ -1178,7 +1058,7 @@ class BillingRecordListView(LoginRequiredMixin, ListView):
         context["segment"] = "records"
         
         # Get all user's records for statistics (before filtering)
-        all_records = BillingRecord.objects.filter(upload__user=self.request.user)
+        all_records = BillingRecord.objects.filter(user=self.request.user)
         
         # Get available uploads for filter dropdown
         uploads = BillingDataUpload.objects.filter(
@@ -1200,6 +1080,20 @@ class BillingRecordListView(LoginRequiredMixin, ListView):
             "week_ago": week_ago.strftime("%Y-%m-%d"),
         })
         
+        context["uploads"] = uploads
+        
+        # Only computed when the statistic cards aren't cached yet (see analytics.fragments)
+        context.update(lazy_context(lambda: self.get_statistics(all_records), [
+            "pending_payments", "this_month_revenue", "high_value_count", "recent_activity",
+            "total_records", "total_invoices", "total_revenue", "average_invoice", "unique_customers",
+        ]))
+        return context
+    
+    def get_statistics(self, all_records: QuerySet[BillingRecord]) -> Dict[str, Any]:
+        """Statistics for the billing cards (all records) and the filtered records."""
+        from datetime import timedelta
+        from django.utils import timezone
+        
         if all_records.exists():
             # Calculate billing-specific statistics - aggregate by invoice first
             today = timezone.now().date()
@@ -1260,7 +1154,7 @@ class BillingRecordListView(LoginRequiredMixin, ListView):
             unique_customers = filtered_records.values("customer_name").distinct().count()
             unique_invoices = filtered_invoice_totals.count()
             
-            context.update({
+            return {
                 "pending_payments": pending_invoices,  # Count of pending invoices
                 "this_month_revenue": this_month_revenue,
                 "high_value_count": high_value_count,
@@ -1270,11 +1164,10 @@ class BillingRecordListView(LoginRequiredMixin, ListView):
                 "total_revenue": total_revenue,
                 "average_invoice": average_invoice,
                 "unique_customers": unique_customers,
-                "uploads": uploads,
-            })
+            }
         else:
             # Default values when no records exist
-            context.update({
+            return {
                 "pending_payments": 0,
                 "this_month_revenue": 0,
                 "high_value_count": 0,
@@ -1284,10 +1177,7 @@ class BillingRecordListView(LoginRequiredMixin, ListView):
                 "total_revenue": 0,
                 "average_invoice": 0,
                 "unique_customers": 0,
-                "uploads": uploads,
-            })
-        
-        return context
+            }
 
 
 class RecordDetailView(LoginRequiredMixin, DetailView):
@@ -1298,7 +1188,7 @@ class RecordDetailView(LoginRequiredMixin, DetailView):
     pk_url_kwarg = "record_id"
 
     def get_queryset(self) -> QuerySet[BillingRecord]:
-        return BillingRecord.objects.filter(upload__user=self.request.user)
+        return BillingRecord.objects.filter(user=self.request.user)
 
 
 class RecordEditView(LoginRequiredMixin, UpdateView):
@@ -1314,7 +1204,7 @@ class RecordEditView(LoginRequiredMixin, UpdateView):
     pk_url_kwarg = "record_id"
 
     def get_queryset(self) -> QuerySet[BillingRecord]:
-        return BillingRecord.objects.filter(upload__user=self.request.user)
+        return BillingRecord.objects.filter(user=self.request.user)
 
     def get_success_url(self) -> str:
         return reverse("analytics:record_detail", kwargs={"record_id": self.object.pk})
@@ -1333,7 +1223,7 @@ class RecordDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy("analytics:record_list")
 
     def get_queryset(self) -> QuerySet[BillingRecord]:
-        return BillingRecord.objects.filter(upload__user=self.request.user)
+        return BillingRecord.objects.filter(user=self.request.user)
 
     def delete(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
         record = self.get_object()
@@ -1352,10 +1242,10 @@ class BulkDeleteRecordsView(LoginRequiredMixin, View):
                 return redirect("analytics:record_list")
             
             # Delete records
-            deleted_count, _ = BillingRecord.objects.filter(
+            deleted_count = delete_records(BillingRecord.objects.filter(
                 id__in=record_ids,
-                upload__user=request.user
-            ).delete()
+                user=request.user
+            ))
             
             messages.success(request, f"Successfully deleted {deleted_count} billing records.")
             return redirect("analytics:record_list")
@@ -1379,8 +1269,15 @@ class ChatAnalyticsView(LoginRequiredMixin, TemplateView):
             user=self.request.user
         ).order_by("-created_at")[:10]
         
-        # Data summary for sidebar
-        records = BillingRecord.objects.filter(upload__user=self.request.user)
+        context["recent_queries"] = recent_queries
+        # Only computed if the template uses it (the sidebar loads its stats over AJAX)
+        context.update(lazy_context(self.get_data_summary, ["data_summary"]))
+        
+        return context
+    
+    def get_data_summary(self) -> Dict[str, Any]:
+        """Data summary for sidebar."""
+        records = BillingRecord.objects.filter(user=self.request.user)
         data_summary = {
             "total_records": records.count(),
             "total_customers": records.values("customer_name").distinct().count(),
@@ -1394,12 +1291,7 @@ class ChatAnalyticsView(LoginRequiredMixin, TemplateView):
             }
             data_summary["date_range"] = date_range
         
-        context.update({
-            "recent_queries": recent_queries,
-            "data_summary": data_summary,
-        })
-        
-        return context
+        return {"data_summary": data_summary}
 
 
 class ProcessChatQueryView(LoginRequiredMixin, View):
@@ -1410,20 +1302,20 @@ class ProcessChatQueryView(LoginRequiredMixin, View):
         query_text = request.POST.get("query", "").strip()
         
         if not query_text:
-            return JsonResponse({"error": "Query cannot be empty"}, status=400)
+            return OrjsonResponse({"error": "Query cannot be empty"}, status=400)
         
         # Check if OpenAI API key is configured
         if not hasattr(settings, "OPENAI_API_KEY") or not settings.OPENAI_API_KEY:
-            return JsonResponse({
+            return OrjsonResponse({
                 "error": "OpenAI API key not configured. Please contact administrator."
             }, status=400)
         
         try:
             # Get user's billing data for context
-            records = BillingRecord.objects.filter(upload__user=request.user)
+            records = BillingRecord.objects.filter(user=request.user)
             
             if not records.exists():
-                return JsonResponse({
+                return OrjsonResponse({
                     "error": "No billing data available for analysis. Please upload some data first."
                 }, status=400)
             
@@ -1439,14 +1331,14 @@ class ProcessChatQueryView(LoginRequiredMixin, View):
                 created_at=timezone.now()
             )
             
-            return JsonResponse({
+            return OrjsonResponse({
                 "success": True,
                 "response": response,
                 "timestamp": timezone.now().isoformat()
             })
         
         except Exception as e:
-            return JsonResponse({
+            return OrjsonResponse({
                 "error": f"Error processing query: {str(e)}"
             }, status=500)
 
@@ -1478,7 +1370,7 @@ class UploadStatusAPIView(LoginRequiredMixin, View):
             user=request.user
         )
         
-        return JsonResponse({
+        return OrjsonResponse({
             "status": upload.status,
             "processed_rows": upload.processed_rows,
             "total_rows": upload.total_rows,
@@ -1507,25 +1399,15 @@ class ValidateDataAPIView(LoginRequiredMixin, View):
         }
         
         if not mappings:
-            return JsonResponse({"error": "No column mappings found"}, status=400)
+            return OrjsonResponse({"error": "No column mappings found"}, status=400)
         
         try:
-            processor = DataProcessor(mappings)
-            # Validate first 10 rows
-            sample_path = upload.file.path
-            
-            # This would implement validation logic
-            validation_results = {
-                "valid_rows": 0,
-                "invalid_rows": 0,
-                "errors": [],
-                "warnings": []
-            }
-            
-            return JsonResponse(validation_results)
+            # Whole-file dry run; reused until the mappings change
+            refresh = request.POST.get("refresh") in ("1", "true")
+            return OrjsonResponse(validate_upload(upload, refresh=refresh))
         
         except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+            return OrjsonResponse({"error": str(e)}, status=500)
 
 
 class SampleDataAPIView(LoginRequiredMixin, View):
@@ -1539,67 +1421,71 @@ class SampleDataAPIView(LoginRequiredMixin, View):
             user=request.user
         )
         
-        return JsonResponse({
-            "headers": [],  # Headers not stored in model
-            "sample_data": [],  # Sample data not stored in model
-            "total_rows": upload.total_rows or 0,
-        })
+        try:
+            num_rows = int(request.GET.get("rows", analytics_setting("SAMPLE_ROWS")))
+        except ValueError:
+            return OrjsonResponse({"error": "rows must be an integer"}, status=400)
+        
+        try:
+            return OrjsonResponse(build_preview(upload, max(1, num_rows)))
+        except Exception as e:
+            return OrjsonResponse({"error": str(e)}, status=500)
 
 
-class RevenueTrendAPIView(LoginRequiredMixin, View):
+class RevenueTrendAPIView(LoginRequiredMixin, ConditionalDataMixin, ReplicaReadsMixin, View):
     """API view for revenue trend data."""
     
     def get(self, request):
         """Return revenue trend data."""
-        records = BillingRecord.objects.filter(upload__user=request.user)
+        records = BillingRecord.objects.filter(user=request.user)
         
         if not records.exists():
-            return JsonResponse({"data": []})
+            return OrjsonResponse({"data": []})
         
         # Pass the user object instead of the records QuerySet
         calculator = AnalyticsCalculator(request.user)
         period = request.GET.get("period", "monthly")
         trend_data = calculator.get_revenue_trend(period)
         
-        return JsonResponse(trend_data)
+        return OrjsonResponse(trend_data, safe=False)
 
 
-class CustomerAnalysisAPIView(LoginRequiredMixin, View):
+class CustomerAnalysisAPIView(LoginRequiredMixin, ConditionalDataMixin, ReplicaReadsMixin, View):
     """API view for customer analysis data."""
     
     def get(self, request):
         """Return customer analysis data."""
-        records = BillingRecord.objects.filter(upload__user=request.user)
+        records = BillingRecord.objects.filter(user=request.user)
         
         if not records.exists():
-            return JsonResponse({"data": []})
+            return OrjsonResponse({"data": []})
         
         # Pass the user object instead of the records QuerySet
         calculator = AnalyticsCalculator(request.user)
         limit = int(request.GET.get("limit", 10))
         customer_data = calculator.get_top_customers(limit)
         
-        return JsonResponse(customer_data)
+        return OrjsonResponse(customer_data, safe=False)
 
 
-class PaymentStatusAPIView(LoginRequiredMixin, View):
+class PaymentStatusAPIView(LoginRequiredMixin, ConditionalDataMixin, ReplicaReadsMixin, View):
     """API view for payment status distribution."""
     
     def get(self, request):
         """Return payment status distribution."""
-        records = BillingRecord.objects.filter(upload__user=request.user)
+        records = BillingRecord.objects.filter(user=request.user)
         
         if not records.exists():
-            return JsonResponse({"data": []})
+            return OrjsonResponse({"data": []})
         
         # Pass the user object instead of the records QuerySet
         calculator = AnalyticsCalculator(request.user)
         status_data = calculator.get_payment_status_distribution()
         
-        return JsonResponse(status_data)
+        return OrjsonResponse(status_data, safe=False)
 
 
-class CustomerSearchAPIView(LoginRequiredMixin, View):
+class CustomerSearchAPIView(LoginRequiredMixin, ReplicaReadsMixin, View):
     """API view for customer search."""
     
     def get(self, request):
@@ -1607,19 +1493,19 @@ class CustomerSearchAPIView(LoginRequiredMixin, View):
         query = request.GET.get("q", "").strip()
         
         if len(query) < 2:
-            return JsonResponse({"customers": []})
+            return OrjsonResponse({"customers": []})
         
         customers = BillingRecord.objects.filter(
-            upload__user=request.user,
+            user=request.user,
             customer_name__icontains=query
         ).values("customer_name").distinct()[:10]
         
-        return JsonResponse({
+        return OrjsonResponse({
             "customers": [c["customer_name"] for c in customers]
         })
 
 
-class InvoiceSearchAPIView(LoginRequiredMixin, View):
+class InvoiceSearchAPIView(LoginRequiredMixin, ReplicaReadsMixin, View):
     """API view for invoice search."""
     
     def get(self, request):
@@ -1627,14 +1513,14 @@ class InvoiceSearchAPIView(LoginRequiredMixin, View):
         query = request.GET.get("q", "").strip()
         
         if len(query) < 2:
-            return JsonResponse({"invoices": []})
+            return OrjsonResponse({"invoices": []})
         
         invoices = BillingRecord.objects.filter(
-            upload__user=request.user,
+            user=request.user,
             invoice_number__icontains=query
         ).values("invoice_number", "customer_name", "amount")[:10]
         
-        return JsonResponse({"invoices": list(invoices)})
+        return OrjsonResponse({"invoices": list(invoices)})
 
 
 class NotificationsAPIView(LoginRequiredMixin, View):
@@ -1660,7 +1546,7 @@ class NotificationsAPIView(LoginRequiredMixin, View):
                 "url": reverse("analytics:upload_detail", kwargs={"pk": upload.pk})
             })
         
-        return JsonResponse({"notifications": notifications})
+        return OrjsonResponse({"notifications": notifications})
 
 
 class SettingsView(LoginRequiredMixin, TemplateView):
@@ -1675,7 +1561,7 @@ class SettingsView(LoginRequiredMixin, TemplateView):
         # Add user preferences and configuration options
         context.update({
             "openai_configured": hasattr(settings, "OPENAI_API_KEY") and bool(settings.OPENAI_API_KEY),
-            "upload_limit": getattr(settings, "FILE_UPLOAD_MAX_MEMORY_SIZE", 0) / (1024 * 1024),  # MB
+            "upload_limit": analytics_setting("MAX_FILE_SIZE") / (1024 * 1024),  # MB
         })
         
         return context
@@ -1698,33 +1584,50 @@ class FieldMappingTemplatesView(LoginRequiredMixin, TemplateView):
         ).order_by("-usage_count")[:20]
         
         context["common_mappings"] = common_mappings
+        context["mapping_templates"] = MappingTemplate.objects.filter(user=self.request.user)
+        context["segment"] = "uploads"
         return context
+    
+    def post(self, request: HttpRequest) -> HttpResponse:
+        """Toggle automatic processing for a template, or delete it."""
+        template = get_object_or_404(MappingTemplate, pk=request.POST.get("template_id"), user=request.user)
+        
+        if request.POST.get("action") == "delete":
+            template.delete()
+            messages.success(request, f"Mapping template \"{template.name}\" deleted.")
+        else:
+            template.auto_process = not template.auto_process
+            template.save(update_fields=["auto_process"])
+            state = "enabled" if template.auto_process else "disabled"
+            messages.success(request, f"Automatic processing {state} for \"{template.name}\".")
+        
+        return redirect("analytics:field_mapping_templates")
 
 
 # AJAX Function-based views for better compatibility
 
-def ajax_chat_query(request: HttpRequest) -> JsonResponse:
+def ajax_chat_query(request: HttpRequest) -> OrjsonResponse:
     """
     Handle analytics queries via AJAX.
     Function-based view for ChatGPT integration.
     """
     if request.method != "POST":
-        return JsonResponse({"error": "Only POST method allowed"}, status=405)
+        return OrjsonResponse({"error": "Only POST method allowed"}, status=405)
     
     if not request.user.is_authenticated:
-        return JsonResponse({"error": "Authentication required"}, status=401)
+        return OrjsonResponse({"error": "Authentication required"}, status=401)
     
     query_text = request.POST.get("query", "").strip()
     
     if not query_text:
-        return JsonResponse({"error": "Query cannot be empty"}, status=400)
+        return OrjsonResponse({"error": "Query cannot be empty"}, status=400)
     
     try:
         # Get user's billing records for context
-        records = BillingRecord.objects.filter(upload__user=request.user)
+        records = BillingRecord.objects.filter(user=request.user)
         
         if not records.exists():
-            return JsonResponse({
+            return OrjsonResponse({
                 "error": "No billing data available for analysis. Please upload some data first."
             }, status=400)
         
@@ -1796,7 +1699,7 @@ def ajax_chat_query(request: HttpRequest) -> JsonResponse:
         query_obj.response_text = response_text
         query_obj.save()
         
-        return JsonResponse({
+        return OrjsonResponse({
             "success": True,
             "response": response_text,
             "timestamp": timezone.now().isoformat(),
@@ -1804,18 +1707,18 @@ def ajax_chat_query(request: HttpRequest) -> JsonResponse:
         })
         
     except Exception as e:
-        return JsonResponse({
+        return OrjsonResponse({
             "error": f"Error processing query: {str(e)}"
         }, status=500)
 
 
-def ajax_upload_status(request: HttpRequest, upload_id: uuid.UUID) -> JsonResponse:
+def ajax_upload_status(request: HttpRequest, upload_id: uuid.UUID) -> OrjsonResponse:
     """
     Get upload status via AJAX.
     Function-based view for real-time upload progress.
     """
     if not request.user.is_authenticated:
-        return JsonResponse({"error": "Authentication required"}, status=401)
+        return OrjsonResponse({"error": "Authentication required"}, status=401)
     
     try:
         upload = BillingDataUpload.objects.get(
@@ -1828,7 +1731,7 @@ def ajax_upload_status(request: HttpRequest, upload_id: uuid.UUID) -> JsonRespon
         if upload.total_rows and upload.total_rows > 0:
             progress = (upload.processed_rows / upload.total_rows) * 100
         
-        return JsonResponse({
+        return OrjsonResponse({
             "success": True,
             "status": upload.status,
             "processed_rows": upload.processed_rows or 0,
@@ -1840,24 +1743,63 @@ def ajax_upload_status(request: HttpRequest, upload_id: uuid.UUID) -> JsonRespon
         })
         
     except BillingDataUpload.DoesNotExist:
-        return JsonResponse({"error": "Upload not found"}, status=404)
+        return OrjsonResponse({"error": "Upload not found"}, status=404)
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return OrjsonResponse({"error": str(e)}, status=500)
+
 
+def _event_stream_response(stream) -> StreamingHttpResponse:
+    """Wrap an async SSE generator in a non-buffered streaming response."""
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Disable proxy buffering (nginx)
+    return response
 
-def ajax_analytics_data(request: HttpRequest) -> JsonResponse:
+
+async def upload_events_stream(request: HttpRequest, upload_id: uuid.UUID) -> HttpResponse:
+    """
+    Stream upload progress via server-sent events.
+    Replaces polling of ajax_upload_status while an upload is processing.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return OrjsonResponse({"error": "Authentication required"}, status=401)
+
+    try:
+        upload = await BillingDataUpload.objects.aget(id=upload_id, user=user)
+    except BillingDataUpload.DoesNotExist:
+        return OrjsonResponse({"error": "Upload not found"}, status=404)
+
+    return _event_stream_response(stream_upload_events(upload))
+
+
+async def notifications_stream(request: HttpRequest) -> HttpResponse:
+    """
+    Stream upload completion notifications via server-sent events.
+    Push-based counterpart of NotificationsAPIView.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return OrjsonResponse({"error": "Authentication required"}, status=401)
+
+    return _event_stream_response(stream_user_notifications(user.pk))
+
+
+@conditional_on_data
+@reads_from_replica
+def ajax_analytics_data(request: HttpRequest) -> OrjsonResponse:
     """
     Get analytics data for charts via AJAX.
     Function-based view for dashboard charts.
     """
     if not request.user.is_authenticated:
-        return JsonResponse({"error": "Authentication required"}, status=401)
+        return OrjsonResponse({"error": "Authentication required"}, status=401)
     
     try:
-        records = BillingRecord.objects.filter(upload__user=request.user)
+        records = BillingRecord.objects.filter(user=request.user)
         
         if not records.exists():
-            return JsonResponse({
+            return OrjsonResponse({
                 "error": "No data available",
                 "charts": {
                     "monthly_revenue": {"labels": [], "data": []},
@@ -1927,7 +1869,7 @@ def ajax_analytics_data(request: HttpRequest) -> JsonResponse:
         total_customers = records.values("customer_name").distinct().count()
         avg_invoice = invoice_aggregates.aggregate(avg=Avg("invoice_total"))["avg"] or 0
         
-        return JsonResponse({
+        return OrjsonResponse({
             "success": True,
             "charts": {
                 "monthly_revenue": {
@@ -1952,7 +1894,7 @@ def ajax_analytics_data(request: HttpRequest) -> JsonResponse:
         })
         
     except Exception as e:
-        return JsonResponse({
+        return OrjsonResponse({
             "error": f"Error getting analytics data: {str(e)}"
         }, status=500)
 
@@ -1969,30 +1911,34 @@ class DebugFileColumnsAPIView(LoginRequiredMixin, View):
                 user=request.user
             )
             
-            import pandas as pd
-            import os
-            
-            file_path = upload.file.path
+            file_name = upload.file.name
+            file_exists = upload.file.storage.exists(file_name)
             debug_info = {
-                "file_path": file_path,
-                "file_exists": os.path.exists(file_path),
+                "file_name": file_name,
+                "storage": upload.file.storage.__class__.__name__,
+                "file_exists": file_exists,
+                "checksum": upload.checksum,
                 "file_size": upload.file_size,
                 "original_filename": upload.original_filename,
                 "upload_status": upload.status,
             }
             
-            if os.path.exists(file_path):
+            if file_exists:
                 try:
                     # Try to read file
-                    if file_path.endswith(".csv"):
-                        df = pd.read_csv(file_path, nrows=0)
+                    parsed = get_parsed_file(upload)
+                    if file_name.endswith(".csv"):
                         debug_info["csv_success"] = True
-                    elif file_path.endswith((".xlsx", ".xls")):
-                        df = pd.read_excel(file_path, nrows=0)
+                        debug_info["encoding"] = parsed.encoding
+                        debug_info["delimiter"] = parsed.delimiter
+                    elif file_name.endswith((".xlsx", ".xls")):
                         debug_info["excel_success"] = True
+                        debug_info["sheet_names"] = parsed.sheet_names
                     
-                    debug_info["columns"] = list(df.columns)
-                    debug_info["column_count"] = len(df.columns)
+                    debug_info["columns"] = parsed.headers
+                    debug_info["column_count"] = len(parsed.headers)
+                    debug_info["row_count"] = parsed.row_count
+                    debug_info["parsed_data_file"] = parsed.data_file.name
                     
                 except Exception as e:
                     debug_info["error"] = str(e)
@@ -2009,10 +1955,10 @@ class DebugFileColumnsAPIView(LoginRequiredMixin, View):
                 for m in mappings
             ]
             
-            return JsonResponse(debug_info)
+            return OrjsonResponse(debug_info)
             
         except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+            return OrjsonResponse({"error": str(e)}, status=500)
 
 
 class TestDateParsingView(LoginRequiredMixin, View):
@@ -2032,9 +1978,7 @@ class TestDateParsingView(LoginRequiredMixin, View):
         results = []
         for date_str, format_type in test_dates:
             try:
-                # Create a temporary instance to use the method
-                view = ProcessUploadView()
-                parsed_date = view._parse_date_with_format(date_str, format_type)
+                parsed_date = parse_date_with_format(date_str, format_type)
                 results.append({
                     "input": date_str,
                     "format": format_type,
@@ -2049,4 +1993,4 @@ class TestDateParsingView(LoginRequiredMixin, View):
                     "success": False
                 })
         
-        return JsonResponse({"test_results": results}) 
\ No newline at end of file
+        return OrjsonResponse({"test_results": results}) 
\ No newline at end of file
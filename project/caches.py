@@ -0,0 +1,54 @@
+"""
+Cache settings.
+
+Every alias lives in one shared backend, so all worker processes see the
+same entries:
+
+- Redis (``REDIS_URL``, any Redis-compatible server), with an atomic
+  ``incr`` for the rate limiter;
+- otherwise files under ``CACHE_DIR``, shared by the workers of one host
+  (increments there are not atomic, so rate limits are approximate under
+  concurrent requests).
+
+Aliases:
+
+- ``default``: sessions (``cached_db``) and anything not named below;
+- ``analytics``: analytics app data (``ANALYTICS_CONFIG['CACHE_ALIAS']``);
+- ``ratelimit``: django-ratelimit counters (``RATELIMIT_USE_CACHE``);
+- ``templates``: rendered template fragments.
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+REDIS_BACKEND = 'django.core.cache.backends.redis.RedisCache'
+FILE_BACKEND = 'django.core.cache.backends.filebased.FileBasedCache'
+
+# Alias: default timeout in seconds
+CACHE_ALIASES = {
+    'default': 300,
+    'analytics': 300,
+    'ratelimit': 300,
+    'templates': 600,
+}
+
+
+def cache_config(redis_url: Optional[str] = None, cache_dir: Optional[str] = None, max_entries: int = 10000) -> Dict[str, Dict[str, Any]]:
+    """``CACHES`` with every alias on Redis, or in files under ``cache_dir``."""
+    caches = {}
+    for alias, timeout in CACHE_ALIASES.items():
+        if redis_url:
+            caches[alias] = {
+                'BACKEND': REDIS_BACKEND,
+                'LOCATION': redis_url,
+                'KEY_PREFIX': alias,
+                'TIMEOUT': timeout,
+            }
+        else:
+            caches[alias] = {
+                'BACKEND': FILE_BACKEND,
+                'LOCATION': os.path.join(cache_dir, alias),
+                'TIMEOUT': timeout,
+                'OPTIONS': {'MAX_ENTRIES': max_entries},
+            }
+    return caches
@@ -0,0 +1,188 @@
+"""
+Database connection settings and connection metrics.
+
+Production ``DATABASES`` are built by ``database_config`` from the
+``POSTGRES_URL`` and ``DB_*`` environment variables:
+
+- ``DB_POOL=1`` (the default): psycopg 3's connection pool (needs
+  ``psycopg[pool]``). Each worker process gets its own pool of
+  ``DB_POOL_MIN_SIZE`` to ``DB_POOL_MAX_SIZE`` connections; the default
+  maximum is one per thread that uses the database: ``WEB_THREADS``
+  concurrent requests (under ASGI each runs its sync code in a thread of
+  its own) plus the analytics background job threads. Requests wait up to
+  ``DB_POOL_TIMEOUT`` seconds for a free connection.
+- ``DB_POOL=0``: connections persist for ``DB_CONN_MAX_AGE`` seconds
+  (default 600) instead of being opened (with a TLS handshake) per request;
+  ``CONN_HEALTH_CHECKS`` replaces a connection that went away before it is
+  reused. Persistent connections belong to a thread, so this only suits a
+  WSGI deployment with a fixed set of threads: under ASGI they would leak.
+
+``connection_stats`` reports how often this process set up a connection
+(with the pool, each checkout counts) and, with the pool, its size, wait
+and usage counters; it backs ``/health/db/metrics/`` and
+``manage.py db_connections status``. ``benchmark_connections`` compares
+request latency against opening a connection per request
+(``manage.py db_connections benchmark``).
+"""
+
+import statistics
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connections
+from django.db.utils import load_backend
+from django.db.backends.signals import connection_created
+
+DEFAULT_CONN_MAX_AGE = 600
+DEFAULT_POOL_TIMEOUT = 10
+
+_opened = Counter()
+_opened_lock = threading.Lock()
+
+
+def default_pool_max_size(threads: int = 1, background_threads: int = 0) -> int:
+    """One pooled connection per thread of a worker process that queries the database."""
+    return max(1, threads) + max(0, background_threads)
+
+
+def database_config(
+    url: str,
+    conn_max_age: int = DEFAULT_CONN_MAX_AGE,
+    health_checks: bool = True,
+    pool: bool = False,
+    pool_min_size: int = 1,
+    pool_max_size: Optional[int] = None,
+    pool_timeout: float = DEFAULT_POOL_TIMEOUT,
+) -> Dict[str, Any]:
+    """A PostgreSQL ``DATABASES`` entry with persistent or pooled connections."""
+    config = dj_database_url.parse(
+        url,
+        engine='django.db.backends.postgresql',
+        conn_max_age=conn_max_age,
+        conn_health_checks=health_checks,
+    )
+    if not pool:
+        return config
+
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError as exc:
+        raise ImproperlyConfigured('DB_POOL requires psycopg 3 with its pool: pip install "psycopg[binary,pool]"') from exc
+
+    if pool_max_size is None:
+        pool_max_size = default_pool_max_size()
+    # The pool keeps connections open itself; Django must not also persist them
+    config['CONN_MAX_AGE'] = 0
+    config.setdefault('OPTIONS', {})['pool'] = {
+        'min_size': min(pool_min_size, pool_max_size),
+        'max_size': pool_max_size,
+        'timeout': pool_timeout,
+    }
+    return config
+
+
+def _count_connection(sender, connection, **kwargs) -> None:
+    with _opened_lock:
+        _opened[connection.alias] += 1
+
+
+connection_created.connect(_count_connection, dispatch_uid='project.database.count_connections')
+
+
+def _pool_stats(connection) -> Optional[Dict[str, Any]]:
+    pool = getattr(connection, 'pool', None)
+    if pool is None:
+        return None
+
+    stats = pool.get_stats()
+    requests = stats.get('requests_num', 0)
+    queued = stats.get('requests_queued', 0)
+    return {
+        'min_size': stats.get('pool_min'),
+        'max_size': stats.get('pool_max'),
+        'size': stats.get('pool_size', 0),
+        'available': stats.get('pool_available', 0),
+        'waiting': stats.get('requests_waiting', 0),
+        'requests': requests,
+        'queued_requests': queued,
+        'avg_wait_ms': round(stats.get('requests_wait_ms', 0) / queued, 2) if queued else 0.0,
+        'avg_usage_ms': round(stats.get('usage_ms', 0) / requests, 2) if requests else 0.0,
+        'timeouts': stats.get('requests_errors', 0),
+        'connections_opened': stats.get('connections_num', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+    }
+
+
+def connection_stats() -> Dict[str, Dict[str, Any]]:
+    """Connection settings and counters of this process, per database alias."""
+    result = {}
+    for alias in connections:
+        connection = connections[alias]
+        result[alias] = {
+            'vendor': connection.vendor,
+            'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE'),
+            'health_checks': connection.settings_dict.get('CONN_HEALTH_CHECKS'),
+            'connects': _opened[alias],
+            'pool': _pool_stats(connection),
+        }
+    return result
+
+
+def check_database(alias: str = 'default') -> float:
+    """Run ``SELECT 1``; returns the round trip in milliseconds."""
+    started = time.perf_counter()
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    return (time.perf_counter() - started) * 1000
+
+
+def _run_queries(connection, queries: int) -> None:
+    for _ in range(queries):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+
+
+def _summary(timings: List[float], connects: int) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {
+        'mean_ms': round(statistics.mean(timings), 2),
+        'p50_ms': round(timings[len(timings) // 2], 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'connects': connects,
+    }
+
+
+def benchmark_connections(alias: str = 'default', requests: int = 50, queries: int = 12) -> Dict[str, Dict[str, float]]:
+    """Time simulated requests of ``queries`` queries each.
+
+    ``per_request`` opens and closes a connection for every request (the old
+    behaviour); ``configured`` uses the alias's persistent or pooled
+    connections, closing them at request boundaries like Django does.
+    """
+    settings_dict = {**connections[alias].settings_dict, 'CONN_MAX_AGE': 0}
+    settings_dict['OPTIONS'] = {key: value for key, value in settings_dict['OPTIONS'].items() if key != 'pool'}
+    fresh = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+    configured = connections[alias]
+    results = {}
+
+    for name, connection in (('per_request', fresh), ('configured', configured)):
+        timings = []
+        connects = _opened[alias]
+        for _ in range(requests):
+            started = time.perf_counter()
+            if connection is configured:
+                close_old_connections()  # request_started
+            _run_queries(connection, queries)
+            if connection is configured:
+                close_old_connections()  # request_finished
+            else:
+                connection.close()
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = _summary(timings, _opened[alias] - connects)
+    return results
@@ -0,0 +1,120 @@
+"""
+Render-time instrumentation.
+
+With ``RENDER_TIMING`` on, ``RenderTimingMiddleware`` measures each request's
+time in SQL queries and in template rendering and reports it in a
+``Server-Timing`` header (shown in the browser's network panel) and a log
+line on the ``project.instrumentation`` logger.
+
+Templates are timed by ``InstrumentedDjangoTemplates``, the template
+backend: only the outermost render of a request counts, so components and
+includes rendered inside a page aren't counted twice. Queries run while a
+template renders (lazy querysets) are counted as query time, not template
+time.
+"""
+
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RenderStats:
+    """Time spent by one request, in milliseconds."""
+
+    queries: int = 0
+    query_ms: float = 0.0
+    template_ms: float = 0.0
+    # Query time that happened inside template rendering
+    template_query_ms: float = 0.0
+    depth: int = 0
+
+    @property
+    def template_only_ms(self) -> float:
+        return self.template_ms - self.template_query_ms
+
+
+_stats: ContextVar[Optional[RenderStats]] = ContextVar('render_stats', default=None)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _stats.get()
+        if stats is None:
+            return super().render(context, request)
+
+        stats.depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.depth -= 1
+            if stats.depth == 0:
+                stats.template_ms += (time.perf_counter() - started) * 1000
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times recorded for ``RenderTimingMiddleware``."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def _time_query(stats: RenderStats, execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        stats.queries += 1
+        stats.query_ms += elapsed
+        if stats.depth:
+            stats.template_query_ms += elapsed
+
+
+class RenderTimingMiddleware:
+    """Reports time spent in queries and templates per request."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'RENDER_TIMING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RenderStats()
+        token = _stats.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(lambda *args, stats=stats: _time_query(stats, *args))
+                    )
+                response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        response['Server-Timing'] = (
+            f'db;dur={stats.query_ms:.1f};desc="{stats.queries} queries", '
+            f'tpl;dur={stats.template_only_ms:.1f};desc="templates", '
+            f'total;dur={total_ms:.1f}'
+        )
+        logger.info(
+            f'{request.method} {request.path}: {total_ms:.1f}ms, '
+            f'templates {stats.template_only_ms:.1f}ms, queries {stats.query_ms:.1f}ms ({stats.queries})'
+        )
+        return response
@@ -13,9 +13,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 import json
 import base64
+import tempfile
 import environ
  
-import dj_database_url
 from email.headerregistry import Address
 from django.utils.translation import gettext_lazy as _
 
@@ -25,6 +25,9 @@ from unfold.settings import CONFIG_DEFAULTS as UNFOLD_DEFAULTS
 
 from google.oauth2 import service_account
 
+from project.caches import cache_config
+from project.database import database_config, default_pool_max_size
+
 from pathlib import Path
 
 env = environ.Env()
@@ -112,6 +115,7 @@ INSTALLED_APPS = [
     'transaction',
     'home',
     'analytics',  # New analytics app for billing data processing
+    'project',  # project-wide management commands (db_connections)
 ]
 
 if not DEBUG:
@@ -175,6 +179,7 @@ PAYMENT_VARIANTS = {
     # }
 
 MIDDLEWARE = [
+    'project.instrumentation.RenderTimingMiddleware', # Server-Timing header, when RENDER_TIMING is on
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -185,6 +190,7 @@ MIDDLEWARE = [
 
     'whitenoise.middleware.WhiteNoiseMiddleware', #whitenoise
     'django_ratelimit.middleware.RatelimitMiddleware',
+    'analytics.replicas.ReplicaPinMiddleware', # read-your-writes for the read replica
 ]
 
 ROOT_URLCONF = 'project.urls'
@@ -237,7 +243,8 @@ else:
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render times for RenderTimingMiddleware
+        'BACKEND': 'project.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [
             BASE_DIR.joinpath("templates"),
             BASE_DIR.joinpath("templates", "html"),
@@ -258,7 +265,23 @@ TEMPLATES = [
     },
 ]
 
+if not DEBUG:
+    # Compiled templates are kept for the life of the process (also what
+    # Django does by default, made explicit so it isn't lost when loaders change)
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+# Time spent in templates and queries per request (Server-Timing header and logs)
+RENDER_TIMING = env.bool('RENDER_TIMING', default=DEBUG)
+
 WSGI_APPLICATION = 'project.wsgi.application'
+# Production is served under ASGI (uvicorn workers, see Procfile) so upload events can stream
+ASGI_APPLICATION = 'project.asgi.application'
 
 
 # Database
@@ -269,12 +292,20 @@ if DEBUG:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                "timeout": 20,
+            },
         },
-        'OPTIONS': {
-            "timeout": 20,
-        }
     }
 
+    # Try replica routing locally against a copy of db.sqlite3
+    if env('SQLITE_REPLICA_NAME', default=''):
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / env('SQLITE_REPLICA_NAME'),
+            'TEST': {'MIRROR': 'default'},
+        }
+
 else:
     # DATABASES = {
     #         'default': {
@@ -287,10 +318,45 @@ else:
     #     }
     # }
 
+    # psycopg 3's pool, sized per worker process (see project/database.py).
+    # Under ASGI every in-flight request runs its sync code in a thread of its
+    # own, so persistent connections (DB_POOL=0, DB_CONN_MAX_AGE) are only
+    # for WSGI deployments.
+    db_connection_options = {
+        'conn_max_age': env.int('DB_CONN_MAX_AGE', default=600),
+        'pool': env.bool('DB_POOL', default=True),
+        'pool_min_size': env.int('DB_POOL_MIN_SIZE', default=1),
+        'pool_max_size': env.int('DB_POOL_MAX_SIZE', default=default_pool_max_size(
+            threads=env.int('WEB_THREADS', default=8),
+            background_threads=env.int('ANALYTICS_BACKGROUND_WORKERS', default=2),
+        )),
+        'pool_timeout': env.float('DB_POOL_TIMEOUT', default=10),
+    }
     DATABASES  = {
-                    'default':dj_database_url.config(default=env('POSTGRES_URL')),   
+                    'default': database_config(env('POSTGRES_URL'), **db_connection_options),
                 }
-    DATABASES['default']['ENGINE'] = 'django.db.backends.postgresql_psycopg2'
+
+    # Read-only analytics views query the replica (see analytics/replicas.py)
+    if env('POSTGRES_REPLICA_URL', default=''):
+        DATABASES['replica'] = database_config(env('POSTGRES_REPLICA_URL'), **db_connection_options)
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['analytics.replicas.ReplicaRouter']
+
+
+# Caches
+# Shared by all workers: Redis with REDIS_URL, else files (see project/caches.py)
+
+CACHES = cache_config(
+    redis_url=env('REDIS_URL', default=''),
+    cache_dir=env('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'powerbai-cache')),
+)
+
+# Sessions are read from the cache and only written to the database when they change
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'default'
+
+RATELIMIT_USE_CACHE = 'ratelimit'
 
 
 # Password validation
@@ -364,10 +430,23 @@ else:
     GS_FILE_OVERWRITE = False # prevent overwriting
 
 # File Upload Configuration
-FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
+# Larger uploaded files are streamed to a temporary file instead of held in memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB (Django's default)
 DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000
 
+# Analytics app configuration (defaults in analytics/conf.py)
+ANALYTICS_CONFIG = {
+    'MAX_FILE_SIZE': 50 * 1024 * 1024,  # 50MB
+    'CHUNK_SIZE': env.int('ANALYTICS_CHUNK_SIZE', default=1000),  # rows per ingestion chunk
+    'INGESTION_WORKERS': env.int('ANALYTICS_INGESTION_WORKERS', default=1),  # >1 enables parallel ingestion
+    'BACKGROUND_WORKERS': env.int('ANALYTICS_BACKGROUND_WORKERS', default=2),  # job threads, each may hold a DB connection
+    'READ_REPLICA': 'replica' if 'replica' in DATABASES else None,
+    'CACHE_ALIAS': 'analytics',
+    'FRAGMENT_CACHE_ALIAS': 'templates',  # rendered dashboard widgets, per user and data version
+    'REPLICA_STICKY_SECONDS': env.int('REPLICA_STICKY_SECONDS', default=5),  # primary reads after a user's writes
+}
+
 # Unfold
 ######################################################################
 UNFOLD = {
@@ -16,7 +16,6 @@ from django.template.loader import get_template
 
 
 from django.utils.safestring import SafeText
-from django.template.loader import render_to_string
 from django.utils.safestring import SafeString
 from django.template.base import (NodeList, Parser, Token,
                                     token_kwargs, TextNode, Variable)
@@ -147,19 +146,25 @@ class RenderComponentNode(template.Node):
         self.template_name = template_name
         self.nodelist = nodelist
         self.extra_context = extra_context or {}
+        self._template = None
         super().__init__(*args, **kwargs)
 
+    def get_template(self):
+        """
+            the component's compiled template, loaded on first use. Nodes live as long as
+            their (cached) parent template, so this happens once per process
+        """
+        if self._template is None:
+            self._template = get_template(self.template_name)
+        return self._template
+
     def render(self, context: RequestContext) -> str:
         result = self.nodelist.render(context)
 
         ctx = {name: var.resolve(context) for name, var in self.extra_context.items()}
         ctx.update({"children": result})
 
-        return render_to_string(
-            self.template_name,
-            request=context.request,
-            context=ctx,
-        )
+        return self.get_template().render(ctx, request=getattr(context, "request", None))
 
 
 @register.tag("component")
@@ -12,7 +12,8 @@ from django.urls import path
 from django.urls import path, include, re_path
 
 from .views import (rate_limiter_view, view_404, 
-                        handler_403, home_view,dashboard_view) #subscribe_view
+                        handler_403, home_view,dashboard_view,
+                        db_health_view, db_metrics_view) #subscribe_view
 
 from .sitemaps import StaticSitemap
 from blog.sitemaps import BlogSitemap
@@ -43,6 +44,8 @@ urlpatterns = [
     path('sitemap.xml', sitemap, sitemap_dict, name='django.contrib.sitemaps.views.sitemap'),
     path('robots.txt', TemplateView.as_view(template_name="robots.txt", content_type='text/plain')),
     path('ratelimit-error/', rate_limiter_view, name='ratelimit-error'),
+    path('health/db/', db_health_view, name='db-health'),
+    path('health/db/metrics/', db_metrics_view, name='db-metrics'),
 
     # add new path here
     path('', include('transaction.urls')),
@@ -3,8 +3,11 @@ import random
 from copy import deepcopy
 from datetime import datetime, timedelta
 
-from django.http import HttpResponseForbidden
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import DatabaseError
+from django.http import HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, HttpResponse
+from django.views.decorators.cache import never_cache
 
 from django.utils.translation import gettext_lazy as _
 
@@ -12,6 +15,8 @@ from django_ratelimit.exceptions import Ratelimited
 
 from inquiry.models import Inquiry
 
+from .database import check_database, connection_stats
+
 def rate_limiter_view(request, *args, **kwargs):
     return render(request, 'ratelimit.html', status=429)
 
@@ -33,6 +38,23 @@ def dashboard_view(request):
     return render(request, 'dashboard/index.html', status=200)
 
 
+@never_cache
+def db_health_view(request):
+    """Load balancer health check: 503 when the database can't be queried."""
+    try:
+        latency_ms = check_database()
+    except DatabaseError:
+        return JsonResponse({'status': 'unavailable'}, status=503)
+    return JsonResponse({'status': 'ok', 'latency_ms': round(latency_ms, 2)})
+
+
+@never_cache
+@staff_member_required
+def db_metrics_view(request):
+    """Connection and pool counters of the worker process serving the request."""
+    return JsonResponse(connection_stats())
+
+
 # ---------- admin dashboard view -----------------
 
 chart_options = {